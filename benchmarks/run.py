@@ -0,0 +1,338 @@
+#!/usr/bin/env python
+'''
+Benchmarks
+----------
+
+Measures the full dispatch path of RPC4Django: requests sent to
+``serve_rpc_request`` through Django's test client as well as calls
+straight to the dispatchers. Every benchmark reports operations per
+second, the median (p50) and 99th percentile (p99) latency and the peak
+memory allocated by one operation.
+
+::
+
+    python benchmarks/run.py                        # run everything
+    python benchmarks/run.py --filter xml           # only matching benchmarks
+    python benchmarks/run.py --save baseline.json   # save the results
+    python benchmarks/run.py --compare baseline.json
+
+With ``--compare``, the results are compared with a saved baseline and the
+exit status is 1 if any benchmark is slower than the baseline by more than
+``--tolerance`` (10% by default).
+
+'''
+
+import argparse
+import gc
+import json
+import os
+import sys
+from timeit import default_timer
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python2
+    tracemalloc = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from django.conf import settings  # noqa
+
+settings.configure(
+    DEBUG=False,
+    SECRET_KEY='rpc4django benchmarks',
+    ROOT_URLCONF=__name__,
+    ALLOWED_HOSTS=['testserver'],
+    INSTALLED_APPS=['django.contrib.auth', 'django.contrib.contenttypes', 'rpc4django'],
+    DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+    TEMPLATES=[{'BACKEND': 'django.template.backends.django.DjangoTemplates', 'APP_DIRS': True}],
+    RPC4DJANGO_LOG_REQUESTS_RESPONSES=False,
+)
+
+import django  # noqa
+django.setup()
+
+from django.test import Client, RequestFactory  # noqa
+from django.urls import path  # noqa
+
+from rpc4django.views import dispatcher, serve_rpc_request  # noqa
+
+try:
+    from xmlrpclib import dumps
+except ImportError:
+    from xmlrpc.client import dumps
+
+urlpatterns = [
+    path('RPC2', serve_rpc_request),
+]
+
+# the registry sizes benchmarked (methods are added to the registry)
+REGISTRY_SIZES = (10, 100, 1000, 10000)
+
+# the number of items in a large payload and of calls in a multicall
+LARGE_SIZE = 1000
+MULTICALL_SIZE = 50
+
+
+def add(a, b):
+    '''
+    Adds two numbers
+    '''
+    return a + b
+
+
+def echo(value):
+    '''
+    Returns the value it is passed
+    '''
+    return value
+
+
+def protected(a):
+    '''
+    A method protected by a permission
+    '''
+    return a
+
+
+protected.permission = 'bench.view_protected'
+
+
+class User(object):
+    pk = 1
+    is_anonymous = False
+
+    def has_perm(self, permission):
+        return True
+
+
+dispatcher.register_method(add, 'bench.add', ['int', 'int', 'int'])
+dispatcher.register_method(echo, 'bench.echo', ['array', 'array'])
+dispatcher.register_method(protected, 'bench.protected', ['int', 'int'])
+
+
+def table():
+    '''
+    Returns a table of rows as dictionaries
+    '''
+    return [{'id': i, 'name': 'item %s' % i, 'price': i * 1.5, 'stock': i % 7}
+            for i in range(LARGE_SIZE)]
+
+
+def columnar_table():
+    '''
+    Returns the same table in the columnar format
+    '''
+    return table()
+
+
+columnar_table.result_format = 'columnar'
+
+dispatcher.register_method(table, 'bench.table', ['array'])
+dispatcher.register_method(columnar_table, 'bench.table.columnar', ['struct'])
+
+
+def large_payload():
+    return [{'id': i, 'name': 'item %s' % i, 'price': i * 1.5, 'tags': ['a', 'b']}
+            for i in range(LARGE_SIZE)]
+
+
+def json_body(method, params):
+    return json.dumps({'method': method, 'params': params, 'id': 1})
+
+
+def xml_body(method, params):
+    return dumps(tuple(params), method, allow_none=True)
+
+
+def consume(response):
+    # streamed responses are iterators of chunks
+    if not isinstance(response, str):
+        response = ''.join(response)
+    return response
+
+
+def post(client, body, content_type):
+    def run():
+        response = client.post('/RPC2', body, content_type=content_type)
+        if response.status_code != 200:
+            raise AssertionError('status %s' % response.status_code)
+    return run
+
+
+def benchmarks():
+    '''
+    Yields the name of each benchmark and the function performing one
+    operation. Each benchmark is only set up when it is run.
+    '''
+
+    client = Client()
+    factory = RequestFactory()
+
+    large = large_payload()
+    calls = [{'methodName': 'bench.add', 'params': [1, 2]}] * MULTICALL_SIZE
+    batch = json.dumps([{'method': 'bench.add', 'params': [1, 2], 'id': i}
+                        for i in range(MULTICALL_SIZE)])
+
+    yield 'dispatcher.json.small', lambda: dispatcher.jsondispatch(
+        json_body('bench.add', [1, 2]).encode('utf-8'))
+    yield 'dispatcher.xml.small', lambda: dispatcher.xmldispatch(
+        xml_body('bench.add', [1, 2]).encode('utf-8'))
+    yield 'dispatcher.json.large', lambda: dispatcher.jsondispatch(
+        json_body('bench.echo', [large]).encode('utf-8'))
+    yield 'dispatcher.xml.large', lambda: dispatcher.xmldispatch(
+        xml_body('bench.echo', [large]).encode('utf-8'))
+    yield 'dispatcher.json.table', lambda: dispatcher.jsondispatch(
+        json_body('bench.table', []).encode('utf-8'))
+    yield 'dispatcher.json.table.columnar', lambda: consume(dispatcher.jsondispatch(
+        json_body('bench.table.columnar', []).encode('utf-8')))
+    yield 'dispatcher.xml.table', lambda: dispatcher.xmldispatch(
+        xml_body('bench.table', []).encode('utf-8'))
+    yield 'dispatcher.xml.table.columnar', lambda: consume(dispatcher.xmldispatch(
+        xml_body('bench.table.columnar', []).encode('utf-8')))
+
+    yield 'view.json.small', post(client, json_body('bench.add', [1, 2]), 'application/json')
+    yield 'view.xml.small', post(client, xml_body('bench.add', [1, 2]), 'text/xml')
+    yield 'view.json.large', post(client, json_body('bench.echo', [large]), 'application/json')
+    yield 'view.xml.large', post(client, xml_body('bench.echo', [large]), 'text/xml')
+    yield 'view.json.sniffed', post(client, json_body('bench.add', [1, 2]), 'text/plain')
+    yield 'view.json.multicall', post(client, json_body('system.multicall', [calls]),
+                                      'application/json')
+    yield 'view.xml.multicall', post(client, xml_body('system.multicall', [calls]), 'text/xml')
+    yield 'view.json.batch', post(client, batch, 'application/json')
+
+    def protected_call():
+        request = factory.post('/RPC2', json_body('bench.protected', [1]),
+                               content_type='application/json')
+        request.user = User()
+        response = serve_rpc_request(request)
+        if response.status_code != 200:
+            raise AssertionError('status %s' % response.status_code)
+    yield 'view.json.permission', protected_call
+
+    def docs():
+        response = client.get('/RPC2')
+        if response.status_code != 200:
+            raise AssertionError('status %s' % response.status_code)
+    yield 'view.docs', docs
+
+    for size in REGISTRY_SIZES:
+        for i in range(len(dispatcher.rpcmethods), size):
+            dispatcher.register_method(add, 'bench.registry.method%s' % i)
+        yield 'registry.%s.call' % size, post(
+            client, json_body('bench.add', [1, 2]), 'application/json')
+        yield 'registry.%s.listMethods' % size, post(
+            client, json_body('system.listMethods', []), 'application/json')
+        yield 'registry.%s.describe' % size, post(
+            client, json_body('system.describe', []), 'application/json')
+
+
+def percentile(sorted_timings, fraction):
+    index = min(len(sorted_timings) - 1, int(round(fraction * (len(sorted_timings) - 1))))
+    return sorted_timings[index]
+
+
+def run_benchmark(func, min_time, min_runs):
+    '''
+    Runs ``func`` at least ``min_runs`` times and for at least ``min_time``
+    seconds and returns a dictionary of the results
+    '''
+
+    # warm up any caches
+    func()
+
+    timings = []
+    started = default_timer()
+    while len(timings) < min_runs or default_timer() - started < min_time:
+        start = default_timer()
+        func()
+        timings.append(default_timer() - start)
+    total = default_timer() - started
+
+    timings.sort()
+    result = {
+        'runs': len(timings),
+        'ops_per_sec': len(timings) / total,
+        'p50_ms': percentile(timings, 0.5) * 1000,
+        'p99_ms': percentile(timings, 0.99) * 1000,
+        'peak_kib': None,
+    }
+
+    if tracemalloc is not None:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            func()
+            result['peak_kib'] = tracemalloc.get_traced_memory()[1] / 1024.0
+        finally:
+            tracemalloc.stop()
+
+    return result
+
+
+def format_change(result, baseline):
+    if baseline is None:
+        return ''
+    change = result['ops_per_sec'] / baseline['ops_per_sec'] - 1
+    return '%+.1f%%' % (change * 100)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks RPC4Django')
+    parser.add_argument('--filter', default='',
+                        help='only run benchmarks whose name contains this')
+    parser.add_argument('--min-time', type=float, default=1.0,
+                        help='the minimum number of seconds to run each benchmark')
+    parser.add_argument('--min-runs', type=int, default=20,
+                        help='the minimum number of times to run each benchmark')
+    parser.add_argument('--save', metavar='FILE', help='save the results as a baseline')
+    parser.add_argument('--compare', metavar='FILE', help='compare with a saved baseline')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='the slowdown from the baseline that counts as a regression')
+    args = parser.parse_args(argv)
+
+    baselines = {}
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baselines = json.load(baseline_file)['results']
+
+    header = '%-32s %12s %10s %10s %12s %9s' % (
+        'benchmark', 'ops/sec', 'p50 ms', 'p99 ms', 'peak KiB', 'change')
+    print(header)
+    print('-' * len(header))
+
+    results = {}
+    regressions = []
+    for name, func in benchmarks():
+        if args.filter not in name:
+            continue
+
+        result = results[name] = run_benchmark(func, args.min_time, args.min_runs)
+        baseline = baselines.get(name, None)
+        print('%-32s %12.1f %10.3f %10.3f %12s %9s' % (
+            name, result['ops_per_sec'], result['p50_ms'], result['p99_ms'],
+            '-' if result['peak_kib'] is None else '%.1f' % result['peak_kib'],
+            format_change(result, baseline)))
+        sys.stdout.flush()
+
+        if baseline is not None and \
+                result['ops_per_sec'] < baseline['ops_per_sec'] * (1 - args.tolerance):
+            regressions.append(name)
+
+    if args.save:
+        with open(args.save, 'w') as baseline_file:
+            json.dump({
+                'python': sys.version.split()[0],
+                'django': django.get_version(),
+                'results': results,
+            }, baseline_file, indent=2, sort_keys=True)
+
+    if regressions:
+        print('\nSlower than the baseline: %s' % ', '.join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
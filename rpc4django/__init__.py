@@ -1,2 +1,8 @@
+import django
+
 from .rpcdispatcher import RPCDispatcher, rpcmethod   # noqa
 from .version import __version__, version, version_tuple  # noqa
+
+if django.VERSION < (3, 2):
+    # newer versions of Django find the AppConfig in apps.py by themselves
+    default_app_config = 'rpc4django.apps.RPC4DjangoConfig'
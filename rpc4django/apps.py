@@ -0,0 +1,23 @@
+'''
+The Django application configuration of RPC4Django
+
+When Django starts, the ``rpc`` module (see
+:envvar:`RPC4DJANGO_RPC_MODULES`) of every installed app is imported so
+that the methods it decorates with
+:meth:`@rpcmethod <rpc4django.rpcdispatcher.rpcmethod>` are registered.
+Registering a method only records it. Its docstring and signature are
+inspected when it is first called or introspected.
+'''
+
+from django.apps import AppConfig
+from django.conf import settings
+from django.utils.module_loading import autodiscover_modules
+
+
+class RPC4DjangoConfig(AppConfig):
+    name = 'rpc4django'
+    verbose_name = 'RPC4Django'
+
+    def ready(self):
+        for module_name in getattr(settings, 'RPC4DJANGO_RPC_MODULES', ('rpc',)):
+            autodiscover_modules(module_name)
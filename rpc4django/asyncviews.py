@@ -0,0 +1,213 @@
+'''
+An asynchronous version of
+:meth:`serve_rpc_request <rpc4django.views.serve_rpc_request>`
+for Django projects served with ASGI. It requires Python 3.5+
+and Django 3.1+.
+
+::
+
+    from rpc4django.asyncviews import serve_rpc_request_async
+
+    urlpatterns = [
+        path('RPC2', serve_rpc_request_async),
+    ]
+
+Methods defined with ``async def`` are awaited on the event loop. Everything
+else (format detection, the permission check and synchronous methods) runs
+in Django's thread sensitive executor. Streamed results are sent as an
+asynchronous iterator which encodes each chunk in the executor, so they
+are not buffered (with Django 4.2+, which accepts asynchronous iterators).
+
+'''
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponseForbidden
+
+from .columnar import format_result
+from .compression import ContentEncodingError
+from .limits import RequestTooLarge
+from .metrics import measure
+from .streaming import ColumnarResult, is_queryset, is_stream, materialize, prime_stream
+from .views import (dispatcher, is_rpc_call, authorize_rpc_request,
+                    content_encoding_error, make_rpc_response, request_too_large,
+                    serve_rpc_request)
+
+
+# returned by next() at the end of a streamed response
+STREAM_END = object()
+
+
+async def iter_stream_async(chunks):
+    '''
+    Yields the chunks of a streamed response, encoding each one in the
+    thread sensitive executor because it may read from the database
+    (eg. the rows of a QuerySet)
+    '''
+
+    chunks = iter(chunks)
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    while True:
+        chunk = await next_chunk(chunks, STREAM_END)
+        if chunk is STREAM_END:
+            return
+        yield chunk
+
+
+def format_stream(result, result_format):
+    '''
+    Returns the result of a coroutine method in ``result_format`` with the
+    first item of a streamed result read (see :func:`prime_stream
+    <rpc4django.streaming.prime_stream>`)
+
+    This reads from the database so it runs in the thread sensitive executor.
+    '''
+    return prime_stream(format_result(result, result_format))
+
+
+def format_materialized(result, result_format):
+    '''
+    Returns the result of a coroutine method in ``result_format`` with
+    a streamed result read whole (see :func:`materialize
+    <rpc4django.streaming.materialize>`)
+    '''
+    return materialize(format_result(result, result_format))
+
+
+async def dispatch_request_async(rpc_dispatcher, rpc_request, **kwargs):
+    '''
+    Asynchronously dispatches an
+    :class:`RPCRequest <rpc4django.rpcrequest.RPCRequest>`
+
+    A single call to a coroutine method is awaited directly (and its
+    result cached if it is marked with ``@rpcmethod(cache=...)``). Anything else
+    (synchronous methods, batches and ``system.multicall``) is dispatched
+    by :meth:`RPCDispatcher.dispatch_request
+    <rpc4django.rpcdispatcher.RPCDispatcher.dispatch_request>` in the
+    thread sensitive executor.
+    '''
+
+    if rpc_request.request_format == 'xml':
+        protocol = rpc_dispatcher.xmlrpcdispatcher
+    else:
+        protocol = rpc_dispatcher.jsonrpcdispatcher
+
+    call_plan = None
+    if rpc_request.batch is None and rpc_request.error is None and \
+            isinstance(rpc_request.method, str) and \
+            rpc_request.method in protocol.funcs:
+        call_plan = protocol.get_call_plan(rpc_request.method)
+
+    if call_plan is None or not call_plan.is_coroutine:
+        return await sync_to_async(rpc_dispatcher.dispatch_request,
+                                   thread_sensitive=True)(rpc_request, **kwargs)
+
+    error = protocol.check_request(rpc_request)
+    if error is not None:
+        return error
+
+    method = rpc_dispatcher.get_cached_method(rpc_request)
+    if method is not None:
+        return await dispatch_cached_async(rpc_dispatcher, protocol, method,
+                                           rpc_request, **kwargs)
+
+    func = protocol.funcs[rpc_request.method]
+    result_format = protocol.result_formats.get(rpc_request.method, None)
+    try:
+        params, kwargs = call_plan.bind(rpc_request.params, kwargs)
+        with measure('execute', rpc_request.method, protocol.request_format):
+            result = await func(*params, **kwargs)
+            if result_format is not None or is_queryset(result) or is_stream(result) or \
+                    isinstance(result, ColumnarResult):
+                # formatting can evaluate a QuerySet and the first item
+                # may come from the database
+                result = await sync_to_async(format_stream, thread_sensitive=True)(
+                    result, result_format)
+    except Exception as e:
+        return protocol.encode_exception(rpc_request, e)
+
+    with measure('encode', rpc_request.method, protocol.request_format):
+        return protocol.encode_result(rpc_request, result)
+
+
+async def dispatch_cached_async(rpc_dispatcher, protocol, method, rpc_request, **kwargs):
+    '''
+    Answers a call to a coroutine method marked with
+    ``@rpcmethod(cache=...)`` from the dispatcher's ``result_cache`` or
+    awaits it and caches its encoded result like
+    :meth:`RPCDispatcher.dispatch_request
+    <rpc4django.rpcdispatcher.RPCDispatcher.dispatch_request>`
+    '''
+
+    # the cache and the user of the request may need the database
+    key, fragment = await sync_to_async(rpc_dispatcher.get_cached_fragment,
+                                        thread_sensitive=True)(method, rpc_request, **kwargs)
+    if fragment is not None:
+        return protocol.wrap_result_fragment(rpc_request, fragment)
+
+    func = protocol.funcs[rpc_request.method]
+    call_plan = protocol.get_call_plan(rpc_request.method)
+    try:
+        params, kwargs = call_plan.bind(rpc_request.params, kwargs)
+        with measure('execute', rpc_request.method, protocol.request_format):
+            result = await func(*params, **kwargs)
+        # streamed results are cached whole
+        result = await sync_to_async(format_materialized, thread_sensitive=True)(
+            result, protocol.result_formats.get(rpc_request.method, None))
+    except Exception as e:
+        return protocol.encode_exception(rpc_request, e)
+
+    try:
+        with measure('encode', rpc_request.method, protocol.request_format):
+            fragment = protocol.encode_result_fragment(result)
+    except Exception:
+        return protocol.encode_result(rpc_request, result)
+
+    await sync_to_async(rpc_dispatcher.cache_fragment,
+                        thread_sensitive=True)(method, key, fragment)
+    return protocol.wrap_result_fragment(rpc_request, fragment)
+
+
+async def serve_rpc_request_async(request, rpc_dispatcher=None):
+    '''
+    Handles rpc calls like
+    :meth:`serve_rpc_request <rpc4django.views.serve_rpc_request>`
+    but awaits coroutine RPC methods natively
+
+    **Parameters**
+
+    ``request``
+        the Django HttpRequest object
+    ``rpc_dispatcher``
+        the :class:`RPCDispatcher <rpc4django.rpcdispatcher.RPCDispatcher>`
+        whose methods are served. Defaults to the global ``dispatcher``.
+
+    '''
+
+    if rpc_dispatcher is None:
+        rpc_dispatcher = dispatcher
+
+    if not is_rpc_call(request):
+        # OPTIONS and the method summary
+        return await sync_to_async(serve_rpc_request,
+                                   thread_sensitive=True)(request, rpc_dispatcher)
+
+    # the permission check can go through the authentication backends
+    try:
+        rpc_request = await sync_to_async(authorize_rpc_request,
+                                          thread_sensitive=True)(request, rpc_dispatcher)
+    except RequestTooLarge as e:
+        return request_too_large(e)
+    except ContentEncodingError as e:
+        return content_encoding_error(e)
+    if rpc_request is None:
+        return HttpResponseForbidden()
+
+    resp = await dispatch_request_async(rpc_dispatcher, rpc_request, request=request)
+    response = make_rpc_response(request, rpc_request, resp, rpc_dispatcher)
+    if response.streaming and getattr(response, 'is_async', None) is False:
+        # Django would read a synchronous iterator whole before sending it
+        response.streaming_content = iter_stream_async(response.streaming_content)
+    return response
+
+
+serve_rpc_request_async.csrf_exempt = True
@@ -0,0 +1,219 @@
+'''
+This module contains the call plan of an RPC method: everything the
+dispatchers need to know about a method's signature to call it. Plans are
+built once when a method is registered so that nothing is introspected
+when the method is called.
+'''
+
+import inspect
+from collections import namedtuple
+
+try:
+    from asgiref.sync import async_to_sync
+except ImportError:
+    # Django before 3.0
+    async_to_sync = None
+
+
+# the XMLRPC (xmlrpc-epi) and JSONRPC 2.0 code for invalid method parameters
+INVALID_PARAMS_ERROR = -32602
+
+
+class InvalidParamsError(Exception):
+    '''
+    Raised when the parameters of a call do not match the signature
+    of the method so that the method is never called
+    '''
+
+    code = INVALID_PARAMS_ERROR
+
+
+class CallPlan(namedtuple('CallPlan', ['takes_request', 'accepts_kwargs',
+                                       'accepts_varargs', 'args', 'defaults',
+                                       'kwonlyargs', 'required_kwonlyargs',
+                                       'is_coroutine'])):
+    '''
+    An immutable description of how to call an RPC method
+
+    **Attributes**
+
+    ``takes_request``
+      The first argument of the method (after ``self``) is ``request``
+      and the Django HttpRequest is passed positionally
+    ``accepts_kwargs``
+      The method takes ``**kwargs``
+    ``accepts_varargs``
+      The method takes ``*args``
+    ``args``
+      A tuple of the names of the positional arguments excluding
+      ``self`` and an injected ``request``
+    ``defaults``
+      A tuple of the default values of the last positional arguments
+    ``kwonlyargs``
+      A tuple of the names of the keyword only arguments
+    ``required_kwonlyargs``
+      A tuple of the names of the keyword only arguments without defaults
+    ``is_coroutine``
+      The method is an ``async def`` coroutine function
+
+    '''
+
+    __slots__ = ()
+
+    @property
+    def min_args(self):
+        '''
+        The minimum number of positional parameters the method can be called with
+        '''
+        return len(self.args) - len(self.defaults)
+
+    @property
+    def max_args(self):
+        '''
+        The maximum number of positional parameters the method can be called
+        with or ``None`` if the method takes ``*args``
+        '''
+        if self.accepts_varargs:
+            return None
+        return len(self.args)
+
+    def bind(self, params, kwargs):
+        '''
+        Returns the positional parameters and keyword arguments to call
+        the method with or raises :class:`InvalidParamsError` if the
+        method cannot be called with ``params``
+
+        ``kwargs`` are the keyword arguments the server passes to every
+        method (eg. ``request``). Only those the method accepts are kept,
+        so the method is called exactly once with arguments which match
+        its signature. If the method takes the request as its first
+        argument and the request is in ``kwargs``, it is passed
+        positionally. ``kwargs`` itself is never modified.
+        '''
+        params = tuple(params)
+        names = self.args
+        if self.takes_request:
+            if 'request' in kwargs:
+                params = (kwargs['request'],) + params
+            names = ('request',) + names
+
+        if not self.accepts_varargs and len(params) > len(names):
+            raise InvalidParamsError('%s parameters given, at most %s accepted' % (
+                len(params) - self.takes_request, len(self.args)))
+
+        # arguments filled by position cannot also be passed by keyword
+        unfilled = names[len(params):]
+        if self.accepts_kwargs:
+            bound = dict((k, v) for k, v in kwargs.items()
+                         if k not in names[:len(params)])
+        else:
+            bound = dict((k, v) for k, v in kwargs.items()
+                         if k in unfilled or k in self.kwonlyargs)
+
+        required = unfilled[:max(0, len(names) - len(self.defaults) - len(params))]
+        missing = [name for name in required + self.required_kwonlyargs
+                   if name not in bound]
+        if missing:
+            raise InvalidParamsError('missing parameters: %s' % ', '.join(missing))
+
+        return params, bound
+
+    def sync_callable(self, func):
+        '''
+        Returns a callable which calls ``func`` synchronously
+
+        Coroutine functions are run to completion with asgiref's
+        ``async_to_sync``. When called from a thread started by
+        ``sync_to_async`` (eg. by the async view) this runs the coroutine
+        on the server's event loop.
+        '''
+        if not self.is_coroutine:
+            return func
+        if async_to_sync is None:
+            raise Exception('asgiref is required to call coroutine methods')
+        return async_to_sync(func)
+
+
+# used for callables that cannot be inspected (eg. some builtins)
+# which are passed their params but none of the server's keyword arguments
+UNKNOWN_CALL_PLAN = CallPlan(takes_request=False, accepts_kwargs=False,
+                             accepts_varargs=True, args=(), defaults=(),
+                             kwonlyargs=(), required_kwonlyargs=(),
+                             is_coroutine=False)
+
+
+def get_argspec(func):
+    '''
+    Returns ``(args, varargs, varkw, defaults, annotations)`` for a callable
+    '''
+    try:  # Python 3
+        full_args = inspect.getfullargspec(func)
+        return (full_args.args, full_args.varargs, full_args.varkw,
+                full_args.defaults, full_args.annotations)
+    except AttributeError:  # Python 2
+        args, varargs, keywords, defaults = inspect.getargspec(func)
+        return args, varargs, keywords, defaults, {}
+
+
+def get_kwonlyargs(func):
+    '''
+    Returns the names of the keyword only arguments of a callable and the
+    names of those without defaults
+    '''
+    getfullargspec = getattr(inspect, 'getfullargspec', None)
+    if getfullargspec is None:
+        # Python 2 has no keyword only arguments
+        return (), ()
+    full_args = getfullargspec(func)
+    kwonlydefaults = full_args.kwonlydefaults or {}
+    return (tuple(full_args.kwonlyargs),
+            tuple(name for name in full_args.kwonlyargs if name not in kwonlydefaults))
+
+
+def build_call_plan(func, argspec=None):
+    '''
+    Builds the :class:`CallPlan` for a callable
+
+    ``argspec`` can be passed if the callable has already been inspected
+    (see :func:`get_argspec`)
+    '''
+    try:
+        if argspec is None:
+            argspec = get_argspec(func)
+        kwonlyargs, required_kwonlyargs = get_kwonlyargs(func)
+    except TypeError:
+        return UNKNOWN_CALL_PLAN
+
+    args, varargs, varkw, defaults, annotations = argspec
+    args = list(args)
+    if args and args[0] == 'self':
+        args = args[1:]
+
+    takes_request = bool(args) and args[0] == 'request'
+    if takes_request:
+        args = args[1:]
+
+    defaults = tuple(defaults or ())
+    if len(defaults) > len(args):
+        # the request (or self) argument has a default
+        defaults = defaults[len(defaults) - len(args):]
+
+    return CallPlan(takes_request=takes_request,
+                    accepts_kwargs=varkw is not None,
+                    accepts_varargs=varargs is not None,
+                    args=tuple(args),
+                    defaults=defaults,
+                    kwonlyargs=kwonlyargs,
+                    required_kwonlyargs=required_kwonlyargs,
+                    is_coroutine=is_coroutine_function(func))
+
+
+def is_coroutine_function(func):
+    '''
+    Returns whether ``func`` is an ``async def`` coroutine function
+    '''
+    iscoroutinefunction = getattr(inspect, 'iscoroutinefunction', None)
+    if iscoroutinefunction is None:
+        # Python before 3.5
+        return False
+    return iscoroutinefunction(func)
@@ -0,0 +1,129 @@
+'''
+This module contains the tabular result formats of RPC methods registered
+with ``@rpcmethod(result_format=...)``.
+
+Methods which return a table, a Django QuerySet or a list or iterator of
+dictionaries with the same keys, repeat every key in every row of their
+responses. With ``result_format='columnar'`` the keys are only sent once::
+
+    {"columns": ["id", "name"], "rows": [[1, "a"], [2, "b"]]}
+
+and with ``result_format='column_major'`` each column is one array::
+
+    {"id": [1, 2], "name": ["a", "b"]}
+
+The rows of a QuerySet are read with ``values_list(...).iterator()`` so
+no model instances or dictionaries are created for them. Columnar results
+are encoded directly from their rows (see :class:`ColumnarResult
+<rpc4django.streaming.ColumnarResult>`) and those read from a QuerySet or
+an iterator are streamed in batches of rows as they are read. Column
+major results are always built in memory.
+'''
+
+from collections import OrderedDict
+from itertools import chain
+from operator import itemgetter
+
+from .streaming import ColumnarResult, is_queryset, is_stream, iter_queryset
+
+try:
+    # Python2
+    from itertools import imap as map
+except ImportError:
+    # Python3
+    pass
+
+RESULT_FORMATS = ('columnar', 'column_major')
+
+
+def get_queryset_table(queryset):
+    '''
+    Returns the names of the columns of a QuerySet and an iterator of its
+    rows as tuples
+
+    The columns are the fields selected with ``values()`` or
+    ``values_list()`` or, for a QuerySet of model instances, the concrete
+    fields of the model and any annotations.
+    '''
+
+    if getattr(queryset, '_fields', None) is None:
+        # neither values() nor values_list()
+        queryset = queryset.values()
+
+    query = queryset.query
+    columns = list(query.extra_select) + list(query.values_select) + \
+        list(query.annotation_select)
+    return columns, iter_queryset(queryset.values_list(*columns))
+
+
+def get_table(result):
+    '''
+    Returns the names of the columns of a result and an iterator of its
+    rows as tuples
+
+    The result is a QuerySet or an iterable of dictionaries. The columns
+    are the keys of the first dictionary and every other dictionary must
+    have the same keys. A row which is not a dictionary or has other keys
+    raises ``TypeError`` when it is read (so as a stream is consumed).
+    '''
+
+    if is_queryset(result):
+        return get_queryset_table(result)
+
+    rows = iter(result)
+    for first in rows:
+        break
+    else:
+        return [], iter(())
+
+    if not isinstance(first, dict):
+        raise TypeError('cannot format %s rows as columns' % type(first))
+
+    columns = list(first.keys())
+    if len(columns) == 1:
+        column = columns[0]
+
+        def getter(row):
+            return (row[column],)
+    else:
+        getter = itemgetter(*columns)
+
+    def get_row(row):
+        # a row with as many keys which has every column has the same keys
+        if isinstance(row, dict) and len(row) == len(columns):
+            try:
+                return getter(row)
+            except KeyError:
+                pass
+        if not isinstance(row, dict):
+            raise TypeError('cannot format %s rows as columns' % type(row))
+        raise TypeError('cannot format a row with the keys %s as the columns %s' %
+                        (sorted(row, key=str), columns))
+
+    return columns, map(get_row, chain((first,), rows))
+
+
+def format_result(result, result_format):
+    '''
+    Returns the result of an RPC method in ``result_format``
+    (one of ``RESULT_FORMATS`` or ``None`` for the result unchanged)
+
+    A QuerySet returned without a ``result_format`` is returned as an
+    iterator of its rows (see :func:`iter_queryset
+    <rpc4django.streaming.iter_queryset>`) so it is streamed.
+    '''
+
+    if result_format is None:
+        if is_queryset(result):
+            return iter_queryset(result)
+        return result
+
+    columns, rows = get_table(result)
+
+    if result_format == 'column_major':
+        values = list(zip(*rows)) or [()] * len(columns)
+        return OrderedDict(zip(columns, map(list, values)))
+
+    if is_stream(result) or is_queryset(result):
+        return ColumnarResult(columns, rows)
+    return ColumnarResult(columns, list(rows))
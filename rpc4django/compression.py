@@ -0,0 +1,237 @@
+'''
+This module contains the compression of RPC requests and responses.
+
+Request bodies sent with ``Content-Encoding: gzip`` (as sent by
+``xmlrpc.client.Transport`` above its ``encode_threshold``) or
+``deflate`` are decompressed a chunk at a time so
+:envvar:`RPC4DJANGO_MAX_REQUEST_SIZE` also limits the size of the
+decompressed body and a small compressed request cannot expand without
+bounds.
+
+If :envvar:`RPC4DJANGO_COMPRESS_RESPONSES` is set, responses are
+compressed with the best encoding in the ``Accept-Encoding`` of the
+request: ``br`` if `brotli <https://github.com/google/brotli>`_ is
+installed, ``gzip`` or ``deflate``. Responses smaller than
+:envvar:`RPC4DJANGO_COMPRESSION_MIN_SIZE` are sent as they are.
+Streamed responses are compressed chunk by chunk as they are sent so the
+whole response is never in memory, compressed or not.
+'''
+
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+COMPRESS_RESPONSES = getattr(settings, 'RPC4DJANGO_COMPRESS_RESPONSES', False)
+COMPRESSION_MIN_SIZE = getattr(settings, 'RPC4DJANGO_COMPRESSION_MIN_SIZE', 1024)
+COMPRESSION_LEVEL = getattr(settings, 'RPC4DJANGO_COMPRESSION_LEVEL', 6)
+
+# the window bits selecting each zlib format
+ZLIB_WBITS = {
+    'gzip': 16 + zlib.MAX_WBITS,
+    'x-gzip': 16 + zlib.MAX_WBITS,
+    'deflate': zlib.MAX_WBITS,
+}
+
+# the encodings responses can be compressed with in order of preference
+ENCODINGS = ('br', 'gzip', 'deflate') if brotli is not None else ('gzip', 'deflate')
+
+# the maximum number of bytes decompressed from a request body at a time
+DECOMPRESS_CHUNK_SIZE = 64 * 1024
+
+
+class ContentEncodingError(Exception):
+    '''
+    Raised when a request body cannot be decompressed
+    '''
+    status = 400
+
+
+class UnsupportedContentEncoding(ContentEncodingError):
+    '''
+    Raised when a request body has a Content-Encoding which is not supported
+    '''
+    status = 415
+
+
+def iter_decompressed(data, content_encoding, chunk_size=None):
+    '''
+    Yields the decompressed body of a request with ``content_encoding``
+    (``gzip`` or ``deflate``) in chunks of at most ``chunk_size`` bytes
+
+    Brotli request bodies are not supported because they cannot be
+    decompressed into bounded chunks with every version of brotli.
+    '''
+
+    content_encoding = (content_encoding or 'identity').strip().lower()
+    if content_encoding == 'identity':
+        yield data
+        return
+
+    if content_encoding not in ZLIB_WBITS:
+        raise UnsupportedContentEncoding(
+            'The Content-Encoding "%s" is not supported' % content_encoding)
+
+    chunk_size = chunk_size or DECOMPRESS_CHUNK_SIZE
+    decompressor = zlib.decompressobj(ZLIB_WBITS[content_encoding])
+    try:
+        while True:
+            chunk = decompressor.decompress(data, chunk_size)
+            data = decompressor.unconsumed_tail
+            if chunk:
+                yield chunk
+            elif not data:
+                break
+    except zlib.error as e:
+        raise ContentEncodingError('The request body could not be decompressed: %s' % e)
+
+    if not decompressor.eof:
+        raise ContentEncodingError('The compressed request body is incomplete')
+
+
+class ZlibCompressor(object):
+    '''
+    Compresses a response with zlib in the ``gzip`` or ``deflate`` format
+    '''
+
+    def __init__(self, encoding, level):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, ZLIB_WBITS[encoding])
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+class BrotliCompressor(object):
+    '''
+    Compresses a response with brotli. The level is the brotli quality
+    (0 to 11).
+    '''
+
+    def __init__(self, encoding, level):
+        self.compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self.compressor.process(data)
+
+    def flush(self):
+        return self.compressor.flush()
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+def get_compressor(encoding, level=None):
+    '''
+    Returns a compressor for one of ``ENCODINGS`` with ``compress``,
+    ``flush`` and ``finish`` methods
+    '''
+
+    if level is None:
+        level = COMPRESSION_LEVEL
+    if encoding == 'br':
+        return BrotliCompressor(encoding, level)
+    return ZlibCompressor(encoding, level)
+
+
+def choose_encoding(accept_encoding, encodings=ENCODINGS):
+    '''
+    Returns the first of ``encodings`` with the highest quality in an
+    ``Accept-Encoding`` header or ``None`` if the response should not be
+    compressed
+    '''
+
+    accepted = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding.strip().lower()] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in encodings:
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress_stream(chunks, encoding, level=None):
+    '''
+    Yields the compressed chunks of a streamed response
+
+    Each chunk is flushed so that the client receives it without waiting
+    for the rest of the response.
+    '''
+
+    compressor = get_compressor(encoding, level)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def compress_response(request, response, min_size=None, level=None):
+    '''
+    Compresses an HttpResponse or StreamingHttpResponse with the encoding
+    negotiated from the ``Accept-Encoding`` of the request
+
+    Responses smaller than ``min_size`` bytes (by default
+    :envvar:`RPC4DJANGO_COMPRESSION_MIN_SIZE`), responses which would not
+    be smaller and responses which already have a Content-Encoding are
+    returned as they are.
+    '''
+
+    if min_size is None:
+        min_size = COMPRESSION_MIN_SIZE
+
+    if response.status_code != 200 or response.has_header('Content-Encoding'):
+        return response
+    if not response.streaming and len(response.content) < min_size:
+        return response
+
+    patch_vary_headers(response, ('Accept-Encoding',))
+
+    encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    if encoding is None:
+        return response
+
+    if response.streaming:
+        response.streaming_content = compress_stream(response.streaming_content,
+                                                     encoding, level)
+        if response.has_header('Content-Length'):
+            del response['Content-Length']
+    else:
+        compressor = get_compressor(encoding, level)
+        content = compressor.compress(response.content) + compressor.finish()
+        if len(content) >= len(response.content):
+            return response
+        response.content = content
+        response['Content-Length'] = str(len(content))
+
+    # the ETag of the uncompressed response is weak for the compressed one
+    etag = response.get('ETag', None)
+    if etag and etag.startswith('"'):
+        response['ETag'] = 'W/' + etag
+    response['Content-Encoding'] = encoding
+    return response
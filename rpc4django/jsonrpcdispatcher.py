@@ -5,12 +5,16 @@ see http://json-rpc.org/wiki/specification
 '''
 
 import json
-import inspect
 
-# indent the json output by this many characters
-# 0 does newlines only and None does most compact
-# This is consistent with SimpleXMLRPCServer output
-JSON_INDENT = 0
+from . import limits
+from .callplan import CallPlan, InvalidParamsError, build_call_plan
+from .columnar import format_result
+from .jsonserializers import JSON_INDENT, get_serializer  # noqa
+from .limits import check_json_limits
+from .metrics import measure
+from .rpcrequest import RPCRequest
+from .streaming import ColumnarResult, encode_stream, is_stream, prime_stream
+from .workers import map_concurrently
 
 # These error codes may be defined by the json-rpc spec at a later date
 # see http://json-rpc.org/wd/JSON-RPC-1-1-WD-20060807.html#ErrorObject
@@ -28,6 +32,12 @@ except NameError:
     # Python3
     basestring = str
 
+try:
+    RecursionError
+except NameError:
+    # Python2
+    RecursionError = RuntimeError
+
 
 class JSONRPCException(Exception):
     def __init__(self, message, code):
@@ -42,17 +52,70 @@ class JSONRPCDispatcher(object):
     or error.
     '''
 
-    def __init__(self, json_encoder=None):
+    request_format = 'json'
+
+    def __init__(self, json_encoder=None, concurrent_batches=False,
+                 compact=False, serializer=None, worker_pool=None):
         self.json_encoder = json_encoder
+        self.concurrent_batches = concurrent_batches
+        self.worker_pool = worker_pool
+        self.compact = compact
+        self.serializer_backend = serializer
+        self._serializer = None
         self.funcs = {}
+        self.call_plans = {}
+        self.result_formats = {}
 
-    def register_function(self, method, external_name):
+    @property
+    def serializer(self):
+        '''
+        The backend which encodes responses (see :mod:`rpc4django.jsonserializers`)
+
+        It is created when the first response is encoded so that the JSON
+        encoder and the backend (which may be dotted paths) are not imported
+        by processes which never answer a JSONRPC request.
+        '''
+        if self._serializer is None:
+            self._serializer = get_serializer(self.serializer_backend,
+                                              self.json_encoder, self.compact)
+        return self._serializer
+
+    def register_function(self, method, external_name, call_plan=None,
+                          result_format=None):
         '''
         Registers a method with the jsonrpc dispatcher.
 
         This method can be called later via the dispatch method.
+        ``call_plan`` is the :class:`CallPlan <rpc4django.callplan.CallPlan>`
+        of the method or a function returning it, which is called when the
+        method is first called. If it is not passed, it is built from the
+        method when the method is first called. ``result_format`` is the format
+        its results are returned in (see :mod:`rpc4django.columnar`).
         '''
         self.funcs[external_name] = method
+        if call_plan is None:
+            self.call_plans.pop(external_name, None)
+        else:
+            self.call_plans[external_name] = call_plan
+        if result_format is None:
+            self.result_formats.pop(external_name, None)
+        else:
+            self.result_formats[external_name] = result_format
+
+    def get_call_plan(self, method):
+        '''
+        Returns the :class:`CallPlan <rpc4django.callplan.CallPlan>`
+        of a registered method
+        '''
+        call_plan = self.call_plans.get(method, None)
+        if call_plan is None:
+            # the method was registered without a call plan
+            # or added to funcs directly
+            call_plan = self.call_plans[method] = build_call_plan(self.funcs[method])
+        elif not isinstance(call_plan, CallPlan):
+            # the plan is resolved when it is first needed
+            call_plan = self.call_plans[method] = call_plan()
+        return call_plan
 
     def _encode_result(self, jsonid, result, error):
         res = {'jsonrpc': '2.0', 'id': jsonid}
@@ -63,7 +126,7 @@ class JSONRPCDispatcher(object):
             res['error'] = error
             res['error']['name'] = 'JSONRPCError'
         try:
-            return json.dumps(res, indent=JSON_INDENT, cls=self.json_encoder)
+            return self.serializer.dumps(res)
         except Exception as e:
             err = {'message': 'failed to encode return value, {}'.format(e),
                    'code': JSONRPC_SERVICE_ERROR,
@@ -71,17 +134,73 @@ class JSONRPCDispatcher(object):
 
             res['result'] = None
             res['error'] = err
-            return json.dumps(res, indent=JSON_INDENT, cls=self.json_encoder)
+            return self.serializer.dumps(res)
+
+    def parse(self, json_data):
+        '''
+        Decodes the passed json encoded string into an
+        :class:`RPCRequest <rpc4django.rpcrequest.RPCRequest>`
+
+        The request is not validated against the json-rpc spec here.
+        That is done by :meth:`dispatch_request`. Raises
+        :class:`RequestTooLarge <rpc4django.limits.RequestTooLarge>` before
+        decoding if the body is nested too deeply or contains a string
+        which is too long (see :func:`check_json_limits
+        <rpc4django.limits.check_json_limits>`).
+        '''
+
+        try:
+            if isinstance(json_data, bytes):
+                json_data = json_data.decode('utf-8')
+            check_json_limits(json_data, limits.MAX_DEPTH, limits.MAX_STRING_SIZE)
+            # attempt to do a json decode on the data
+            jsondict = json.loads(json_data)
+        except (ValueError, RecursionError) as e:
+            # a body nested deeper than the recursion limit is a parse error
+            return RPCRequest('json', error=e)
+
+        if isinstance(jsondict, list):
+            # a JSONRPC 2.0 batch
+            return RPCRequest('json', data=jsondict,
+                              batch=[self._parse_decoded(call) for call in jsondict])
+
+        return self._parse_decoded(jsondict)
+
+    def _parse_decoded(self, jsondict):
+        if not isinstance(jsondict, dict):
+            return RPCRequest('json', data=jsondict)
+
+        params = jsondict.get('params', [])
+        return RPCRequest('json',
+                          method=jsondict.get('method'),
+                          params=tuple(params) if isinstance(params, list) else (),
+                          rpcid=jsondict.get('id', ''),
+                          data=jsondict)
 
     def dispatch(self, json_data, **kwargs):
         '''
-        Verifies that the passed json encoded string
+        Decodes the passed json encoded string and dispatches it
+        using :meth:`dispatch_request`
+
+        Returns the JSON encoded response
+        '''
+
+        return self.dispatch_request(self.parse(json_data), **kwargs)
+
+    def dispatch_request(self, rpc_request, **kwargs):
+        '''
+        Verifies that the passed
+        :class:`RPCRequest <rpc4django.rpcrequest.RPCRequest>`
         is in the correct form according to the json-rpc spec
         and calls the appropriate Python method
 
+        A JSONRPC 2.0 batch (a javascript Array of requests) is answered
+        with an Array of the responses.
+
         **Checks**
 
          1. that the string encodes into a javascript Object (dictionary)
+            or an Array of Objects
          2. that 'method' and 'params' are present
          3. 'method' must be a javascript String type
          4. 'params', if passed, must be a javascript Array type
@@ -89,14 +208,35 @@ class JSONRPCDispatcher(object):
         Returns the JSON encoded response
         '''
 
+        if rpc_request.batch is not None:
+            return self._dispatch_batch(rpc_request.batch, **kwargs)
+
+        error = self.check_request(rpc_request)
+        if error is not None:
+            return error
+
         try:
-            # attempt to do a json decode on the data
-            jsondict = json.loads(json_data)
-        except ValueError:
+            result = self._dispatch(rpc_request.method, rpc_request.params, **kwargs)
+        except Exception as e:
+            return self.encode_exception(rpc_request, e)
+
+        with measure('encode', rpc_request.method, self.request_format):
+            return self.encode_result(rpc_request, result)
+
+    def check_request(self, rpc_request):
+        '''
+        Verifies a single (not batch) request and returns the JSON encoded
+        error response if it is not a valid call to a registered method
+        or ``None`` if it is
+        '''
+
+        if rpc_request.error is not None:
             return self._encode_result('', None, {
                 'message': 'JSON decoding error',
                 'code': JSONRPC_PARSE_ERROR})
 
+        jsondict = rpc_request.data
+
         if not isinstance(jsondict, dict):
             # verify the json data was a javascript Object which gets decoded
             # into a python dictionary
@@ -106,42 +246,138 @@ class JSONRPCDispatcher(object):
 
         if 'method' not in jsondict:
             # verify the dictionary contains the method key
-            return self._encode_result(jsondict.get('id', ''), None, {
+            return self._encode_result(rpc_request.id, None, {
                 'message': "JSONRPC requests must have the 'method' attribute.",
                 'code': JSONRPC_BAD_CALL_ERROR})
 
         if not isinstance(jsondict['method'], basestring):
-            return self._encode_result(jsondict.get('id', ''), None, {
+            return self._encode_result(rpc_request.id, None, {
                 'message': 'method must be a javascript String',
                 'code': JSONRPC_BAD_CALL_ERROR})
 
         if 'params' in jsondict and not isinstance(jsondict['params'], list):
-            return self._encode_result(jsondict.get('id', ''), None, {
+            return self._encode_result(rpc_request.id, None, {
                 'message': 'params must be a javascript Array',
                 'code': JSONRPC_BAD_CALL_ERROR})
 
         if not jsondict['method'] in self.funcs:
-            return self._encode_result(jsondict.get('id', ''), None, {
+            return self._encode_result(rpc_request.id, None, {
                 'message': 'method "%s" is not supported' % jsondict['method'],
                 'code': JSONRPC_PROCEDURE_NOT_FOUND_ERROR})
 
+        return None
+
+    def encode_result(self, rpc_request, result):
+        '''
+        Returns the JSON encoded response for a successful call
+
+        If the result is a generator or other iterator or a
+        :class:`ColumnarResult <rpc4django.streaming.ColumnarResult>`, an
+        iterator of the chunks of the encoded response is returned instead
+        of a string (see :mod:`rpc4django.streaming`)
+        '''
+
+        if is_stream(result):
+            prefix = '{"jsonrpc": "2.0", "id": %s, "result": [' % \
+                self.serializer.dumps(rpc_request.id)
+            return encode_stream(result, self.serializer.dumps,
+                                 prefix, ', ', ']}')
+
+        if isinstance(result, ColumnarResult):
+            return self._encode_columnar(rpc_request, result)
+
+        return self._encode_result(rpc_request.id, result, None)
+
+    def _encode_columnar(self, rpc_request, result):
+        prefix = '{"jsonrpc": "2.0", "id": %s, "result": {"columns": %s, "rows": [' % (
+            self.serializer.dumps(rpc_request.id), self.serializer.dumps(result.columns))
+
+        if is_stream(result.rows):
+            return encode_stream(result.iter_batches(), self._encode_rows,
+                                 prefix, ', ', ']}}')
+
         try:
-            method = jsondict.get('method')
-            params = tuple(jsondict.get('params', []))
-            result = self._dispatch(method, params, **kwargs)
-        except JSONRPCException as e:
-            # Custom message and code
-            return self._encode_result(jsondict.get('id', ''), None, {
-                'message': e.message, 'code': e.code})
+            return prefix + self._encode_rows(result.rows) + ']}}'
         except Exception as e:
-            # this catches any error from the called method raising
-            # an exception to the wrong number of params being sent
-            # to the method.
-            return self._encode_result(jsondict.get('id', ''), None, {
-                'message': repr(e),
+            return self._encode_result(rpc_request.id, None, {
+                'message': 'failed to encode return value, {}'.format(e),
                 'code': JSONRPC_SERVICE_ERROR})
 
-        return self._encode_result(jsondict.get('id', ''), result, None)
+    def _encode_rows(self, rows):
+        # the rows without the brackets of the array
+        return self.serializer.dumps(rows)[1:-1]
+
+    def encode_result_fragment(self, result):
+        '''
+        Encodes just the result of a call so that it can be cached and
+        reused for any request with :meth:`wrap_result_fragment`
+
+        Raises an exception if the result cannot be encoded
+        '''
+
+        return self.serializer.dumps(result)
+
+    def wrap_result_fragment(self, rpc_request, fragment):
+        '''
+        Returns the JSON encoded response to ``rpc_request`` for a result
+        encoded by :meth:`encode_result_fragment`
+        '''
+
+        return '{"jsonrpc": "2.0", "id": %s, "result": %s}' % (
+            self.serializer.dumps(rpc_request.id), fragment)
+
+    def encode_exception(self, rpc_request, e):
+        '''
+        Returns the JSON encoded error response for an exception
+        raised by a call
+        '''
+
+        if isinstance(e, JSONRPCException):
+            # Custom message and code
+            return self._encode_result(rpc_request.id, None, {
+                'message': e.message, 'code': e.code})
+
+        if isinstance(e, InvalidParamsError):
+            return self._encode_result(rpc_request.id, None, {
+                'message': str(e), 'code': e.code})
+
+        # this catches any error raised by the called method
+        return self._encode_result(rpc_request.id, None, {
+            'message': repr(e),
+            'code': JSONRPC_SERVICE_ERROR})
+
+    def _dispatch_batch(self, batch, **kwargs):
+        '''
+        Dispatches each call of a JSONRPC 2.0 batch and returns the
+        JSON encoded array of responses
+
+        Notifications are called but get no response. If
+        ``concurrent_batches`` is set, the calls are run on
+        ``worker_pool`` or the default worker thread pool
+        (see :mod:`rpc4django.workers`).
+        '''
+
+        if not batch:
+            return self._encode_result('', None, {
+                'message': 'A batch must contain at least one call',
+                'code': JSONRPC_BAD_CALL_ERROR})
+
+        def dispatch_call(rpc_request):
+            return self.dispatch_request(rpc_request, **kwargs)
+
+        if self.concurrent_batches:
+            responses = map_concurrently(dispatch_call, batch, pool=self.worker_pool)
+        else:
+            responses = [dispatch_call(rpc_request) for rpc_request in batch]
+
+        # streamed results are joined into the batch response
+        responses = [response if isinstance(response, basestring) else ''.join(response)
+                     for rpc_request, response in zip(batch, responses)
+                     if not rpc_request.is_notification]
+        if not responses:
+            # a batch of only notifications gets nothing back
+            return ''
+        return '[' + ',\n'.join(responses) + ']'
 
     def _dispatch(self, method, params, **kwargs):
         """
@@ -149,23 +385,16 @@ class JSONRPCDispatcher(object):
         """
 
         func = self.funcs.get(method, None)
-        # add some magic
-        # if request is the first arg of func and request is provided in kwargs we inject it
-        try:  # Python 3
-            full_args = inspect.getfullargspec(func)
-            args = full_args.args
-        except AttributeError:  # Python 2
-            args = inspect.getargspec(func)[0]
-        if args and args[0] == 'self':
-            args = args[1:]
-        if 'request' in kwargs and args and args[0] == 'request':
-            request = kwargs.pop('request')
-            params = (request,) + params
-        if func is not None:
-            try:
-                return func(*params, **kwargs)
-            except TypeError:
-                # Catch unexpected keyword argument error
-                return func(*params)
-        else:
+        if func is None:
             raise Exception('method "%s" is not supported' % method)
+
+        # the arguments are checked against the signature before the call
+        # so a TypeError raised by the method itself is never mistaken for
+        # a bad call
+        call_plan = self.get_call_plan(method)
+        params, kwargs = call_plan.bind(params, kwargs)
+        func = call_plan.sync_callable(func)
+        with measure('execute', method, self.request_format):
+            result = func(*params, **kwargs)
+            result = prime_stream(format_result(result, self.result_formats.get(method, None)))
+        return result
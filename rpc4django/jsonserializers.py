@@ -0,0 +1,110 @@
+'''
+This module contains the backends used by the
+:class:`JSONRPCDispatcher <rpc4django.jsonrpcdispatcher.JSONRPCDispatcher>`
+to encode responses. The backend is selected with
+:envvar:`RPC4DJANGO_JSON_SERIALIZER`.
+
+A backend is a class which is instantiated with the JSON encoder class
+(:envvar:`RPC4DJANGO_JSON_ENCODER`) and whether to produce compact output
+and which has a ``dumps(obj)`` method returning a string.
+'''
+
+import json
+
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+try:
+    # Python2
+    basestring
+except NameError:
+    # Python3
+    basestring = str
+
+# indent the json output by this many characters
+# 0 does newlines only and None does most compact
+# This is consistent with SimpleXMLRPCServer output
+JSON_INDENT = 0
+
+# no whitespace at all after separators
+COMPACT_SEPARATORS = (',', ':')
+
+
+class JSONSerializer(object):
+    '''
+    Encodes with the standard library json module
+
+    In compact mode, no whitespace is written and the C accelerated encoder
+    of the json module is used (it is only used when there is no indent).
+    The encoder is created once and reused for every response.
+    '''
+
+    def __init__(self, json_encoder=None, compact=False):
+        json_encoder = json_encoder or json.JSONEncoder
+        if compact:
+            self.encoder = json_encoder(separators=COMPACT_SEPARATORS)
+        else:
+            self.encoder = json_encoder(indent=JSON_INDENT)
+
+    def dumps(self, obj):
+        return self.encoder.encode(obj)
+
+
+class ORJSONSerializer(object):
+    '''
+    Encodes with `orjson <https://github.com/ijl/orjson>`_ if it is installed
+
+    Types orjson does not handle natively, as well as dates and times
+    (so that they are formatted exactly like the JSON encoder formats them),
+    are passed to the ``default`` method of the JSON encoder. orjson output
+    is always compact and, unlike the json module, orjson cannot encode
+    integers larger than 64 bits.
+    '''
+
+    def __init__(self, json_encoder=None, compact=False):
+        import orjson
+        self.orjson = orjson
+        self.default = (json_encoder or json.JSONEncoder)().default
+        self.option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj):
+        return self.orjson.dumps(obj, default=self.default,
+                                 option=self.option).decode('utf-8')
+
+
+SERIALIZERS = {
+    'json': JSONSerializer,
+    'orjson': ORJSONSerializer,
+}
+
+
+def get_serializer(serializer, json_encoder=None, compact=False):
+    '''
+    Instantiates a serializer backend given its class, a name in
+    ``SERIALIZERS`` or ``'auto'`` for the fastest installed backend
+
+    Falls back to :class:`JSONSerializer` if the backend's library
+    is not installed. The serializer and the JSON encoder class can also
+    be dotted paths. Raises ``ImproperlyConfigured`` if the serializer is
+    neither a known name nor a dotted path which can be imported.
+    '''
+
+    if isinstance(json_encoder, basestring):
+        json_encoder = import_string(json_encoder)
+
+    if serializer == 'auto':
+        serializer = 'orjson'
+    serializer_class = SERIALIZERS.get(serializer, serializer) or JSONSerializer
+    if isinstance(serializer_class, basestring):
+        try:
+            serializer_class = import_string(serializer_class)
+        except ImportError as e:
+            raise ImproperlyConfigured(
+                'RPC4DJANGO_JSON_SERIALIZER must be one of %s, "auto" or a dotted path '
+                'to a serializer class, not "%s" (%s)' % (
+                    ', '.join('"%s"' % name for name in sorted(SERIALIZERS)), serializer, e))
+
+    try:
+        return serializer_class(json_encoder, compact)
+    except ImportError:
+        return JSONSerializer(json_encoder, compact)
@@ -0,0 +1,355 @@
+'''
+This module contains the limits on the size of RPC requests. The body of
+a request is read in chunks and rejected as soon as it is larger than
+:envvar:`RPC4DJANGO_MAX_REQUEST_SIZE` so an oversized request is never
+fully buffered or parsed. A compressed body is also limited to
+:envvar:`RPC4DJANGO_MAX_DECOMPRESSED_SIZE` once it is decompressed,
+which is enabled by default. The number of calls in a multicall or batch
+(:envvar:`RPC4DJANGO_MAX_CALLS`), the nesting depth of the parameters
+(:envvar:`RPC4DJANGO_MAX_DEPTH`) and the size of the strings in them
+(:envvar:`RPC4DJANGO_MAX_STRING_SIZE`) are checked before any method is
+called. The nesting depth and string sizes are also checked while the
+body is parsed (see :func:`check_json_limits` and
+:mod:`rpc4django.xmlrpcparser`) so a deeply nested body is rejected before
+it is decoded.
+
+Every limit is disabled when it is ``None``.
+'''
+
+import json
+import re
+
+from django.conf import settings
+
+from .compression import iter_decompressed
+from .streaming import is_stream
+
+try:
+    # Python2
+    basestring
+except NameError:
+    # Python3
+    basestring = str
+
+MAX_REQUEST_SIZE = getattr(settings, 'RPC4DJANGO_MAX_REQUEST_SIZE', None)
+MAX_DECOMPRESSED_SIZE = getattr(settings, 'RPC4DJANGO_MAX_DECOMPRESSED_SIZE',
+                                10 * 1024 * 1024)
+MAX_CALLS = getattr(settings, 'RPC4DJANGO_MAX_CALLS', None)
+MAX_DEPTH = getattr(settings, 'RPC4DJANGO_MAX_DEPTH', None)
+MAX_STRING_SIZE = getattr(settings, 'RPC4DJANGO_MAX_STRING_SIZE', None)
+
+# the number of bytes of the request body read at a time
+READ_CHUNK_SIZE = 64 * 1024
+
+# a JSON string or one of the brackets of an array or object
+JSON_TOKEN = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|[\[\]{}]')
+
+# the levels of a JSONRPC request around its parameters
+# (the request object and the params array)
+JSON_REQUEST_DEPTH = 2
+
+
+class RequestTooLarge(Exception):
+    '''
+    Raised when an RPC request exceeds one of the limits
+    '''
+    pass
+
+
+def read_request_body(request, max_size=None):
+    '''
+    Returns the body of an HttpRequest or raises :class:`RequestTooLarge`
+    if it is larger than ``max_size`` bytes
+    (:envvar:`RPC4DJANGO_MAX_REQUEST_SIZE` by default)
+
+    A request whose Content-Length is too large is rejected without
+    reading its body. Otherwise, the body is read in chunks and reading
+    stops as soon as the limit is passed (eg. for chunked requests which
+    understate their size). A body with a Content-Encoding is
+    decompressed (see :mod:`rpc4django.compression`) and the decompressed
+    body is limited to the smaller of ``max_size`` and
+    :envvar:`RPC4DJANGO_MAX_DECOMPRESSED_SIZE`. ``request.body`` is always
+    the body as it was sent.
+    '''
+
+    body = getattr(request, '_rpc4django_body', None)
+    if body is not None:
+        return body
+
+    if max_size is None:
+        max_size = MAX_REQUEST_SIZE
+
+    if max_size is None or hasattr(request, '_body') or not hasattr(request, 'read'):
+        # the body was already read (or there is no limit)
+        body = request.body
+        if max_size is not None and len(body) > max_size:
+            raise RequestTooLarge('The request body is larger than %s bytes' % max_size)
+    else:
+        body = read_limited(request, max_size)
+
+    content_encoding = request.META.get('HTTP_CONTENT_ENCODING', None)
+    if content_encoding:
+        decompressed_size = MAX_DECOMPRESSED_SIZE
+        if decompressed_size is None or (max_size is not None and max_size < decompressed_size):
+            decompressed_size = max_size
+        body = decompress_body(body, content_encoding, decompressed_size)
+
+    request._rpc4django_body = body
+    return body
+
+
+def read_limited(request, max_size):
+    '''
+    Reads the body of an HttpRequest in chunks and raises
+    :class:`RequestTooLarge` as soon as it is larger than ``max_size`` bytes
+    '''
+
+    if int(request.META.get('CONTENT_LENGTH') or 0) > max_size:
+        raise RequestTooLarge('The request body is larger than %s bytes' % max_size)
+
+    chunks = []
+    size = 0
+    while True:
+        # never read more than one byte past the limit
+        chunk = request.read(min(READ_CHUNK_SIZE, max_size + 1 - size))
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_size:
+            raise RequestTooLarge('The request body is larger than %s bytes' % max_size)
+        chunks.append(chunk)
+
+    body = b''.join(chunks)
+
+    # Django's HttpRequest.body returns this rather than reading the stream
+    request._body = body
+    return body
+
+
+class RequestStream(object):
+    '''
+    A file-like object reading the body of an HttpRequest as it is parsed
+    which raises :class:`RequestTooLarge` as soon as more than
+    ``max_size`` bytes are read
+
+    The chunks read are kept (in ``chunks``) until :meth:`release` is
+    called so that :meth:`finish` can make them available as
+    ``request.body``.
+    '''
+
+    def __init__(self, request, max_size=None):
+        self.request = request
+        self.max_size = max_size
+        self.size = 0
+        self.chunks = []
+
+    def read(self, size):
+        if self.max_size is not None:
+            # never read more than one byte past the limit
+            size = min(size, self.max_size + 1 - self.size)
+        chunk = self.request.read(size)
+        self.size += len(chunk)
+        if self.max_size is not None and self.size > self.max_size:
+            raise RequestTooLarge('The request body is larger than %s bytes' % self.max_size)
+        if self.chunks is not None:
+            self.chunks.append(chunk)
+        return chunk
+
+    def release(self):
+        '''
+        Stops keeping the chunks read (the rest of the body is read by a
+        streamed parameter so ``request.body`` is not available)
+        '''
+        self.chunks = None
+
+    def finish(self):
+        '''
+        Reads the rest of the body and makes it available as
+        ``request.body``
+        '''
+        while self.read(READ_CHUNK_SIZE):
+            pass
+        body = b''.join(self.chunks)
+        self.request._body = self.request._rpc4django_body = body
+        return body
+
+
+def open_request_stream(request, max_size=None):
+    '''
+    Returns a :class:`RequestStream` of the body of an HttpRequest or
+    raises :class:`RequestTooLarge` if its Content-Length is larger than
+    ``max_size`` bytes (:envvar:`RPC4DJANGO_MAX_REQUEST_SIZE` by default)
+    '''
+
+    if max_size is None:
+        max_size = MAX_REQUEST_SIZE
+
+    if max_size is not None and int(request.META.get('CONTENT_LENGTH') or 0) > max_size:
+        raise RequestTooLarge('The request body is larger than %s bytes' % max_size)
+    return RequestStream(request, max_size)
+
+
+def decompress_body(body, content_encoding, max_size=None):
+    '''
+    Returns a compressed request body decompressed or raises
+    :class:`RequestTooLarge` as soon as the decompressed body is larger
+    than ``max_size`` bytes
+    '''
+
+    chunks = []
+    size = 0
+    for chunk in iter_decompressed(body, content_encoding):
+        size += len(chunk)
+        if max_size is not None and size > max_size:
+            raise RequestTooLarge('The decompressed request body is larger than %s bytes' %
+                                  max_size)
+        chunks.append(chunk)
+    return b''.join(chunks)
+
+
+def check_json_limits(text, max_depth=None, max_string_size=None):
+    '''
+    Raises :class:`RequestTooLarge` if a JSONRPC request body (which has
+    not been decoded yet) nests arrays and objects more than ``max_depth``
+    levels deep (not counting the levels of the request around its
+    parameters) or contains a string longer than ``max_string_size``
+
+    Only the brackets and strings are scanned so this is much cheaper than
+    decoding the body and cannot exhaust the recursion limit. The decoded
+    parameters are checked exactly by :func:`check_request_limits`.
+    '''
+
+    if max_depth is None and max_string_size is None:
+        return
+
+    # the depth of the parameters in the request
+    offset = JSON_REQUEST_DEPTH
+    if text.lstrip().startswith('['):
+        # a batch
+        offset += 1
+
+    depth = 0
+    for match in JSON_TOKEN.finditer(text):
+        token = match.group()
+        if token in '[{':
+            depth += 1
+            if max_depth is not None and depth - offset > max_depth:
+                raise RequestTooLarge('A parameter is nested more than %s levels deep' %
+                                      max_depth)
+        elif token in ']}':
+            depth -= 1
+        elif max_string_size is not None and len(token) - 2 > max_string_size:
+            # escapes make a string shorter once it is decoded
+            if '\\' in token:
+                try:
+                    size = len(json.loads(token))
+                except ValueError:
+                    # the decoder reports the error
+                    continue
+            else:
+                size = len(token) - 2
+            if size > max_string_size:
+                raise RequestTooLarge('A string is longer than %s characters' %
+                                      max_string_size)
+
+
+def count_calls(rpc_request):
+    '''
+    Returns the number of calls made by a request: the length of a
+    JSONRPC batch or of the calls of ``system.multicall``
+    '''
+
+    if rpc_request.batch is not None:
+        return len(rpc_request.batch)
+
+    if rpc_request.method == 'system.multicall' and rpc_request.params and \
+            isinstance(rpc_request.params[0], (list, tuple)):
+        return len(rpc_request.params[0])
+
+    return 1
+
+
+def check_value(value, max_depth=None, max_string_size=None):
+    '''
+    Raises :class:`RequestTooLarge` if ``value`` has more than
+    ``max_depth`` levels of nested lists and dictionaries or contains a
+    string longer than ``max_string_size``
+    '''
+
+    # an explicit stack so that deep values cannot exhaust the recursion limit
+    stack = [(value, 0)]
+    while stack:
+        value, depth = stack.pop()
+
+        if isinstance(value, (basestring, bytes)):
+            if max_string_size is not None and len(value) > max_string_size:
+                raise RequestTooLarge('A string is longer than %s characters' %
+                                      max_string_size)
+            continue
+
+        if isinstance(value, dict):
+            items = list(value.keys()) + list(value.values())
+        elif isinstance(value, (list, tuple)):
+            items = value
+        else:
+            continue
+
+        if max_depth is not None and depth >= max_depth:
+            raise RequestTooLarge('A parameter is nested more than %s levels deep' %
+                                  max_depth)
+        stack.extend((item, depth + 1) for item in items)
+
+
+def check_request_limits(rpc_request, max_calls=None, max_depth=None,
+                         max_string_size=None):
+    '''
+    Raises :class:`RequestTooLarge` if a decoded
+    :class:`RPCRequest <rpc4django.rpcrequest.RPCRequest>` makes more
+    than ``max_calls`` calls or if its parameters are too deeply nested
+    or contain a string which is too long
+
+    The limits default to :envvar:`RPC4DJANGO_MAX_CALLS`,
+    :envvar:`RPC4DJANGO_MAX_DEPTH` and :envvar:`RPC4DJANGO_MAX_STRING_SIZE`.
+    '''
+
+    if max_calls is None:
+        max_calls = MAX_CALLS
+    if max_depth is None:
+        max_depth = MAX_DEPTH
+    if max_string_size is None:
+        max_string_size = MAX_STRING_SIZE
+
+    if max_calls is not None and count_calls(rpc_request) > max_calls:
+        raise RequestTooLarge('The request makes more than %s calls' % max_calls)
+
+    if max_depth is None and max_string_size is None:
+        return
+
+    for call in rpc_request.calls():
+        if any(is_stream(param) for param in call.params):
+            call.params = tuple(check_items(param, max_depth, max_string_size)
+                                if is_stream(param) else param
+                                for param in call.params)
+
+        for param in call.params:
+            if not is_stream(param):
+                check_value(param, max_depth, max_string_size)
+
+
+def check_items(items, max_depth=None, max_string_size=None):
+    '''
+    Yields the items of a streamed array parameter
+    (see :mod:`rpc4django.xmlrpcparser`) after checking each one
+    with :func:`check_value`
+    '''
+
+    if max_depth is not None:
+        if max_depth < 1:
+            raise RequestTooLarge('A parameter is nested more than %s levels deep' %
+                                  max_depth)
+        # the items are inside the array
+        max_depth -= 1
+
+    for item in items:
+        check_value(item, max_depth, max_string_size)
+        yield item
@@ -0,0 +1,245 @@
+'''
+This module records how many times each RPC method is called, how many
+calls fail, how long the phases of each call take and the size of
+requests and responses.
+
+Measurements are sent to every sink in ``sinks``. Nothing is measured if
+there are no sinks. A sink is an object with the following methods:
+
+- ``increment(name, method, protocol, value=1)`` counts an event
+  (``'errors'``)
+- ``observe(name, method, protocol, value)`` records a measurement.
+  Timings (``'parse'``, ``'permission'``, ``'execute'`` and ``'encode'``)
+  are in seconds and sizes (``'request_bytes'`` and ``'response_bytes'``)
+  are in bytes.
+
+``method`` is the name of the RPC method (``'batch'`` for a JSONRPC batch
+and ``'<unknown>'`` for a method which is not registered) and
+``protocol`` is ``'json'`` or ``'xml'``.
+
+The in-process :class:`MetricsRegistry` is enabled with
+:envvar:`RPC4DJANGO_METRICS` and can be read by Prometheus from
+:meth:`serve_metrics <rpc4django.views.serve_metrics>`.
+:class:`StatsdSink` is enabled with
+:envvar:`RPC4DJANGO_METRICS_STATSD_CALLBACK`. Other sinks can be added
+with :func:`add_sink`.
+'''
+
+import threading
+from importlib import import_module
+from timeit import default_timer
+
+from django.conf import settings
+
+METRICS = getattr(settings, 'RPC4DJANGO_METRICS', False)
+METRICS_STATSD_CALLBACK = getattr(settings, 'RPC4DJANGO_METRICS_STATSD_CALLBACK', None)
+
+# upper bounds of the histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+UNKNOWN_METHOD = '<unknown>'
+
+try:
+    # Python2
+    basestring
+except NameError:
+    # Python3
+    basestring = str
+
+
+def is_size(name):
+    return name.endswith('_bytes')
+
+
+class MetricsRegistry(object):
+    '''
+    Keeps counters and histograms of the measurements in this process
+
+    **Attributes**
+
+    ``counters``
+      A dictionary of counts keyed on (name, method, protocol)
+    ``histograms``
+      A dictionary keyed on (name, method, protocol) of lists of the
+      count of the measurements in each bucket followed by the total count
+      and the sum of the measurements
+    '''
+
+    def __init__(self, latency_buckets=LATENCY_BUCKETS, size_buckets=SIZE_BUCKETS):
+        self.latency_buckets = latency_buckets
+        self.size_buckets = size_buckets
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def buckets(self, name):
+        return self.size_buckets if is_size(name) else self.latency_buckets
+
+    def increment(self, name, method, protocol, value=1):
+        key = (name, method, protocol)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, method, protocol, value):
+        key = (name, method, protocol)
+        buckets = self.buckets(name)
+        with self._lock:
+            histogram = self.histograms.get(key, None)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * (len(buckets) + 2)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram[i] += 1
+                    break
+            histogram[-2] += 1
+            histogram[-1] += value
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            self.histograms = {}
+
+    def render_prometheus(self):
+        '''
+        Returns the measurements in the Prometheus text exposition format
+        '''
+
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, list(histogram))
+                                for key, histogram in self.histograms.items())
+
+        lines = []
+        described = set()
+
+        def describe(metric, metric_type):
+            if metric not in described:
+                described.add(metric)
+                lines.append('# TYPE %s %s' % (metric, metric_type))
+
+        for (name, method, protocol), count in counters:
+            metric = 'rpc4django_%s_total' % name
+            describe(metric, 'counter')
+            lines.append('%s{%s} %s' % (metric, labels(method, protocol), count))
+
+        for (name, method, protocol), histogram in histograms:
+            metric = 'rpc4django_%s' % name if is_size(name) else \
+                'rpc4django_%s_seconds' % name
+            describe(metric, 'histogram')
+            label_text = labels(method, protocol)
+
+            cumulative = 0
+            for bound, count in zip(self.buckets(name), histogram):
+                cumulative += count
+                lines.append('%s_bucket{%s,le="%s"} %s' % (metric, label_text, bound, cumulative))
+            lines.append('%s_bucket{%s,le="+Inf"} %s' % (metric, label_text, histogram[-2]))
+            lines.append('%s_count{%s} %s' % (metric, label_text, histogram[-2]))
+            lines.append('%s_sum{%s} %s' % (metric, label_text, histogram[-1]))
+
+        return '\n'.join(lines) + '\n'
+
+
+def labels(method, protocol):
+    method = method.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return 'method="%s",protocol="%s"' % (method, protocol)
+
+
+class StatsdSink(object):
+    '''
+    Sends measurements to ``callback(metric, value, metric_type)`` where
+    ``metric`` is a statsd style name like
+    ``rpc4django.json.myns_method.execute`` and ``metric_type`` is ``'c'``
+    for counts, ``'ms'`` for timings (in milliseconds) or ``'h'`` for sizes
+    '''
+
+    def __init__(self, callback, prefix='rpc4django'):
+        self.callback = callback
+        self.prefix = prefix
+
+    def metric(self, name, method, protocol):
+        # dots separate the parts of a statsd metric name
+        return '%s.%s.%s.%s' % (self.prefix, protocol, method.replace('.', '_'), name)
+
+    def increment(self, name, method, protocol, value=1):
+        self.callback(self.metric(name, method, protocol), value, 'c')
+
+    def observe(self, name, method, protocol, value):
+        if is_size(name):
+            self.callback(self.metric(name, method, protocol), value, 'h')
+        else:
+            self.callback(self.metric(name, method, protocol), value * 1000.0, 'ms')
+
+
+registry = MetricsRegistry()
+
+sinks = []
+
+
+def add_sink(sink):
+    '''
+    Sends measurements to ``sink`` as well as any other sinks
+    '''
+    if sink not in sinks:
+        sinks.append(sink)
+
+
+def remove_sink(sink):
+    '''
+    Stops sending measurements to ``sink``
+    '''
+    if sink in sinks:
+        sinks.remove(sink)
+
+
+def increment(name, method, protocol, value=1):
+    for sink in sinks:
+        sink.increment(name, method, protocol, value)
+
+
+def observe(name, method, protocol, value):
+    for sink in sinks:
+        sink.observe(name, method, protocol, value)
+
+
+class measure(object):
+    '''
+    A context manager which records how long its block takes as the
+    ``name`` phase of a call to ``method`` and counts an error if the
+    block raises an exception
+
+    ::
+
+        with measure('execute', 'myns.method', 'json'):
+            ...
+
+    '''
+
+    __slots__ = ('name', 'method', 'protocol', 'start')
+
+    def __init__(self, name, method, protocol):
+        self.name = name
+        self.method = method
+        self.protocol = protocol
+
+    def __enter__(self):
+        self.start = default_timer() if sinks else None
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.start is not None:
+            observe(self.name, self.method, self.protocol, default_timer() - self.start)
+            if exc_type is not None:
+                increment('errors', self.method, self.protocol)
+        return False
+
+
+if METRICS:
+    add_sink(registry)
+
+if METRICS_STATSD_CALLBACK is not None:
+    if isinstance(METRICS_STATSD_CALLBACK, basestring):
+        mod_name, func_name = METRICS_STATSD_CALLBACK.rsplit('.', 1)
+        METRICS_STATSD_CALLBACK = getattr(import_module(mod_name), func_name)
+    add_sink(StatsdSink(METRICS_STATSD_CALLBACK))
@@ -0,0 +1,175 @@
+'''
+This module contains the caches used for the results of RPC methods
+marked with ``@rpcmethod(cache=...)``. The backend is selected with
+:envvar:`RPC4DJANGO_RESULT_CACHE_BACKEND`.
+
+Results are cached already encoded for the protocol of the call, so a
+cache hit skips both calling the method and encoding its result. A cache
+backend is an object with the following methods:
+
+- ``get(method_name, key)`` returns the cached value or ``None``
+- ``set(method_name, key, value, timeout)`` caches a value for
+  ``timeout`` seconds (``None`` for no expiry)
+- ``invalidate(method_name=None)`` discards the cached results of a
+  method or of every method
+
+'''
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+try:
+    # Python2
+    basestring
+except NameError:
+    # Python3
+    basestring = str
+
+RESULT_CACHE_BACKEND = getattr(settings, 'RPC4DJANGO_RESULT_CACHE_BACKEND', 'local')
+RESULT_CACHE_ALIAS = getattr(settings, 'RPC4DJANGO_RESULT_CACHE_ALIAS', 'default')
+RESULT_CACHE_SIZE = getattr(settings, 'RPC4DJANGO_RESULT_CACHE_SIZE', 1024)
+RESULT_CACHE_TIMEOUT = getattr(settings, 'RPC4DJANGO_RESULT_CACHE_TIMEOUT', 300)
+
+
+def get_cache_timeout(cache):
+    '''
+    Returns the number of seconds to cache results for given the ``cache``
+    argument of ``@rpcmethod`` (``True`` for
+    :envvar:`RPC4DJANGO_RESULT_CACHE_TIMEOUT` or a number of seconds)
+    or ``None`` if results should not be cached
+    '''
+
+    if cache is True:
+        return RESULT_CACHE_TIMEOUT
+    if not cache:
+        return None
+    return cache
+
+
+def make_result_key(request_format, params, user=None):
+    '''
+    Returns the key for the result of a call with ``params`` in
+    ``request_format`` (optionally made by ``user``)
+
+    Params that are equal after decoding (eg. JSON objects with their keys
+    in a different order) get the same key. Params which are not JSON
+    types (eg. XMLRPC ``dateTime.iso8601`` or ``base64`` values) are keyed
+    on their type as well as their text.
+    '''
+
+    canonical = json.dumps([request_format, params, user], sort_keys=True,
+                           separators=(',', ':'), default=_tag_value)
+    return hashlib.md5(canonical.encode('utf-8')).hexdigest()
+
+
+def _tag_value(value):
+    # XML cannot contain NUL characters and JSON requests only decode to
+    # JSON types so no param can look like a tag
+    return [u'\0' + type(value).__name__, str(value)]
+
+
+class LocalResultCache(object):
+    '''
+    Caches results in a least recently used dictionary of at most
+    ``max_size`` entries in this process
+    '''
+
+    def __init__(self, max_size=RESULT_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, method_name, key):
+        with self._lock:
+            entry = self._entries.pop((method_name, key), None)
+            if entry is None:
+                return None
+
+            value, expires = entry
+            if expires is not None and expires <= time.time():
+                return None
+
+            # the most recently used entries are at the end
+            self._entries[(method_name, key)] = entry
+            return value
+
+    def set(self, method_name, key, value, timeout):
+        expires = None if timeout is None else time.time() + timeout
+        with self._lock:
+            self._entries.pop((method_name, key), None)
+            self._entries[(method_name, key)] = (value, expires)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, method_name=None):
+        with self._lock:
+            if method_name is None:
+                self._entries.clear()
+            else:
+                for entry_key in [k for k in self._entries if k[0] == method_name]:
+                    del self._entries[entry_key]
+
+
+class DjangoResultCache(object):
+    '''
+    Caches results with Django's cache framework in the cache named
+    ``alias`` so that they are shared between processes
+
+    Invalidating a method changes a generation number stored in the cache
+    which is part of the key of every result of the method.
+    '''
+
+    def __init__(self, alias=RESULT_CACHE_ALIAS):
+        from django.core.cache import caches
+        self.cache = caches[alias]
+
+    def _generation_keys(self, method_name):
+        method_hash = hashlib.md5(method_name.encode('utf-8')).hexdigest()
+        return 'rpc4django.result.gen', 'rpc4django.result.gen.' + method_hash
+
+    def _cache_key(self, method_name, key):
+        generation_keys = self._generation_keys(method_name)
+        generations = self.cache.get_many(generation_keys)
+        full_key = '%s.%s.%s.%s' % (method_name,
+                                    generations.get(generation_keys[0], 0),
+                                    generations.get(generation_keys[1], 0),
+                                    key)
+        return 'rpc4django.result.' + hashlib.md5(full_key.encode('utf-8')).hexdigest()
+
+    def get(self, method_name, key):
+        return self.cache.get(self._cache_key(method_name, key))
+
+    def set(self, method_name, key, value, timeout):
+        self.cache.set(self._cache_key(method_name, key), value, timeout)
+
+    def invalidate(self, method_name=None):
+        if method_name is None:
+            generation_key = self._generation_keys('')[0]
+        else:
+            generation_key = self._generation_keys(method_name)[1]
+        # the generation only needs to change, never to be unique
+        self.cache.set(generation_key, self.cache.get(generation_key, 0) + 1, None)
+
+
+RESULT_CACHES = {
+    'local': LocalResultCache,
+    'django': DjangoResultCache,
+}
+
+
+def get_result_cache(backend=RESULT_CACHE_BACKEND):
+    '''
+    Instantiates a result cache backend given its class, a dotted path
+    to its class or a name in ``RESULT_CACHES``
+    '''
+
+    backend = RESULT_CACHES.get(backend, backend)
+    if isinstance(backend, basestring):
+        backend = import_string(backend)
+    return backend()
@@ -6,25 +6,21 @@ It also contains a decorator to mark methods as rpc methods.
 '''
 
 import sys
-import inspect
+import time
+import hashlib
+import itertools
 import pydoc
-import django
 from django.contrib.auth import authenticate, login, logout
-from .jsonrpcdispatcher import JSONRPCDispatcher, json
+from .callplan import build_call_plan, get_argspec
+from .columnar import RESULT_FORMATS
+from .jsonrpcdispatcher import JSONRPCDispatcher
 from .xmlrpcdispatcher import XMLRPCDispatcher
+from .workers import WorkerPool, map_concurrently
+from .streaming import materialize
+from .metrics import measure
+from .resultcache import get_cache_timeout, get_result_cache, make_result_key
 from django.conf import settings
-
-try:
-    from importlib import import_module
-except ImportError:
-    from django.utils.importlib import import_module
-
-if django.VERSION[0] == 1:
-    # Django 1.x
-    from django.core.urlresolvers import get_mod_func
-else:
-    # Django 2.x
-    from django.urls import get_mod_func
+from django.utils.http import quote_etag
 
 if sys.version_info.major == 2:
     # Python2.x
@@ -34,14 +30,44 @@ else:
     from xmlrpc.client import Fault
 
 
-from defusedxml import xmlrpc  # noqa
+# skipped before the first significant character of a request
+BYTE_ORDER_MARK = b'\xef\xbb\xbf'
+WHITESPACE = b' \t\r\n'
+
 
+def sniff_request_format(data):
+    '''
+    Guesses the format of an RPC request body from its first significant
+    byte without decoding it
+
+    Returns ``'xml'`` if the body starts with ``<``, ``'json'`` if it
+    starts with ``{`` or ``[`` and ``None`` if it is neither. A UTF-8
+    byte order mark and leading whitespace are skipped.
+    '''
 
-# This method makes the XMLRPC parser (used by loads) safe
-# from various XML based attacks
-xmlrpc.monkey_patch()
+    if not isinstance(data, bytes):
+        data = data.encode('utf-8')
+
+    start = len(BYTE_ORDER_MARK) if data.startswith(BYTE_ORDER_MARK) else 0
+    for i in range(start, len(data)):
+        char = data[i:i + 1]
+        if char in WHITESPACE:
+            continue
+        if char == b'<':
+            return 'xml'
+        if char in (b'{', b'['):
+            return 'json'
+        return None
+    return None
 
 
+# the results of these methods only change when a method is registered
+INTROSPECTION_METHODS = ('system.listMethods', 'system.methodHelp',
+                         'system.methodSignature', 'system.describe')
+
+# the attributes of an RPCMethod set by RPCMethod.inspect
+INSPECTED_ATTRIBUTES = ('help', 'args', 'signature', 'call_plan')
+
 # this error code is taken from xmlrpc-epi
 # http://xmlrpc-epi.sourceforge.net/specs/rfc.fault_codes.php
 APPLICATION_ERROR = -32500
@@ -66,18 +92,36 @@ class RPCMethod(object):
       Any Django permissions required to call this method
     ``login_required``
       The method can only be called by a logged in user
+    ``concurrent``
+      Calls to this method in a ``system.multicall`` can be run
+      concurrently with the other calls
+    ``call_plan``
+      The :class:`CallPlan <rpc4django.callplan.CallPlan>` of this method
+    ``cache``
+      The number of seconds the encoded results of this method are cached
+      for or ``None`` if they are not cached
+    ``cache_per_user``
+      Results are cached separately for each user
+    ``stream_array``
+      The name of the array argument which XMLRPC calls pass as a
+      generator of its items or ``None``
+    ``result_format``
+      The format the results of this method are returned in
+      (``'columnar'`` or ``'column_major'``, see :mod:`rpc4django.columnar`)
+      or ``None`` if they are returned as they are
+
+    ``help``, ``signature``, ``args`` and ``call_plan`` are computed by
+    :meth:`inspect` the first time one of them is used.
 
     '''
 
     def __init__(self, method, name=None, signature=None, docstring=None):
 
         self.method = method
-        self.help = ''
-        self.signature = []
         self.name = ''
         self.permission = None
         self.login_required = False
-        self.args = []
+        self.concurrent = False
 
         # set the method name based on @rpcmethod or the passed value
         # default to the actual method name
@@ -93,64 +137,109 @@ class RPCMethod(object):
                 # Python3
                 self.name = method.__name__
 
-        # get the help string for each method
-        if docstring is not None:
-            self.help = docstring
-        else:
-            self.help = pydoc.getdoc(method)
-
         # set the permissions based on the decorator
         self.permission = getattr(method, 'permission', None)
 
         # set the permissions based on the decorator
         self.login_required = getattr(method, 'login_required', self.permission is not None)
 
+        # set whether the method can be run concurrently based on the decorator
+        self.concurrent = getattr(method, 'concurrent', False)
+
+        # set how results are cached based on the decorator
+        self.cache = get_cache_timeout(getattr(method, 'cache', None))
+        self.cache_per_user = getattr(method, 'cache_per_user', False)
+
+        # set which argument is streamed based on the decorator
+        self.stream_array = getattr(method, 'stream_array', None)
+        if self.stream_array is not None:
+            # a streamed argument cannot be part of a cache key
+            self.cache = None
+
+        # set the format of the results based on the decorator
+        self.result_format = getattr(method, 'result_format', None)
+        if self.result_format is not None and self.result_format not in RESULT_FORMATS:
+            raise ValueError('Unknown result format "%s" for method "%s"' %
+                             (self.result_format, self.name))
+
+        # the docstring and signature are only inspected when they are
+        # first needed (see __getattr__)
+        self._signature = signature
+        self._docstring = docstring
+
+    def __getattr__(self, attr):
+        # only called for attributes which are not set yet
+        if attr in INSPECTED_ATTRIBUTES:
+            self.inspect()
+            return getattr(self, attr)
+        raise AttributeError(attr)
+
+    def inspect(self):
+        '''
+        Sets the attributes which require inspecting the method
+        (``help``, ``args``, ``signature`` and ``call_plan``)
+
+        This is done the first time one of them is used rather than when the
+        method is registered so that processes which never call or
+        introspect a method do not pay for it.
+        '''
+
+        method = self.method
+
+        # the attributes are built in locals and only set at the end because
+        # a method can be inspected by several request threads at once and
+        # none of them must see a partial signature
+
+        # get the help string for each method
+        if self._docstring is not None:
+            help_text = self._docstring
+        else:
+            help_text = pydoc.getdoc(method)
+
         # use inspection (reflection) to get the arguments
         # If we're using Python 3, look for function annotations, but allow
         # the signature parameter override them.
 
-        try:  # Python 3
-            full_args = inspect.getfullargspec(method)
-            args = full_args.args
-            # varargs = full_args.varargs
-            # varkw = full_args.varkw
-            # defaults = full_args.defaults
-            # kwonlyargs = full_args.kwonlyargs
-            # kwonlydefaults = full_args.kwonlydefaults
-            annotations = full_args.annotations
-
-        except AttributeError:  # Python 2
-            args, varargs, keywords, defaults = inspect.getargspec(method)
-            # varargs = None
-            # varkw = None
-            # kwonlyargs = None
-            # kwonlydefaults = None
-            annotations = {}
-
-        self.args = [arg
-                     for arg in args
-                     if arg not in ('self', 'request')]
-
-        self.signature.append(annotations.get('return', 'object'))
-        for i, arg in enumerate(self.args):
+        try:
+            argspec = get_argspec(method)
+        except TypeError:
+            # eg. some builtins (see UNKNOWN_CALL_PLAN)
+            argspec = ([], None, None, None, {})
+        annotations = argspec[4]
+
+        # the protocol dispatchers use the call plan instead of inspecting
+        # the method each time it is called (see register_method)
+        call_plan = build_call_plan(method, argspec)
+
+        args = [arg
+                for arg in argspec[0]
+                if arg not in ('self', 'request')]
+
+        signature = [annotations.get('return', 'object')]
+        for i, arg in enumerate(args):
             annotation = annotations.get(arg, None)
             if annotation:
-                self.signature.append(annotation)
+                signature.append(annotation)
             else:
                 try:
-                    self.signature.append(method.signature[i])
+                    signature.append(method.signature[i])
                 except (IndexError, AttributeError):
-                    self.signature.append('object')
+                    signature.append('object')
 
         if hasattr(method, 'signature') and \
-           len(method.signature) == len(self.args) + 1:
+           len(method.signature) == len(args) + 1:
             # use the @rpcmethod signature if it has the correct
             # number of args
-            self.signature = method.signature
-        elif signature is not None and len(self.args) + 1 == len(signature):
+            signature = method.signature
+        elif self._signature is not None and len(args) + 1 == len(self._signature):
             # use the passed signature if it has the correct number
             # of arguments
-            self.signature = signature
+            signature = self._signature
+
+        self.help = help_text
+        self.call_plan = call_plan
+        self.args = args
+        self.signature = signature
 
     def get_stub(self):
         '''
@@ -209,6 +298,10 @@ class RPCMethod(object):
         return []
 
 
+# numbers the dispatchers created without a name
+_dispatcher_numbers = itertools.count(1)
+
+
 class RPCDispatcher(object):
     '''
     Keeps track of the methods available to be called and then
@@ -219,16 +312,45 @@ class RPCDispatcher(object):
 
     Disables RPC introspection methods (eg. ``system.list_methods()`` if
     ``restrict_introspection`` is set to ``True``. Disables out of the box
-    authentication if ``restrict_ootb_auth`` is ``True``.
+    authentication if ``restrict_ootb_auth`` is ``True``. Runs the calls
+    of JSONRPC 2.0 batches concurrently if ``concurrent_batches`` is ``True``
+    and the calls of ``system.multicall`` concurrently if
+    ``concurrent_multicall`` is ``True``. ``multicall_timeout`` is the
+    number of seconds each concurrent multicall call may take.
+    ``json_compact`` and ``json_serializer`` select how JSON responses are
+    encoded (see :mod:`rpc4django.jsonserializers`). ``result_cache`` is
+    the backend where the results of methods marked with
+    ``@rpcmethod(cache=...)`` are cached (see :mod:`rpc4django.resultcache`).
+    ``max_workers`` gives the dispatcher its own pool of that many worker
+    threads instead of sharing the default pool (see :mod:`rpc4django.workers`).
+    ``name`` identifies the dispatcher's results in ``result_cache`` so that
+    dispatchers sharing a cache never read each other's results. Unnamed
+    dispatchers are numbered in the order they are created. Give them names
+    when processes sharing a cache may create them in different orders.
+
+    ``restrict_jsonrpc``, ``restrict_xmlrpc``, ``restrict_method_summary``
+    and ``restrict_rpctest`` are used by the views serving the dispatcher
+    (see :envvar:`RPC4DJANGO_RESTRICT_JSONRPC` and the following settings).
+
+    Several dispatchers, each with its own methods and options, can be
+    served at different URLs by passing them to
+    :meth:`serve_rpc_request <rpc4django.views.serve_rpc_request>`.
 
     **Attributes**
 
+    ``name``
+      The name of the dispatcher (``'default'`` for the global dispatcher)
     ``url``
       The URL that handles RPC requests (eg. ``/RPC2``)
       This is needed by ``system.describe``.
     ``rpcmethods``
       A list of :class:`RPCMethod<rpc4django.rpcdispatcher.RPCMethod>` instances
       available to be called by the dispatcher
+    ``registry_version``
+      A number which changes whenever a method is registered. Anything
+      derived from the registered methods can be cached on it.
+    ``registry_modified``
+      The time (as returned by ``time.time()``) a method was last registered
     ``xmlrpcdispatcher``
       An instance of :class:`XMLRPCDispatcher <rpc4django.xmlrpcdispatcher.XMLRPCDispatcher>`
       where XMLRPC calls are dispatched to using :meth:`xmldispatch`
@@ -239,9 +361,34 @@ class RPCDispatcher(object):
     '''
 
     def __init__(self, restrict_introspection=False,
-                 restrict_ootb_auth=True, json_encoder=None):
+                 restrict_ootb_auth=True, json_encoder=None,
+                 concurrent_batches=False, concurrent_multicall=False,
+                 multicall_timeout=None, json_compact=False,
+                 json_serializer=None, result_cache=None,
+                 restrict_jsonrpc=False, restrict_xmlrpc=False,
+                 restrict_method_summary=False, restrict_rpctest=False,
+                 max_workers=None, name=None):
+        if name is None:
+            name = 'dispatcher%s' % next(_dispatcher_numbers)
+        self.name = name
         self.rpcmethods = {}        # a dict of RPCMethod objects
-        self.jsonrpcdispatcher = JSONRPCDispatcher(json_encoder)
+        self.registry_version = 0   # incremented when a method is registered
+        self.registry_modified = time.time()
+        self._introspection_cache = {}
+        self._introspection_version = 0
+        self.concurrent_multicall = concurrent_multicall
+        self.multicall_timeout = multicall_timeout
+        self.result_cache = result_cache or get_result_cache('local')
+        self.restrict_jsonrpc = restrict_jsonrpc
+        self.restrict_xmlrpc = restrict_xmlrpc
+        self.restrict_method_summary = restrict_method_summary
+        self.restrict_rpctest = restrict_rpctest
+        self.worker_pool = None if max_workers is None else WorkerPool(max_workers)
+        self.jsonrpcdispatcher = JSONRPCDispatcher(json_encoder,
+                                                   concurrent_batches,
+                                                   json_compact,
+                                                   json_serializer,
+                                                   self.worker_pool)
         self.xmlrpcdispatcher = XMLRPCDispatcher()
         self.register_method(self.system_multicall, 'system.multicall', ['array', 'array'])
 
@@ -263,37 +410,74 @@ class RPCDispatcher(object):
         description = {}
         description['serviceType'] = 'RPC4Django JSONRPC+XMLRPC'
         description['serviceURL'] = request.path,
-        description['methods'] = [{'name': method.name,
-                                   'summary': method.help,
-                                   'params': method.get_params(),
-                                   'return': method.get_returnvalue()}
+        description['methods'] = [self._describe_method(method)
                                   for method in self.rpcmethods.values()]
 
         return description
 
+    def _describe_method(self, method):
+        description = {'name': method.name,
+                       'summary': method.help,
+                       'params': method.get_params(),
+                       'return': method.get_returnvalue()}
+        if method.result_format is not None:
+            description['resultFormat'] = method.result_format
+        return description
+
     def system_multicall(self, calls, **kwargs):
         '''
         implements: http://mirrors.talideon.com/articles/multicall.html
         Returns a list of results of functions
+
+        Calls to methods marked as ``concurrent`` (or every call if
+        ``concurrent_multicall`` is set) are run on the worker thread pool.
+        The results are returned in the order of the calls.
         '''
 
         from .views import is_xmlrpc_request
         request = kwargs.get('request')
-        result = []
         is_xml = is_xmlrpc_request(request)
-        for call in calls:
+        protocol = self.xmlrpcdispatcher if is_xml else self.jsonrpcdispatcher
+
+        def format_error(e):
+            e = str(e)
+            if is_xml:
+                e = (e,)
+            return e
+
+        def dispatch_call(call):
             try:
-                dkwargs = dict(kwargs)
+                result = protocol._dispatch(call['methodName'], tuple(call['params']), **kwargs)
+                # multicall results are encoded as part of one response
+                result = materialize(result)
                 if is_xml:
-                    result.append((self.xmlrpcdispatcher._dispatch(call['methodName'], tuple(call['params']), **dkwargs),))
-                else:
-                    result.append(self.jsonrpcdispatcher._dispatch(call['methodName'], tuple(call['params']), **dkwargs))
+                    result = (result,)
+                return result
             except Exception as e:
-                e = str(e)
-                if is_xml:
-                    e = (e,)
-                result.append(e)
-        return result
+                return format_error(e)
+
+        def timed_out(call):
+            return format_error('method "%s" timed out' % call.get('methodName'))
+
+        concurrent = [self.concurrent_multicall or self.is_concurrent(call)
+                      for call in calls]
+        if not any(concurrent):
+            return [dispatch_call(call) for call in calls]
+
+        return map_concurrently(dispatch_call, calls, concurrent,
+                                self.multicall_timeout, timed_out,
+                                self.worker_pool)
+
+    def is_concurrent(self, call):
+        '''
+        Returns whether a multicall call is to a method marked as ``concurrent``
+        '''
+
+        try:
+            method = self.get_method(call['methodName'])
+        except (KeyError, TypeError):
+            return False
+        return method is not None and method.concurrent
 
     def system_listmethods(self):
         '''
@@ -371,30 +555,223 @@ class RPCDispatcher(object):
 
         return self.xmlrpcdispatcher.dispatch(raw_post_data, **kwargs)
 
+    def parse_request(self, raw_post_data, request_format=None):
+        '''
+        Decodes the post data into an
+        :class:`RPCRequest <rpc4django.rpcrequest.RPCRequest>`
+
+        If ``request_format`` is ``None``, it is detected with
+        :func:`sniff_request_format`. If that is inconclusive, the data is
+        decoded as JSON and then as XML if that fails. Checking JSON first
+        is safer than XML because of entity expansion.
+        '''
+
+        if request_format is None:
+            request_format = sniff_request_format(raw_post_data)
+
+        if request_format == 'xml':
+            return self.xmlrpcdispatcher.parse(raw_post_data)
+
+        rpc_request = self.jsonrpcdispatcher.parse(raw_post_data)
+        if request_format is None and rpc_request.error is not None:
+            return self.xmlrpcdispatcher.parse(raw_post_data)
+        return rpc_request
+
+    def dispatch_request(self, rpc_request, **kwargs):
+        '''
+        Sends an already parsed
+        :class:`RPCRequest <rpc4django.rpcrequest.RPCRequest>`
+        to the dispatcher for its format
+        '''
+
+        if self.is_introspection(rpc_request):
+            return self._dispatch_introspection(rpc_request, **kwargs)
+
+        method = self.get_cached_method(rpc_request)
+        if method is not None:
+            return self._dispatch_cached(method, rpc_request, **kwargs)
+
+        return self.get_protocol(rpc_request).dispatch_request(rpc_request, **kwargs)
+
+    def get_protocol(self, rpc_request):
+        '''
+        Returns the XMLRPCDispatcher or JSONRPCDispatcher for a request
+        '''
+
+        if rpc_request.request_format == 'xml':
+            return self.xmlrpcdispatcher
+        return self.jsonrpcdispatcher
+
+    def is_introspection(self, rpc_request):
+        '''
+        Returns whether the request is a single, valid call to one of this
+        dispatcher's introspection methods (eg. ``system.listMethods``)
+        '''
+
+        if rpc_request.method not in INTROSPECTION_METHODS:
+            return False
+
+        method = self._get_single_call_method(rpc_request)
+        # the introspection methods can be restricted and replaced
+        return method is not None and getattr(method.method, '__self__', None) is self
+
+    def get_cached_method(self, rpc_request):
+        '''
+        Returns the RPCMethod for a request if it is a single, valid call
+        to a method whose results are cached or ``None`` otherwise
+        '''
+
+        method = self._get_single_call_method(rpc_request)
+        if method is None or method.cache is None:
+            return None
+        return method
+
+    def _get_single_call_method(self, rpc_request):
+        if rpc_request.batch is not None or rpc_request.error is not None:
+            return None
+        if rpc_request.request_format == 'json' and \
+                self.jsonrpcdispatcher.check_request(rpc_request) is not None:
+            return None
+        return self.get_method(rpc_request.method)
+
+    def _call_and_encode(self, protocol, rpc_request, **kwargs):
+        '''
+        Calls the method of a request and encodes its result with
+        ``encode_result_fragment``
+
+        Returns a tuple of the encoded result and ``None`` or, if the call or
+        the encoding failed, ``None`` and the encoded error response
+        '''
+
+        try:
+            result = protocol._dispatch(rpc_request.method, rpc_request.params, **kwargs)
+            # streamed results are cached whole
+            result = materialize(result)
+        except Exception as e:
+            return None, protocol.encode_exception(rpc_request, e)
+
+        try:
+            with measure('encode', rpc_request.method, protocol.request_format):
+                return protocol.encode_result_fragment(result), None
+        except Exception:
+            return None, protocol.encode_result(rpc_request, result)
+
+    def get_cached_fragment(self, method, rpc_request, **kwargs):
+        '''
+        Returns the key of the result of a call to a method marked with
+        ``@rpcmethod(cache=...)`` in ``result_cache`` and the cached,
+        encoded result or ``None``
+        '''
+
+        user = None
+        if method.cache_per_user:
+            user = getattr(getattr(kwargs.get('request', None), 'user', None), 'pk', None)
+        key = make_result_key(rpc_request.request_format, rpc_request.params, user)
+        return key, self.result_cache.get(self._get_cache_name(method.name), key)
+
+    def cache_fragment(self, method, key, fragment):
+        '''
+        Caches the encoded result of a call to a method marked with
+        ``@rpcmethod(cache=...)`` under the key from :meth:`get_cached_fragment`
+        '''
+
+        self.result_cache.set(self._get_cache_name(method.name), key, fragment, method.cache)
+
+    def _get_cache_name(self, method_name):
+        # dispatchers sharing a cache can have methods with the same name
+        return '%s:%s' % (self.name, method_name)
+
+    def _dispatch_cached(self, method, rpc_request, **kwargs):
+        '''
+        Answers a call to a method marked with ``@rpcmethod(cache=...)``
+        from ``result_cache`` or calls it and caches its encoded result
+        '''
+
+        protocol = self.get_protocol(rpc_request)
+
+        key, fragment = self.get_cached_fragment(method, rpc_request, **kwargs)
+        if fragment is None:
+            fragment, error = self._call_and_encode(protocol, rpc_request, **kwargs)
+            if error is not None:
+                # errors are not cached
+                return error
+            self.cache_fragment(method, key, fragment)
+
+        return protocol.wrap_result_fragment(rpc_request, fragment)
+
+    def invalidate_cached_results(self, method_name=None):
+        '''
+        Discards the cached results of the method named ``method_name``
+        or of every method if it is ``None`` (which also discards those of
+        any other dispatcher sharing the cache)
+
+        Call this when the data returned by a method marked with
+        ``@rpcmethod(cache=...)`` changes.
+        '''
+
+        if method_name is None:
+            self.result_cache.invalidate()
+        else:
+            self.result_cache.invalidate(self._get_cache_name(method_name))
+
+    def _dispatch_introspection(self, rpc_request, **kwargs):
+        '''
+        Answers calls to the introspection methods from a cache of their
+        encoded results which is cleared when a method is registered
+        '''
+
+        if self._introspection_version != self.registry_version:
+            self._introspection_cache = {}
+            self._introspection_version = self.registry_version
+
+        protocol = self.get_protocol(rpc_request)
+
+        # system.describe includes the url of the service
+        path = None
+        if rpc_request.method == 'system.describe':
+            path = getattr(kwargs.get('request', None), 'path', None)
+        key = (rpc_request.request_format, rpc_request.method,
+               tuple(rpc_request.params), path)
+
+        try:
+            cached = self._introspection_cache.get(key, None)
+        except TypeError:
+            # unhashable params
+            return protocol.dispatch_request(rpc_request, **kwargs)
+
+        if cached is None:
+            fragment, error = self._call_and_encode(protocol, rpc_request, **kwargs)
+            if error is not None:
+                # errors are not cached
+                return error
+            digest = hashlib.md5(fragment.encode('utf-8')).hexdigest()
+            cached = self._introspection_cache[key] = (fragment, digest)
+
+        fragment, digest = cached
+        # the response also contains the id of the request (for JSONRPC)
+        rpc_request.etag = quote_etag(hashlib.md5(
+            (digest + repr(rpc_request.id)).encode('utf-8')).hexdigest())
+        return protocol.wrap_result_fragment(rpc_request, fragment)
+
     def get_method_name(self, raw_post_data, request_format='xml'):
         '''
         Gets the name of the method to be called given the post data
         and the format of the data
         '''
 
-        if request_format == 'xml':
-            # xmlrpclib.loads could throw an exception, but this is fine
-            # since _marshaled_dispatch would throw the same thing
-            try:
-                params, method = xmlrpc.xmlrpc_client.loads(raw_post_data.decode('utf-8'))
-                return method
-            except Exception:
-                return None
-        else:
-            try:
-                # attempt to do a json decode on the data
-                jsondict = json.loads(raw_post_data.decode('utf-8'))
-                if not isinstance(jsondict, dict) or 'method' not in jsondict:
-                    return None
-                else:
-                    return jsondict['method']
-            except ValueError:
-                return None
+        return self.parse_request(raw_post_data, request_format).method
+
+    def get_method(self, method_name):
+        '''
+        Returns the RPCMethod object registered as ``method_name``
+        or ``None`` if there is no such method
+        '''
+
+        try:
+            return self.rpcmethods.get(method_name, None)
+        except TypeError:
+            # a JSONRPC method name can be any javascript type
+            return None
 
     def list_methods(self):
         '''
@@ -427,37 +804,53 @@ class RPCDispatcher(object):
         meth = RPCMethod(method, name, signature, helpmsg)
 
         if meth.name not in self.rpcmethods:
-            self.xmlrpcdispatcher.register_function(method, meth.name)
-            self.jsonrpcdispatcher.register_function(method, meth.name)
+            def call_plan():
+                # the method is only inspected when it is first called
+                return meth.call_plan
+
+            self.xmlrpcdispatcher.register_function(method, meth.name, call_plan,
+                                                    stream_array=meth.stream_array,
+                                                    result_format=meth.result_format)
+            self.jsonrpcdispatcher.register_function(method, meth.name, call_plan,
+                                                     result_format=meth.result_format)
             self.rpcmethods[meth.name] = meth
+            self.registry_version += 1
+            self.registry_modified = time.time()
 
 
 RESTRICT_INTROSPECTION = getattr(settings,
                                  'RPC4DJANGO_RESTRICT_INTROSPECTION', False)
 RESTRICT_OOTB_AUTH = getattr(settings,
                              'RPC4DJANGO_RESTRICT_OOTB_AUTH', True)
+CONCURRENT_BATCHES = getattr(settings,
+                             'RPC4DJANGO_JSONRPC_CONCURRENT_BATCHES', False)
+CONCURRENT_MULTICALL = getattr(settings,
+                               'RPC4DJANGO_CONCURRENT_MULTICALL', False)
+MULTICALL_TIMEOUT = getattr(settings, 'RPC4DJANGO_MULTICALL_TIMEOUT', None)
 
 JSON_ENCODER = getattr(settings, 'RPC4DJANGO_JSON_ENCODER',
                        'django.core.serializers.json.DjangoJSONEncoder')
-
-try:
-    # Python2
-    basestring
-except NameError:
-    # Python3
-    basestring = str
-
-# resolve JSON_ENCODER to class if it's a string
-if isinstance(JSON_ENCODER, basestring):
-    mod_name, cls_name = get_mod_func(JSON_ENCODER)
-    json_encoder = getattr(import_module(mod_name), cls_name)
-else:
-    json_encoder = JSON_ENCODER
-
-# instantiate the rpcdispatcher -- this examines the INSTALLED_APPS
-# for any @rpcmethod decorators and adds them to the callable methods
+JSON_COMPACT = getattr(settings, 'RPC4DJANGO_JSON_COMPACT', False)
+JSON_SERIALIZER = getattr(settings, 'RPC4DJANGO_JSON_SERIALIZER', 'json')
+RESULT_CACHE_BACKEND = getattr(settings, 'RPC4DJANGO_RESULT_CACHE_BACKEND', 'local')
+
+RESTRICT_JSON = getattr(settings, 'RPC4DJANGO_RESTRICT_JSONRPC', False)
+RESTRICT_XML = getattr(settings, 'RPC4DJANGO_RESTRICT_XMLRPC', False)
+RESTRICT_METHOD_SUMMARY = getattr(settings,
+                                  'RPC4DJANGO_RESTRICT_METHOD_SUMMARY', False)
+RESTRICT_RPCTEST = getattr(settings, 'RPC4DJANGO_RESTRICT_RPCTEST', False)
+
+# instantiate the rpcdispatcher -- methods decorated with @rpcmethod
+# are added to it when their module is imported
+# (see rpc4django.apps for how the modules are discovered)
 dispatcher = RPCDispatcher(RESTRICT_INTROSPECTION,
-                           RESTRICT_OOTB_AUTH, json_encoder)
+                           RESTRICT_OOTB_AUTH, JSON_ENCODER,
+                           CONCURRENT_BATCHES, CONCURRENT_MULTICALL,
+                           MULTICALL_TIMEOUT, JSON_COMPACT, JSON_SERIALIZER,
+                           get_result_cache(RESULT_CACHE_BACKEND),
+                           RESTRICT_JSON, RESTRICT_XML,
+                           RESTRICT_METHOD_SUMMARY, RESTRICT_RPCTEST,
+                           name='default')
 
 
 def rpcmethod(**kwargs):
@@ -479,6 +872,33 @@ def rpcmethod(**kwargs):
       the Django permission required to execute this method
     ``login_required``
       the method requires a user to be logged in
+    ``concurrent``
+      calls to the method in a ``system.multicall`` are independent of
+      the other calls and can be run on the worker thread pool
+    ``cache``
+      cache the encoded results of the method for each set of params.
+      ``True`` caches them for :envvar:`RPC4DJANGO_RESULT_CACHE_TIMEOUT`
+      seconds or it can be a number of seconds. Only use this for methods
+      without side effects. Cached results are discarded with
+      :meth:`RPCDispatcher.invalidate_cached_results`.
+    ``cache_per_user``
+      cache the results of the method separately for each user
+    ``stream_array``
+      the name of the last argument of the method if it is an array whose
+      items are parsed as the method iterates over them. XMLRPC calls pass
+      a generator of the items instead of a list so that large arrays are
+      never fully in memory (see :mod:`rpc4django.xmlrpcparser`). JSONRPC
+      calls pass a list. The results of the method are never cached.
+    ``result_format``
+      ``'columnar'`` to return a QuerySet or list or iterator of
+      dictionaries as ``{"columns": [...], "rows": [[...], ...]}`` or
+      ``'column_major'`` to return it as a dictionary of the values of
+      each column so the keys are not repeated in every row
+      (see :mod:`rpc4django.columnar`). Shown by ``system.describe``.
+    ``dispatcher``
+      the :class:`RPCDispatcher` to register the method with.
+      Defaults to the dispatcher served by
+      :meth:`serve_rpc_request <rpc4django.views.serve_rpc_request>`
 
     **Examples**
 
@@ -488,6 +908,11 @@ def rpcmethod(**kwargs):
         @rpcmethod(name='myns.myFuncName', signature=['int','int'])
         @rpcmethod(permission='add_group')
         @rpcmethod(login_required=True)
+        @rpcmethod(concurrent=True)
+        @rpcmethod(cache=60, cache_per_user=True)
+        @rpcmethod(stream_array='rows')
+        @rpcmethod(result_format='columnar')
+        @rpcmethod(dispatcher=admin_dispatcher)
 
     '''
 
@@ -496,6 +921,11 @@ def rpcmethod(**kwargs):
         method.signature = []
         method.permission = None
         method.login_required = False
+        method.concurrent = False
+        method.cache = None
+        method.cache_per_user = False
+        method.stream_array = None
+        method.result_format = None
         method.external_name = getattr(method, '__name__')
 
         if 'name' in kwargs:
@@ -510,6 +940,21 @@ def rpcmethod(**kwargs):
         if 'login_required' in kwargs:
             method.login_required = kwargs['login_required']
 
-        dispatcher.register_method(method)
+        if 'concurrent' in kwargs:
+            method.concurrent = kwargs['concurrent']
+
+        if 'cache' in kwargs:
+            method.cache = kwargs['cache']
+
+        if 'cache_per_user' in kwargs:
+            method.cache_per_user = kwargs['cache_per_user']
+
+        if 'stream_array' in kwargs:
+            method.stream_array = kwargs['stream_array']
+
+        if 'result_format' in kwargs:
+            method.result_format = kwargs['result_format']
+
+        kwargs.get('dispatcher', dispatcher).register_method(method)
         return method
     return set_rpcmethod_info
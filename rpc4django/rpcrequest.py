@@ -0,0 +1,65 @@
+'''
+This module contains the decoded form of an RPC request body which is
+built once per HTTP request and shared by format detection, the permission
+check and the dispatchers.
+'''
+
+
+class RPCRequest(object):
+    '''
+    A decoded XMLRPC or JSONRPC request
+
+    **Attributes**
+
+    ``request_format``
+      The format of the request: ``'xml'`` or ``'json'``
+    ``method``
+      The name of the method being called or ``None`` if it could
+      not be determined
+    ``params``
+      A tuple of the parameters passed to the method
+    ``id``
+      The JSONRPC request id (always ``None`` for XMLRPC)
+    ``data``
+      The fully decoded request body. For JSONRPC this is the decoded
+      javascript Object which is validated again during dispatch.
+    ``error``
+      The exception raised while decoding the request body
+      or ``None`` if decoding was successful
+    ``batch``
+      For a JSONRPC 2.0 batch, a list of the RPCRequests in the batch.
+      ``None`` if this is not a batch.
+    ``etag``
+      Set by the dispatcher to the ETag of the result when the response
+      was served from a cache. ``None`` otherwise.
+
+    '''
+
+    def __init__(self, request_format, method=None, params=(), rpcid=None,
+                 data=None, error=None, batch=None):
+        self.request_format = request_format
+        self.method = method
+        self.params = params
+        self.id = rpcid
+        self.data = data
+        self.error = error
+        self.batch = batch
+        self.etag = None
+
+    @property
+    def is_notification(self):
+        '''
+        Whether this is a JSONRPC 2.0 notification (a request without an id)
+        '''
+        return isinstance(self.data, dict) and 'id' not in self.data
+
+    def calls(self):
+        '''
+        Returns a list of the RPCRequests for every call made by this request
+        '''
+        if self.batch is not None:
+            return self.batch
+        return [self]
+
+    def __repr__(self):
+        return '<RPCRequest %s method=%r>' % (self.request_format, self.method)
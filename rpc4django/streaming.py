@@ -0,0 +1,194 @@
+'''
+This module contains the helpers used to encode the results of RPC methods
+which return a generator or iterator. Such results are encoded as an array
+one item at a time and sent with a ``StreamingHttpResponse`` so the whole
+result never has to be in memory at once. QuerySets are streamed the same
+way with their rows read from the database in chunks, as are the rows of
+columnar results read from a QuerySet or an iterator (see
+:mod:`rpc4django.columnar`).
+
+The first item is read before the response is started (see
+:func:`prime_stream`) so an iterator which fails straight away (eg. a
+QuerySet whose query fails) gets the usual fault or JSONRPC error. If the
+iterator raises an exception after the response has started, the status
+and part of the response are already sent. The response is then
+truncated so that clients fail to parse it rather than silently receiving
+partial data and the exception is logged.
+'''
+
+import logging
+from collections import OrderedDict
+from itertools import chain, islice
+
+from django.conf import settings
+
+try:
+    from collections.abc import Iterator
+except ImportError:
+    # Python2
+    from collections import Iterator
+
+logger = logging.getLogger('rpc4django')
+
+# the approximate number of characters sent per chunk of a streamed response
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# the number of rows of a columnar result encoded at a time
+ROW_BATCH_SIZE = 1000
+
+# the number of rows of a QuerySet fetched from the database at a time
+QUERYSET_CHUNK_SIZE = getattr(settings, 'RPC4DJANGO_QUERYSET_CHUNK_SIZE', 2000)
+
+
+class ColumnarResult(object):
+    '''
+    A result in the ``'columnar'`` format (see :mod:`rpc4django.columnar`)
+    whose rows are read as it is encoded
+
+    It is encoded as ``{"columns": [...], "rows": [[...], ...]}``.
+    If the rows are an iterator, they are streamed in batches of
+    ``ROW_BATCH_SIZE``.
+
+    **Attributes**
+
+    ``columns``
+      A list of the names of the columns
+    ``rows``
+      A list or an iterator of the rows. Each row is a sequence of the
+      values of the columns.
+
+    '''
+
+    def __init__(self, columns, rows):
+        self.columns = columns
+        self.rows = rows
+
+    def iter_batches(self, batch_size=None):
+        '''
+        Yields lists of at most ``batch_size`` rows
+        '''
+        batch_size = batch_size or ROW_BATCH_SIZE
+        rows = iter(self.rows)
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return
+            yield batch
+
+    def materialize(self):
+        '''
+        Reads all of the rows and returns the result as a dictionary
+        '''
+        return OrderedDict([('columns', self.columns), ('rows', list(self.rows))])
+
+
+def is_stream(value):
+    '''
+    Returns whether an RPC method result should be streamed
+    (it is a generator or other iterator)
+    '''
+    return isinstance(value, Iterator)
+
+
+def is_queryset(value):
+    '''
+    Returns whether an RPC method result is a Django QuerySet
+    (or has the same API)
+    '''
+    return hasattr(value, 'values_list') and hasattr(value, 'query')
+
+
+def iter_queryset(queryset, chunk_size=None):
+    '''
+    Returns an iterator of the rows of a QuerySet which are fetched
+    ``chunk_size`` (default ``QUERYSET_CHUNK_SIZE``) rows at a time
+
+    The rows are read with ``iterator()`` so the QuerySet does not cache
+    them and databases which support server-side cursors (eg. PostgreSQL)
+    only send each chunk as it is needed. Model instances cannot be
+    encoded so a QuerySet of them yields their fields as dictionaries
+    like ``values()``.
+    '''
+
+    if getattr(queryset, '_fields', None) is None:
+        # neither values() nor values_list()
+        queryset = queryset.values()
+
+    try:
+        return queryset.iterator(chunk_size=chunk_size or QUERYSET_CHUNK_SIZE)
+    except TypeError:
+        # Django < 2.0
+        return queryset.iterator()
+
+
+def prime_stream(result):
+    '''
+    Reads the first item of a streamed result (or of the rows of a
+    :class:`ColumnarResult`) so that an exception raised before the first
+    item is raised here, while the call can still fail normally, and
+    returns the result with the item put back
+    '''
+
+    if isinstance(result, ColumnarResult):
+        if is_stream(result.rows):
+            result.rows = prime_stream(result.rows)
+        return result
+
+    if not is_stream(result):
+        return result
+
+    for first in result:
+        return chain((first,), result)
+    return iter(())
+
+
+def materialize(value):
+    '''
+    Returns a streamed result as a list (or a :class:`ColumnarResult` as a
+    dictionary) so that it can be encoded as part of a larger response
+    (eg. in a multicall) or other results unchanged
+    '''
+    if is_stream(value):
+        return list(value)
+    if isinstance(value, ColumnarResult):
+        return value.materialize()
+    return value
+
+
+def encode_stream(items, encode_item, prefix, separator, suffix,
+                  chunk_size=STREAM_CHUNK_SIZE):
+    '''
+    Generates the chunks of an encoded array
+
+    Each item from ``items`` is encoded with ``encode_item`` and the
+    encoded items are joined with ``separator`` and surrounded by
+    ``prefix`` and ``suffix``. Encoded items are buffered until at least
+    ``chunk_size`` characters can be sent.
+    '''
+
+    buf = [prefix]
+    size = len(prefix)
+    first = True
+
+    try:
+        for item in items:
+            if not first and separator:
+                buf.append(separator)
+            first = False
+
+            encoded = encode_item(item)
+            buf.append(encoded)
+            size += len(encoded)
+
+            if size >= chunk_size:
+                yield ''.join(buf)
+                buf = []
+                size = 0
+    except Exception:
+        logger.exception('Streamed RPC result raised an exception')
+        if buf:
+            yield ''.join(buf)
+        return
+
+    buf.append(suffix)
+    yield ''.join(buf)
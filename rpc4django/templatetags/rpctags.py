@@ -14,6 +14,11 @@ logger = logging.getLogger('rpc4django')
 
 RESTRICT_REST = getattr(settings, 'RPC4DJANGO_RESTRICT_REST', False)
 
+# the reST converted to html keyed on the source text
+# (usually a method docstring which does not change while the server runs)
+_rest_cache = {}
+REST_CACHE_SIZE = 2048
+
 # all custom tag libraries must have this
 register = template.Library()
 
@@ -24,6 +29,26 @@ def resttext(text):
     to import docutils or fails for any other reason
 
     If :envvar:`RPC4DJANGO_RESTRICT_REST` is ``True``, just return *text*
+
+    Converting reST is slow so the result for each *text* is cached
+    '''
+
+    if RESTRICT_REST:
+        return text
+
+    # another thread may clear the cache at any time
+    html = _rest_cache.get(text, None)
+    if html is None:
+        html = _publish_rest(text)
+        if len(_rest_cache) >= REST_CACHE_SIZE:
+            _rest_cache.clear()
+        _rest_cache[text] = html
+    return html
+
+
+def _publish_rest(text):
+    '''
+    Converts *text* from reST to html
     '''
 
     overrides = {
@@ -31,9 +56,6 @@ def resttext(text):
         'report_level': 5,   # 0 reports everything, 5 reports nothing
     }
 
-    if RESTRICT_REST:
-        return text
-
     try:
         from docutils.core import publish_parts
         parts = publish_parts(source=text, writer_name='html',
@@ -11,15 +11,24 @@ The main entry point for RPC4Django. Usually, the user simply puts
 
 '''
 
+import hashlib
+import itertools
 import logging
-import json
-from django.http import HttpResponse, Http404, HttpResponseForbidden
+from django.http import HttpResponse, Http404, HttpResponseForbidden, \
+    HttpResponseNotModified, StreamingHttpResponse
 from django.shortcuts import render
 from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
 
 from django.views.decorators.csrf import csrf_exempt
 
-from .rpcdispatcher import dispatcher
+from . import compression, metrics
+from .compression import ContentEncodingError, compress_response
+from .limits import RequestTooLarge, check_request_limits, open_request_stream, \
+    read_request_body
+from .rpcdispatcher import dispatcher, sniff_request_format
+from .streaming import is_stream
 from .__init__ import version
 
 logger = logging.getLogger('rpc4django')
@@ -29,13 +38,22 @@ logger = logging.getLogger('rpc4django')
 # see the rpc4django documentation for more details
 LOG_REQUESTS_RESPONSES = getattr(settings,
                                  'RPC4DJANGO_LOG_REQUESTS_RESPONSES', True)
-
-RESTRICT_JSON = getattr(settings, 'RPC4DJANGO_RESTRICT_JSONRPC', False)
-RESTRICT_XML = getattr(settings, 'RPC4DJANGO_RESTRICT_XMLRPC', False)
-RESTRICT_METHOD_SUMMARY = getattr(settings,
-                                  'RPC4DJANGO_RESTRICT_METHOD_SUMMARY', False)
-RESTRICT_RPCTEST = getattr(settings, 'RPC4DJANGO_RESTRICT_RPCTEST', False)
-RESTRICT_RPCTEST = getattr(settings, 'RPC4DJANGO_RESTRICT_RPCTEST', False)
+LOG_MAX_SIZE = getattr(settings, 'RPC4DJANGO_LOG_MAX_SIZE', None)
+LOG_SAMPLE_RATE = getattr(settings, 'RPC4DJANGO_LOG_SAMPLE_RATE', 1)
+LOG_INCLUDE_METHODS = getattr(settings, 'RPC4DJANGO_LOG_INCLUDE_METHODS', None)
+LOG_EXCLUDE_METHODS = getattr(settings, 'RPC4DJANGO_LOG_EXCLUDE_METHODS', ())
+
+# counts the RPC calls considered for logging when sampling
+_log_counter = itertools.count()
+
+# the rendered method summary keyed on the url and the registry version
+_summary_cache = {}
+SUMMARY_CACHE_SIZE = 16
+
+CACHE_METHOD_SUMMARY = getattr(settings,
+                               'RPC4DJANGO_CACHE_METHOD_SUMMARY', True)
+PERMISSION_CACHE_TIMEOUT = getattr(settings,
+                                   'RPC4DJANGO_PERMISSION_CACHE_TIMEOUT', 0)
 HTTP_ACCESS_CREDENTIALS = getattr(settings,
                                   'RPC4DJANGO_HTTP_ACCESS_CREDENTIALS', False)
 HTTP_ACCESS_ALLOW_ORIGIN = getattr(settings,
@@ -62,61 +80,184 @@ def get_content_type(request):
     return conttype
 
 
-def check_request_permission(request, request_format='xml'):
+def parse_rpc_request(request, request_format=None, rpc_dispatcher=None):
+    '''
+    Decodes the body of the request into an
+    :class:`RPCRequest <rpc4django.rpcrequest.RPCRequest>`
+
+    The decoded request is cached on the HttpRequest so that format
+    detection, the permission check and dispatch all share one parse
+    of the request body.
+
+    If the dispatcher has methods with a streamed array parameter
+    (``@rpcmethod(stream_array=...)``), an XMLRPC request is parsed
+    directly from the request stream when nothing else needs its bytes
+    (see :func:`can_stream_request`), so the rest of the body is only read
+    as the method consumes the array. Otherwise, the body is buffered and
+    only the decoded parameters are streamed.
+
+    **Parameters**
+
+    - ``request`` - a django HttpRequest object
+    - ``request_format`` - the request type: 'json', 'xml' or ``None``
+      to detect it from the request body
+    - ``rpc_dispatcher`` - the RPCDispatcher serving the request.
+      Defaults to the global ``dispatcher``.
+    '''
+
+    if rpc_dispatcher is None:
+        rpc_dispatcher = dispatcher
+
+    rpc_request = getattr(request, '_rpc4django_request', None)
+
+    if rpc_request is not None and request_format is not None and \
+            rpc_request.request_format != request_format:
+        # the request was parsed as the other format
+        rpc_request = None
+
+    if rpc_request is None:
+        if request_format == 'xml' and rpc_dispatcher.xmlrpcdispatcher.stream_arrays and \
+                can_stream_request(request):
+            rpc_request = parse_request_stream(request, rpc_dispatcher)
+        else:
+            rpc_request = rpc_dispatcher.parse_request(read_request_body(request),
+                                                       request_format)
+        request._rpc4django_request = rpc_request
+
+    return rpc_request
+
+
+def can_stream_request(request):
+    '''
+    Returns whether the body of a request can be parsed as it is read:
+    it has not been read yet, it is not compressed and it is not logged
+    '''
+
+    if hasattr(request, '_body') or not hasattr(request, 'read') or \
+            getattr(request, '_rpc4django_body', None) is not None:
+        return False
+
+    content_encoding = request.META.get('HTTP_CONTENT_ENCODING', None)
+    if content_encoding and content_encoding.strip().lower() != 'identity':
+        # decompression needs the whole body
+        return False
+
+    return not (LOG_REQUESTS_RESPONSES and logger.isEnabledFor(logging.DEBUG))
+
+
+def parse_request_stream(request, rpc_dispatcher):
+    '''
+    Parses an XMLRPC request as its body is read
+
+    If a parameter is streamed, the rest of the body is read as it is
+    consumed and ``request.body`` is not available. Otherwise the body is
+    read to the end while parsing and kept as ``request.body``.
+    '''
+
+    stream = open_request_stream(request)
+    rpc_request = rpc_dispatcher.parse_request(stream, 'xml')
+    if rpc_request.error is None and rpc_request.params and is_stream(rpc_request.params[-1]):
+        stream.release()
+    else:
+        stream.finish()
+    return rpc_request
+
+
+def user_has_perm(user, permission):
+    '''
+    Returns whether ``user`` has ``permission``
+
+    If :envvar:`RPC4DJANGO_PERMISSION_CACHE_TIMEOUT` is set, the answers
+    from the authentication backends for a user are cached in Django's
+    cache framework for that many seconds so repeated calls from the same
+    user do not go back through the backends
+    '''
+
+    user_pk = getattr(user, 'pk', None)
+    if not PERMISSION_CACHE_TIMEOUT or user_pk is None:
+        return user.has_perm(permission)
+
+    key = 'rpc4django.perm.%s.%s' % (user_pk, permission)
+    allowed = cache.get(key)
+    if allowed is None:
+        allowed = user.has_perm(permission)
+        cache.set(key, allowed, PERMISSION_CACHE_TIMEOUT)
+    return allowed
+
+
+def check_request_permission(request, request_format='xml', rpc_dispatcher=None):
     '''
     Checks whether this user has permission to call a particular method
+    (or all the methods of a JSONRPC batch)
     This method does not check method call validity. That is done later
 
     **Parameters**
 
     - ``request`` - a django HttpRequest object
     - ``request_format`` - the request type: 'json' or 'xml'
+    - ``rpc_dispatcher`` - the RPCDispatcher serving the request.
+      Defaults to the global ``dispatcher``.
 
     Returns ``False`` if permission is denied and ``True`` otherwise
     '''
 
     user = getattr(request, 'user', None)
-    methods = dispatcher.list_methods()
-    method_name = dispatcher.get_method_name(request.body, request_format)
-    response = True
-
-    for method in methods:
-        if method.name == method_name:
-            # this is the method the user is calling
-            # time to check the permissions
-            if method.permission is not None:
-                logger.debug('Method "%s" is protected by permission "%s"'
-                             % (method.name, method.permission))
-                if user is None:
-                    # user is only none if not using AuthenticationMiddleware
-                    logger.warn('AuthenticationMiddleware is not enabled')
-                    response = False
-                elif not user.has_perm(method.permission):
-                    # check the permission against the permission database
-                    logger.info('User "%s" is NOT authorized' % (str(user)))
-                    response = False
-                else:
-                    logger.debug('User "%s" is authorized' % (str(user)))
-            elif method.login_required:
-                logger.debug('Method "%s" is protected by login_required'
-                             % method.name)
-                if user is None:
-                    # user is only none if not using AuthenticationMiddleware
-                    logger.warn('AuthenticationMiddleware is not enabled')
-                    response = False
-                elif (callable(user.is_anonymous) and user.is_anonymous()) or \
-                     (not callable(user.is_anonymous) and user.is_anonymous):
-                    # ensure the user is logged in
-                    logger.info('User "%s" is NOT authorized' % (str(user)))
-                    response = False
-                else:
-                    logger.debug('User "%s" is authorized' % (str(user)))
-            else:
-                logger.debug('Method "%s" is unprotected' % (method.name))
-
-            break
 
-    return response
+    # every call of a JSONRPC batch must be permitted
+    for rpc_request in parse_rpc_request(request, request_format, rpc_dispatcher).calls():
+        if not check_method_permission(user, rpc_request.method, rpc_dispatcher):
+            return False
+
+    return True
+
+
+def check_method_permission(user, method_name, rpc_dispatcher=None):
+    '''
+    Checks whether ``user`` has permission to call the method
+    named ``method_name`` of ``rpc_dispatcher`` (by default the
+    global ``dispatcher``)
+
+    Returns ``False`` if permission is denied and ``True`` otherwise
+    '''
+
+    if rpc_dispatcher is None:
+        rpc_dispatcher = dispatcher
+
+    # this is the method the user is calling
+    method = rpc_dispatcher.get_method(method_name)
+    if method is None:
+        return True
+
+    # time to check the permissions
+    if method.permission is not None:
+        logger.debug('Method "%s" is protected by permission "%s"',
+                     method.name, method.permission)
+        if user is None:
+            # user is only none if not using AuthenticationMiddleware
+            logger.warning('AuthenticationMiddleware is not enabled')
+            return False
+        elif not user_has_perm(user, method.permission):
+            # check the permission against the permission database
+            logger.info('User "%s" is NOT authorized', user)
+            return False
+        logger.debug('User "%s" is authorized', user)
+    elif method.login_required:
+        logger.debug('Method "%s" is protected by login_required',
+                     method.name)
+        if user is None:
+            # user is only none if not using AuthenticationMiddleware
+            logger.warning('AuthenticationMiddleware is not enabled')
+            return False
+        elif (callable(user.is_anonymous) and user.is_anonymous()) or \
+             (not callable(user.is_anonymous) and user.is_anonymous):
+            # ensure the user is logged in
+            logger.info('User "%s" is NOT authorized', user)
+            return False
+        logger.debug('User "%s" is authorized', user)
+    else:
+        logger.debug('Method "%s" is unprotected', method.name)
+
+    return True
 
 
 def is_xmlrpc_request(request):
@@ -128,80 +269,287 @@ def is_xmlrpc_request(request):
     1. If there is no post data, display documentation
     2. content-type = text/xml or application/xml => XMLRPC
     3. content-type contains json or javascript => JSONRPC
-    4. Try to parse as xml. Successful parse => XMLRPC
+    4. post data starts with ``<`` => XMLRPC
     5. JSONRPC
 
+    The answer is cached on the request.
     '''
 
     conttype = get_content_type(request) or ''
 
+    cached = getattr(request, '_rpc4django_format', None)
+    if cached is not None and cached[0] == conttype:
+        return cached[1] == 'xml'
+
+    request_format = get_request_format(request, conttype)
+    request._rpc4django_format = (conttype, request_format)
+    return request_format == 'xml'
+
+
+def get_request_format(request, conttype):
+    '''
+    Returns the format of an RPC request, ``'xml'`` or ``'json'``,
+    from its content type or else the start of its body
+    '''
+
     # check content type for obvious clues
     if conttype == 'text/xml' or conttype == 'application/xml':
-        return True
+        return 'xml'
     elif conttype.find('json') >= 0 or conttype.find('javascript') >= 0:
-        return False
+        return 'json'
 
     if LOG_REQUESTS_RESPONSES:
-        logger.info('Unrecognized content-type "%s"' % conttype)
+        logger.info('Unrecognized content-type "%s"', conttype)
         logger.info('Analyzing rpc request data to get content type')
 
-    # analyze post data to see whether it is xml or json
+    # look at the first character of the post data
     # this is slower than if the content-type was set properly
-    # checking JSON is safer than XML because of entity expansion
-    try:
-        json.loads(request.body.decode('utf-8'))
-        return False
-    except ValueError:
-        return True
+    return sniff_request_format(read_request_body(request)) or 'json'
 
 
-@csrf_exempt
-def serve_rpc_request(request):
+def is_rpc_call(request):
+    '''
+    Returns whether the request is a POST request with an RPC payload
     '''
-    Handles rpc calls based on the content type of the request or
-    returns the method documentation page if the request
-    was a GET.
 
-    **Parameters**
+    return request.method == "POST" and int(request.META.get('CONTENT_LENGTH', 0)) > 0
 
-    ``request``
-        the Django HttpRequest object
 
+def authorize_rpc_request(request, rpc_dispatcher=None):
+    '''
+    Determines the format of an RPC call and checks that the format is
+    allowed and that the user has permission to call the method of
+    ``rpc_dispatcher`` (by default the global ``dispatcher``)
+
+    Returns the :class:`RPCRequest <rpc4django.rpcrequest.RPCRequest>`
+    or ``None`` if permission is denied. Raises ``Http404`` if the format
+    is restricted, :class:`RequestTooLarge <rpc4django.limits.RequestTooLarge>`
+    if the request exceeds the limits in :mod:`rpc4django.limits` and
+    :class:`ContentEncodingError <rpc4django.compression.ContentEncodingError>`
+    if the request body cannot be decompressed.
     '''
 
-    if request.method == "POST" and int(request.META.get('CONTENT_LENGTH', 0)) > 0:
-        # Handle POST request with RPC payload
+    if rpc_dispatcher is None:
+        rpc_dispatcher = dispatcher
 
-        if LOG_REQUESTS_RESPONSES:
+    if is_xmlrpc_request(request):
+        if rpc_dispatcher.restrict_xmlrpc:
+            raise Http404
+        request_format = 'xml'
+    else:
+        if rpc_dispatcher.restrict_jsonrpc:
+            raise Http404
+        request_format = 'json'
+
+    with metrics.measure('parse', metrics.UNKNOWN_METHOD, request_format) as timer:
+        rpc_request = parse_rpc_request(request, request_format, rpc_dispatcher)
+        timer.method = get_metrics_method(rpc_request, rpc_dispatcher)
+
+    check_request_limits(rpc_request)
+
+    # the body is not buffered when it is parsed as it is read
+    body = getattr(request, '_rpc4django_body', None)
+
+    request._rpc4django_log = should_log(rpc_request)
+    if request._rpc4django_log and body is not None:
+        logger.debug('Incoming request: %s', LogText(body))
+
+    if metrics.sinks:
+        if body is None:
+            size = int(request.META.get('CONTENT_LENGTH') or 0)
+        else:
+            size = len(body)
+        metrics.observe('request_bytes', timer.method, request_format, size)
+
+    with metrics.measure('permission', timer.method, request_format):
+        if not check_request_permission(request, request_format, rpc_dispatcher):
+            return None
+
+    return rpc_request
+
+
+def request_too_large(error):
+    '''
+    Returns the 413 Request Entity Too Large response for a request
+    exceeding the limits in :mod:`rpc4django.limits`
+    '''
+
+    logger.warning('Rejected RPC request: %s', error)
+    return HttpResponse(str(error), 'text/plain', status=413)
+
+
+def content_encoding_error(error):
+    '''
+    Returns the 400 Bad Request (or 415 Unsupported Media Type) response
+    for a request body which cannot be decompressed
+    '''
+
+    logger.warning('Rejected RPC request: %s', error)
+    return HttpResponse(str(error), 'text/plain', status=error.status)
+
+
+def get_metrics_method(rpc_request, rpc_dispatcher=None):
+    '''
+    Returns the method name of a request used for its metrics
+    (see :mod:`rpc4django.metrics`)
+    '''
+
+    if rpc_dispatcher is None:
+        rpc_dispatcher = dispatcher
+
+    if rpc_request.batch is not None:
+        return 'batch'
+    if rpc_dispatcher.get_method(rpc_request.method) is None:
+        # a name chosen by the client
+        return metrics.UNKNOWN_METHOD
+    return rpc_request.method
+
+
+def should_log(rpc_request):
+    '''
+    Returns whether the request and response of an RPC call are logged
+
+    Calls are only logged if :envvar:`RPC4DJANGO_LOG_REQUESTS_RESPONSES`
+    is set, the ``rpc4django`` logger is enabled for DEBUG, the methods
+    called pass :envvar:`RPC4DJANGO_LOG_INCLUDE_METHODS` and
+    :envvar:`RPC4DJANGO_LOG_EXCLUDE_METHODS` and the call is sampled
+    (see :envvar:`RPC4DJANGO_LOG_SAMPLE_RATE`).
+    '''
+
+    if not LOG_REQUESTS_RESPONSES or not logger.isEnabledFor(logging.DEBUG):
+        return False
+
+    if LOG_INCLUDE_METHODS is not None or LOG_EXCLUDE_METHODS:
+        names = [call.method if isinstance(call.method, str) else None
+                 for call in rpc_request.calls()]
+        if LOG_INCLUDE_METHODS is not None and \
+                not any(name in LOG_INCLUDE_METHODS for name in names):
+            return False
+        if LOG_EXCLUDE_METHODS and \
+                all(name in LOG_EXCLUDE_METHODS for name in names):
+            return False
+
+    if LOG_SAMPLE_RATE > 1:
+        return next(_log_counter) % LOG_SAMPLE_RATE == 0
+    return True
+
+
+class LogText(object):
+    '''
+    A request or response body which is only decoded and truncated
+    (to :envvar:`RPC4DJANGO_LOG_MAX_SIZE`) if a log handler emits it
+    '''
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        value = self.value
+        truncated = 0
+        if LOG_MAX_SIZE and len(value) > LOG_MAX_SIZE:
+            truncated = len(value) - LOG_MAX_SIZE
+            value = value[:LOG_MAX_SIZE]
+
+        if isinstance(value, bytes):
             try:
-                body_text = request.body.decode('utf-8')
+                # a multibyte character may be cut off by truncation
+                value = value.decode('utf-8', 'ignore' if truncated else 'strict')
             except UnicodeDecodeError:
-                body_text = "<could not decode request body with utf-8>"
-            logger.debug('Incoming request: %s' % body_text)
+                return '<could not decode request body with utf-8>'
 
-        if is_xmlrpc_request(request):
-            if RESTRICT_XML:
-                raise Http404
+        if truncated:
+            value = '%s... (%s more)' % (value, truncated)
+        return value
 
-            if not check_request_permission(request, 'xml'):
-                return HttpResponseForbidden()
 
-            resp = dispatcher.xmldispatch(request.body, request=request)
-            response_type = 'text/xml'
-        else:
-            if RESTRICT_JSON:
-                raise Http404
+def make_rpc_response(request, rpc_request, resp, rpc_dispatcher=None):
+    '''
+    Returns the HttpResponse for the encoded response to an RPC call
+
+    Responses to the introspection methods (which are cached by the
+    dispatcher) have an ETag of the response sent, including the id of a
+    JSONRPC request. RPC calls are POST requests so they are always
+    answered in full. If :envvar:`RPC4DJANGO_COMPRESS_RESPONSES`
+    is set, the response is compressed with an encoding the client accepts
+    (see :mod:`rpc4django.compression`).
+    '''
 
-            if not check_request_permission(request, 'json'):
-                return HttpResponseForbidden()
+    if rpc_dispatcher is None:
+        rpc_dispatcher = dispatcher
 
-            resp = dispatcher.jsondispatch(request.body, request=request)
-            response_type = 'application/json'
+    if rpc_request.request_format == 'xml':
+        response_type = 'text/xml'
+    else:
+        response_type = 'application/json'
 
-        if LOG_REQUESTS_RESPONSES:
-            logger.debug('Outgoing %s response: %s' % (response_type, resp))
+    log = getattr(request, '_rpc4django_log', False)
+
+    if is_stream(resp):
+        # the result of the method is being streamed
+        if log:
+            logger.debug('Outgoing %s response: <streamed>', response_type)
+        response = StreamingHttpResponse(resp, content_type=response_type)
+        if compression.COMPRESS_RESPONSES:
+            response = compress_response(request, response)
+        return response
+
+    response = HttpResponse(resp, response_type)
+    if rpc_request.etag is not None:
+        # a cached introspection result
+        response['ETag'] = rpc_request.etag
+        response['Last-Modified'] = http_date(rpc_dispatcher.registry_modified)
+
+    if log:
+        logger.debug('Outgoing %s response: %s', response_type, LogText(resp))
+
+    if metrics.sinks:
+        metrics.observe('response_bytes', get_metrics_method(rpc_request, rpc_dispatcher),
+                        rpc_request.request_format, len(response.content))
+
+    if compression.COMPRESS_RESPONSES:
+        response = compress_response(request, response)
+    return response
+
+
+@csrf_exempt
+def serve_rpc_request(request, rpc_dispatcher=None):
+    '''
+    Handles rpc calls based on the content type of the request or
+    returns the method documentation page if the request
+    was a GET.
+
+    **Parameters**
+
+    ``request``
+        the Django HttpRequest object
+    ``rpc_dispatcher``
+        the :class:`RPCDispatcher <rpc4django.rpcdispatcher.RPCDispatcher>`
+        whose methods are served. Defaults to the global ``dispatcher``.
+        Other dispatchers are passed in the url patterns::
+
+            path('admin/RPC2', serve_rpc_request, {'rpc_dispatcher': admin_dispatcher})
+
+    '''
+
+    if rpc_dispatcher is None:
+        rpc_dispatcher = dispatcher
 
-        return HttpResponse(resp, response_type)
+    if is_rpc_call(request):
+        # Handle POST request with RPC payload
+
+        try:
+            rpc_request = authorize_rpc_request(request, rpc_dispatcher)
+        except RequestTooLarge as e:
+            return request_too_large(e)
+        except ContentEncodingError as e:
+            return content_encoding_error(e)
+        if rpc_request is None:
+            return HttpResponseForbidden()
+
+        resp = rpc_dispatcher.dispatch_request(rpc_request, request=request)
+        return make_rpc_response(request, rpc_request, resp, rpc_dispatcher)
     elif request.method == 'OPTIONS':
         # Handle OPTIONS request for "preflighted" requests
         # see https://developer.mozilla.org/en/HTTP_access_control
@@ -219,31 +567,123 @@ def serve_rpc_request(request):
             request.META.get('HTTP_ACCESS_CONTROL_REQUEST_HEADERS', '')
 
         if LOG_REQUESTS_RESPONSES:
-            logger.debug('Outgoing HTTP access response to: %s' % (origin))
+            logger.debug('Outgoing HTTP access response to: %s', origin)
 
         return response
     else:
         # Handle GET request
 
-        if RESTRICT_METHOD_SUMMARY:
+        if rpc_dispatcher.restrict_method_summary:
             # hide the documentation by raising 404
             raise Http404
 
         # show documentation
-        methods = dispatcher.list_methods()
-        template_data = {
-            'methods': methods,
-            'url': request.path,
-
-            # rpc4django version
-            'version': version(),
-
-            # restricts the ability to test the rpc server from the docs
-            'restrict_rpctest': RESTRICT_RPCTEST,
-        }
-
-        return render(
-            request,
-            'rpc4django/rpcmethod_summary.html',
-            template_data,
-        )
+        return method_summary(request, rpc_dispatcher)
+
+
+def serve_metrics(request):
+    '''
+    Returns the measurements of the in-process metrics registry in the
+    Prometheus text format
+
+    Raises ``Http404`` unless :envvar:`RPC4DJANGO_METRICS` is ``True``
+
+    **Parameters**
+
+    ``request``
+        the Django HttpRequest object
+
+    '''
+
+    if metrics.registry not in metrics.sinks:
+        raise Http404
+
+    return HttpResponse(metrics.registry.render_prometheus(),
+                        'text/plain; version=0.0.4; charset=utf-8')
+
+
+def render_method_summary(request, rpc_dispatcher=None):
+    '''
+    Renders the method documentation page
+
+    Returns a tuple of the content, its content type and ETag
+    '''
+
+    if rpc_dispatcher is None:
+        rpc_dispatcher = dispatcher
+
+    methods = rpc_dispatcher.list_methods()
+    template_data = {
+        'methods': methods,
+        'url': request.path,
+
+        # rpc4django version
+        'version': version(),
+
+        # restricts the ability to test the rpc server from the docs
+        'restrict_rpctest': rpc_dispatcher.restrict_rpctest,
+    }
+
+    response = render(
+        request,
+        'rpc4django/rpcmethod_summary.html',
+        template_data,
+    )
+    etag = quote_etag(hashlib.md5(response.content).hexdigest())
+    return response.content, response['Content-Type'], etag
+
+
+def method_summary(request, rpc_dispatcher=None):
+    '''
+    Returns the method documentation page
+
+    Unless :envvar:`RPC4DJANGO_CACHE_METHOD_SUMMARY` is ``False``, the
+    rendered page is cached until a method is registered and conditional
+    requests (``If-None-Match`` and ``If-Modified-Since``) get a
+    304 Not Modified response.
+    '''
+
+    if rpc_dispatcher is None:
+        rpc_dispatcher = dispatcher
+
+    if not CACHE_METHOD_SUMMARY:
+        content, content_type, etag = render_method_summary(request, rpc_dispatcher)
+        return HttpResponse(content, content_type)
+
+    key = (request.path, rpc_dispatcher, rpc_dispatcher.registry_version)
+    page = _summary_cache.get(key, None)
+    if page is None:
+        page = render_method_summary(request, rpc_dispatcher) + \
+            (rpc_dispatcher.registry_modified,)
+        if len(_summary_cache) >= SUMMARY_CACHE_SIZE:
+            _summary_cache.clear()
+        _summary_cache[key] = page
+    content, content_type, etag, last_modified = page
+
+    if is_not_modified(request, etag, last_modified):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(content, content_type)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def is_not_modified(request, etag, last_modified):
+    '''
+    Returns whether the client's cached copy of a page with ``etag``
+    which was last modified at ``last_modified`` is still current
+    '''
+
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH', None)
+    if if_none_match is not None:
+        etags = [tag.strip() for tag in if_none_match.split(',')]
+        return '*' in etags or etag in etags or ('W/' + etag) in etags
+
+    if_modified_since = request.META.get('HTTP_IF_MODIFIED_SINCE', None)
+    if if_modified_since is not None:
+        if_modified_since = parse_http_date_safe(if_modified_since)
+        return if_modified_since is not None and \
+            int(last_modified) <= if_modified_since
+
+    return False
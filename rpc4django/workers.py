@@ -0,0 +1,197 @@
+'''
+This module contains the bounded pool of worker threads used to run
+independent RPC calls (eg. the calls of a JSONRPC batch) concurrently.
+
+Calls made on a worker thread use their own database connections and do
+not take part in any transaction of the request thread
+(eg. ``ATOMIC_REQUESTS``).
+
+The timeout of a call starts when a worker starts it, so calls queued
+behind slow calls are not timed out before they run. A thread cannot be
+stopped, so a call which times out keeps running on its worker until it
+returns. Those calls are tracked by their pool and while they leave less
+than two workers free, calls are run in the request thread instead of
+queueing behind them.
+'''
+
+import threading
+import time
+from django.conf import settings
+from django.db import close_old_connections
+
+try:
+    from concurrent.futures import ThreadPoolExecutor, TimeoutError
+except ImportError:
+    # Python2 without the futures backport
+    ThreadPoolExecutor = None
+    TimeoutError = None
+
+
+MAX_WORKERS = getattr(settings, 'RPC4DJANGO_MAX_WORKERS', 4)
+
+_local = threading.local()
+
+
+class WorkerPool(object):
+    '''
+    A bounded pool of ``max_workers`` threads which is only started when
+    it is first used
+
+    Each :class:`RPCDispatcher <rpc4django.rpcdispatcher.RPCDispatcher>`
+    can have its own pool. Otherwise they share ``default_pool``.
+    '''
+
+    def __init__(self, max_workers=MAX_WORKERS):
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+        # the calls which timed out but are still running
+        self._abandoned = set()
+
+    @property
+    def free_workers(self):
+        '''
+        The number of workers not running a call which timed out
+        '''
+        return self.max_workers - len(self._abandoned)
+
+    def abandon(self, future):
+        '''
+        Tracks a call which timed out until it finishes
+        '''
+
+        with self._lock:
+            self._abandoned.add(future)
+        future.add_done_callback(self._release)
+
+    def _release(self, future):
+        with self._lock:
+            self._abandoned.discard(future)
+
+    def get_executor(self):
+        '''
+        Returns the thread pool or ``None`` if calls cannot be
+        run concurrently
+        '''
+
+        if ThreadPoolExecutor is None or self.max_workers < 2:
+            return None
+
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+
+default_pool = WorkerPool()
+
+
+def get_executor():
+    '''
+    Returns the shared thread pool or ``None`` if calls cannot be
+    run concurrently
+    '''
+
+    return default_pool.get_executor()
+
+
+def _run_in_worker(func, item, start_times=None, index=None):
+    if start_times is not None:
+        start_times[index] = time.time()
+    _local.in_worker = True
+    try:
+        return func(item)
+    finally:
+        _local.in_worker = False
+        # the worker thread's database connections are not cleaned up
+        # at the end of the request like those of the request thread
+        close_old_connections()
+
+
+def map_concurrently(func, items, concurrent=None, timeout=None,
+                     on_timeout=None, pool=None):
+    '''
+    Returns ``[func(item) for item in items]`` calling ``func`` on the
+    worker threads
+
+    **Parameters**
+
+    ``concurrent``
+      An optional list of booleans, one per item. Items marked ``False``
+      are called in the current thread while the others run on the workers.
+    ``timeout``
+      The number of seconds each call on a worker may take (counted from
+      when a worker starts it) or ``None`` to wait indefinitely
+    ``on_timeout``
+      Called with the item whose call timed out. Its return value is used
+      as the result of that call. By default the ``TimeoutError`` is raised.
+    ``pool``
+      The :class:`WorkerPool` to run the calls on. Defaults to ``default_pool``.
+
+    The calls are run in the current thread when there is no thread pool,
+    there are less than two items, the current thread is already a
+    worker (waiting on the bounded pool from inside it could deadlock) or
+    calls which timed out still occupy all but one of the workers.
+    A call which has not started ``timeout`` seconds after it is waited for
+    is run in the current thread instead. A call which times out is not
+    stopped. It keeps its worker until it returns.
+    '''
+
+    if concurrent is None:
+        concurrent = [True] * len(items)
+
+    pool = pool or default_pool
+    executor = pool.get_executor()
+    if executor is None or len(items) < 2 or getattr(_local, 'in_worker', False) or \
+            pool.free_workers < 2:
+        return [func(item) for item in items]
+
+    # when each call was started by a worker
+    start_times = [None] * len(items)
+    futures = [executor.submit(_run_in_worker, func, item, start_times, i) if in_worker else None
+               for i, (item, in_worker) in enumerate(zip(items, concurrent))]
+
+    # the remaining calls overlap with those on the workers
+    results = [func(item) if future is None else None
+               for item, future in zip(items, futures)]
+
+    for i, future in enumerate(futures):
+        if future is None:
+            continue
+        try:
+            results[i] = _wait_for_call(future, func, items[i], start_times, i, timeout)
+        except TimeoutError:
+            if not future.cancel():
+                # the call is running and cannot be stopped
+                pool.abandon(future)
+            if on_timeout is None:
+                raise
+            results[i] = on_timeout(items[i])
+
+    return results
+
+
+def _wait_for_call(future, func, item, start_times, index, timeout):
+    '''
+    Returns the result of a call submitted by :func:`map_concurrently`
+    allowing it ``timeout`` seconds from when a worker starts it
+    '''
+
+    if timeout is None:
+        return future.result()
+
+    started = start_times[index]
+    if started is None:
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            started = start_times[index]
+            if started is None and future.cancel():
+                # still queued behind slow calls
+                return func(item)
+            if started is None:
+                # the worker is just starting it
+                started = time.time()
+
+    return future.result(max(started + timeout - time.time(), 0))
@@ -2,62 +2,28 @@
 Implements an XMLRPC dispatcher
 """
 
-import datetime
 import sys
-import inspect
-from defusedxml import xmlrpc
 from django.conf import settings
-from collections import OrderedDict
-from decimal import Decimal
+
+from . import limits
+from .callplan import CallPlan, InvalidParamsError, build_call_plan
+from .columnar import format_result
+from .limits import RequestTooLarge
+from .metrics import measure
+from .rpcrequest import RPCRequest
+from .streaming import ColumnarResult, encode_stream, is_stream, prime_stream
+from .xmlrpcmarshaller import XMLRPCMarshaller, dumps
+from .xmlrpcparser import parse as parse_xmlrpc
 
 if sys.version_info.major == 2:
     # Python2
-    from xmlrpclib import Fault, dumps, Marshaller
+    from xmlrpclib import Fault
     from SimpleXMLRPCServer import SimpleXMLRPCDispatcher
 else:
     # Python3
-    from xmlrpc.client import Fault, dumps, Marshaller
+    from xmlrpc.client import Fault
     from xmlrpc.server import SimpleXMLRPCDispatcher
 
-
-Marshaller.dispatch[OrderedDict] = Marshaller.dump_struct
-
-
-
-# Transparently support datetime.date as datetime.datetime
-def dump_date(instance, value, write):
-    value = datetime.datetime.combine(value, datetime.time.min)
-    return Marshaller.dump_datetime(instance, value, write)
-
-
-Marshaller.dispatch[datetime.date] = dump_date
-
-
-# Add support for decimal
-def dump_decimal(instance, value, write):
-    value = float(value)
-    write("<value><bigdecimal>")
-    write(str(value))
-    write("</bigdecimal></value>\n")
-
-
-Marshaller.dispatch[Decimal] = dump_decimal
-
-try:
-    # django 1.11 compat
-    from django.utils.deprecation import CallableBool
-
-    def dump_CallableBool(instance, value, write):
-        return Marshaller.dump_bool(instance, value, write)
-    Marshaller.dispatch[CallableBool] = dump_CallableBool
-except ImportError:
-    # django 2.*
-    pass
-
-# This method makes the XMLRPC parser (used by loads) safe
-# from various XML based attacks
-xmlrpc.monkey_patch()
-
 XMLRPC_USE_DATETIME = getattr(settings,
                               'RPC4DJANGO_XMLRPC_USE_DATETIME', True)
 XMLRPC_USE_BUILTIN = getattr(settings,
@@ -73,14 +39,111 @@ class XMLRPCDispatcher(SimpleXMLRPCDispatcher):
     also pass the Django HttpRequest object from the underlying RPC request
     """
 
+    request_format = 'xml'
+
     def __init__(self):
         self.funcs = {}
+        self.call_plans = {}
+        self.stream_arrays = {}
+        self.result_formats = {}
         self.instance = None
         self.allow_none = True
         self.encoding = None
         self.use_datetime = XMLRPC_USE_DATETIME
         self.use_builtin_types = XMLRPC_USE_BUILTIN
 
+    def register_function(self, function, name=None, call_plan=None, stream_array=None,
+                          result_format=None):
+        """
+        Registers a function to respond to XMLRPC requests.
+
+        ``call_plan`` is the :class:`CallPlan <rpc4django.callplan.CallPlan>`
+        of the function or a function returning it, which is called when the
+        function is first called. If it is not passed, it is built from the
+        function when the function is first called.
+
+        ``stream_array`` is the name of the last argument of the function
+        if it is passed a generator of the items of an array as they are
+        parsed (see :mod:`rpc4django.xmlrpcparser`).
+
+        ``result_format`` is the format the results of the function are
+        returned in (see :mod:`rpc4django.columnar`).
+        """
+        if name is None:
+            name = function.__name__
+        self.funcs[name] = function
+        if call_plan is None:
+            self.call_plans.pop(name, None)
+        else:
+            self.call_plans[name] = call_plan
+        if stream_array is None:
+            self.stream_arrays.pop(name, None)
+        else:
+            self.stream_arrays[name] = stream_array
+        if result_format is None:
+            self.result_formats.pop(name, None)
+        else:
+            self.result_formats[name] = result_format
+        return function
+
+    def get_call_plan(self, method):
+        """
+        Returns the :class:`CallPlan <rpc4django.callplan.CallPlan>`
+        of a registered method
+        """
+        call_plan = self.call_plans.get(method, None)
+        if call_plan is None:
+            # the method was registered without a call plan or added
+            # to funcs directly (eg. by register_multicall_functions)
+            call_plan = self.call_plans[method] = build_call_plan(self.funcs[method])
+        elif not isinstance(call_plan, CallPlan):
+            # the plan is resolved when it is first needed
+            call_plan = self.call_plans[method] = call_plan()
+        return call_plan
+
+    def get_stream_index(self, method):
+        """
+        Returns the index of the parameter of a method which is
+        streamed or ``None`` if the method does not stream a parameter
+        """
+        stream_array = self.stream_arrays.get(method, None)
+        if stream_array is None:
+            return None
+
+        args = self.get_call_plan(method).args
+        if not args or args[-1] != stream_array:
+            raise ValueError('"%s" is not the last argument of "%s"' % (stream_array, method))
+        return len(args) - 1
+
+    def parse(self, data):
+        """
+        Extracts the xml marshaled parameters and method name into an
+        :class:`RPCRequest <rpc4django.rpcrequest.RPCRequest>`
+
+        ``data`` is parsed incrementally and can be a string, bytes or a
+        file-like object. The array parameter of a method registered with
+        ``stream_array`` is a generator which parses the rest of ``data``
+        as it is consumed. :func:`serve_rpc_request
+        <rpc4django.views.serve_rpc_request>` passes the request stream
+        itself when the body is not needed for anything else (see
+        :func:`can_stream_request <rpc4django.views.can_stream_request>`).
+
+        Any error raised while parsing is kept on the request and
+        reported as a fault by :meth:`dispatch_request` except
+        :class:`RequestTooLarge <rpc4django.limits.RequestTooLarge>` when
+        a parameter exceeds the limits in :mod:`rpc4django.limits`.
+        """
+        try:
+            params, method = parse_xmlrpc(data, self.use_datetime, self.use_builtin_types,
+                                          self.get_stream_index,
+                                          limits.MAX_DEPTH, limits.MAX_STRING_SIZE)
+        except RequestTooLarge:
+            raise
+        except Exception as e:
+            return RPCRequest('xml', error=e)
+
+        return RPCRequest('xml', method=method, params=params)
+
     def dispatch(self, data, **kwargs):
         """
         Extracts the xml marshaled parameters and method name and calls the
@@ -91,28 +154,131 @@ class XMLRPCDispatcher(SimpleXMLRPCDispatcher):
         method has a different name due to the different parameters it takes
         from the superclass method.
         """
+
+        return self.dispatch_request(self.parse(data), **kwargs)
+
+    def dispatch_request(self, rpc_request, **kwargs):
+        """
+        Calls the method named by an already parsed
+        :class:`RPCRequest <rpc4django.rpcrequest.RPCRequest>` and returns
+        either an xml marshaled response or an XMLRPC fault
+        """
+        error = self.check_request(rpc_request)
+        if error is not None:
+            return error
+
         try:
-            if sys.version_info.major == 2:
-                params, method = xmlrpc.xmlrpc_client.loads(data, self.use_datetime)
-            else:
-                params, method = xmlrpc.xmlrpc_client.loads(data, self.use_datetime, self.use_builtin_types)
-            response = self._dispatch(method, params, **kwargs)
+            response = self._dispatch(rpc_request.method, rpc_request.params, **kwargs)
+        except Exception as e:
+            return self.encode_exception(rpc_request, e)
+
+        with measure('encode', rpc_request.method, self.request_format):
+            return self.encode_result(rpc_request, response)
+
+    def check_request(self, rpc_request):
+        """
+        Returns the XMLRPC fault for a request that could not be parsed
+        or ``None`` if the request was parsed successfully
+        """
+        if rpc_request.error is not None:
+            return self.encode_exception(rpc_request, rpc_request.error)
+        return None
+
+    def encode_result(self, rpc_request, response):
+        """
+        Returns the xml marshaled response for a successful call
+        or an XMLRPC fault if the response cannot be marshaled
+
+        If the response is a generator or other iterator or a
+        :class:`ColumnarResult <rpc4django.streaming.ColumnarResult>`, an
+        iterator of the chunks of the marshaled response is returned instead
+        of a string (see :mod:`rpc4django.streaming`)
+        """
+        if is_stream(response):
+            return self._encode_stream(response)
 
+        if isinstance(response, ColumnarResult):
+            return self._encode_columnar(rpc_request, response)
+
+        try:
             # wrap response in a singleton tuple
             response = (response,)
-            response = dumps(response, methodresponse=1,
-                             allow_none=self.allow_none,
-                             encoding=self.encoding)
-        except Fault as fault:
-            response = dumps(fault, allow_none=self.allow_none,
-                             encoding=self.encoding)
+            return dumps(response, methodresponse=1,
+                         allow_none=self.allow_none,
+                         encoding=self.encoding)
         except Exception as e:
-            response = dumps(
-                Fault(1, 'Unknown error, {}'.format(e)),
-                encoding=self.encoding, allow_none=self.allow_none,
-            )
+            return self.encode_exception(rpc_request, e)
 
-        return response
+    def encode_result_fragment(self, response):
+        """
+        Marshals the response to a call so that it can be cached and
+        reused for any request with :meth:`wrap_result_fragment`
+
+        Raises an exception if the response cannot be marshaled
+        """
+        return dumps((response,), methodresponse=1,
+                     allow_none=self.allow_none,
+                     encoding=self.encoding)
+
+    def wrap_result_fragment(self, rpc_request, fragment):
+        """
+        Returns the xml marshaled response for a response marshaled by
+        :meth:`encode_result_fragment`. XMLRPC responses do not depend on
+        the request so this is the fragment itself.
+        """
+        return fragment
+
+    def _get_response_start(self):
+        if self.encoding is None or self.encoding == 'utf-8':
+            xmlheader = "<?xml version='1.0'?>\n"
+        else:
+            xmlheader = "<?xml version='1.0' encoding='%s'?>\n" % self.encoding
+        return xmlheader + "<methodResponse>\n<params>\n<param>\n"
+
+    def _encode_stream(self, response):
+        marshal = XMLRPCMarshaller(self.encoding, self.allow_none).dump_value
+
+        prefix = self._get_response_start() + "<value><array><data>\n"
+        suffix = ("</data></array></value>\n</param>\n</params>\n"
+                  "</methodResponse>\n")
+        return encode_stream(response, marshal, prefix, '', suffix)
+
+    def _encode_columnar(self, rpc_request, response):
+        marshaller = XMLRPCMarshaller(self.encoding, self.allow_none)
+
+        try:
+            prefix = ''.join([
+                self._get_response_start(),
+                "<value><struct>\n<member>\n<name>columns</name>\n",
+                marshaller.dump_value(response.columns),
+                "</member>\n<member>\n<name>rows</name>\n<value><array><data>\n",
+            ])
+            suffix = ("</data></array></value>\n</member>\n</struct></value>\n"
+                      "</param>\n</params>\n</methodResponse>\n")
+
+            if is_stream(response.rows):
+                return encode_stream(response.iter_batches(), marshaller.dump_rows,
+                                     prefix, '', suffix)
+            return prefix + marshaller.dump_rows(response.rows) + suffix
+        except Exception as e:
+            return self.encode_exception(rpc_request, e)
+
+    def encode_exception(self, rpc_request, e):
+        """
+        Returns the XMLRPC fault for an exception raised by a call
+        """
+        if isinstance(e, Fault):
+            return dumps(e, allow_none=self.allow_none,
+                         encoding=self.encoding)
+
+        if isinstance(e, InvalidParamsError):
+            return dumps(Fault(e.code, str(e)), allow_none=self.allow_none,
+                         encoding=self.encoding)
+
+        return dumps(
+            Fault(1, 'Unknown error, {}'.format(e)),
+            encoding=self.encoding, allow_none=self.allow_none,
+        )
 
     def _dispatch(self, method, params, **kwargs):
         """
@@ -120,23 +286,16 @@ class XMLRPCDispatcher(SimpleXMLRPCDispatcher):
         """
 
         func = self.funcs.get(method, None)
-        # add some magic
-        # if request is the first arg of func and request is provided in kwargs we inject it
-        try:  # Python 3
-            full_args = inspect.getfullargspec(func)
-            args = full_args.args
-        except AttributeError:  # Python 2
-            args = inspect.getargspec(func)[0]
-        if args and args[0] == 'self':
-            args = args[1:]
-        if 'request' in kwargs and args and args[0] == 'request':
-            request = kwargs.pop('request')
-            params = (request,) + params
-        if func is not None:
-            try:
-                return func(*params, **kwargs)
-            except TypeError:
-                # Catch unexpected keyword argument error
-                return func(*params)
-        else:
+        if func is None:
             raise Exception('method "%s" is not supported' % method)
+
+        # the arguments are checked against the signature before the call
+        # so a TypeError raised by the method itself is never mistaken for
+        # a bad call
+        call_plan = self.get_call_plan(method)
+        params, kwargs = call_plan.bind(params, kwargs)
+        func = call_plan.sync_callable(func)
+        with measure('execute', method, self.request_format):
+            result = func(*params, **kwargs)
+            result = prime_stream(format_result(result, self.result_formats.get(method, None)))
+        return result
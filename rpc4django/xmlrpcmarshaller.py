@@ -0,0 +1,388 @@
+'''
+This module contains the marshaller used to encode XMLRPC responses. Its
+output is the same as ``xmlrpc.client.dumps`` but it is faster: each
+value is written as one fragment into a single list which is joined once,
+strings and numbers inside arrays and structs are written inline, arrays
+of numbers are written in bulk, the handlers of other types are found
+with one dictionary lookup and strings without markup characters are not
+escaped at all.
+
+Besides the types supported by the standard library, it encodes
+``OrderedDict`` and other registered dictionaries as structs,
+``datetime.date`` as a ``dateTime.iso8601`` at midnight and ``Decimal``
+exactly as a ``bigdecimal`` (which :mod:`rpc4django.xmlrpcparser` parses
+back into a ``Decimal``). More types can be added with
+:meth:`XMLRPCMarshaller.register`. Unlike registering them on
+``xmlrpc.client.Marshaller.dispatch``, this does not change how other
+code in the process marshals XMLRPC, though handlers registered there are
+still used for types this marshaller does not know.
+'''
+
+import base64
+import datetime
+import sys
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+
+if sys.version_info.major == 2:
+    # Python2
+    from xmlrpclib import Binary, DateTime, Fault, Marshaller, MAXINT, MININT
+else:
+    # Python3
+    from xmlrpc.client import Binary, DateTime, Fault, Marshaller, MAXINT, MININT
+
+PY2 = sys.version_info.major == 2
+
+try:
+    # Python2
+    text_type = unicode
+    integer_types = (int, long)
+except NameError:
+    # Python3
+    text_type = str
+    integer_types = (int,)
+
+
+def escape(value):
+    '''
+    Escapes the markup characters of a string
+    '''
+    if '&' in value:
+        value = value.replace('&', '&amp;')
+    if '<' in value:
+        value = value.replace('<', '&lt;')
+    if '>' in value:
+        value = value.replace('>', '&gt;')
+    return value
+
+
+def format_datetime(value):
+    '''
+    Returns a datetime in the XMLRPC ``dateTime.iso8601`` format
+    '''
+    return '%04d%02d%02dT%02d:%02d:%02d' % (value.year, value.month, value.day,
+                                            value.hour, value.minute, value.second)
+
+
+class XMLRPCMarshaller(object):
+    '''
+    Marshals Python values to XMLRPC
+
+    Handlers in ``dispatch`` are keyed on the exact type of a value and
+    called with the marshaller, the value and the ``write`` method of the
+    output like the handlers of ``xmlrpc.client.Marshaller``.
+    '''
+
+    dispatch = {}
+
+    # the handlers resolved for types which are not in dispatch
+    _resolved = {}
+    _lock = threading.Lock()
+
+    def __init__(self, encoding=None, allow_none=False):
+        self.encoding = encoding or 'utf-8'
+        self.allow_none = allow_none
+        self.memo = set()
+        self._stdlib_marshaller = None
+
+    @classmethod
+    def register(cls, value_type, handler):
+        '''
+        Marshals values of exactly ``value_type`` with
+        ``handler(marshaller, value, write)``
+        '''
+        with cls._lock:
+            cls.dispatch[value_type] = handler
+            cls._resolved.clear()
+
+    def dumps(self, values):
+        '''
+        Returns the ``<params>`` (or ``<fault>`` for a Fault) block
+        for ``values`` like ``xmlrpc.client.Marshaller.dumps``
+        '''
+        out = []
+        write = out.append
+        if isinstance(values, Fault):
+            write('<fault>\n')
+            self.dump({'faultCode': values.faultCode,
+                       'faultString': values.faultString}, write)
+            write('</fault>\n')
+        else:
+            write('<params>\n')
+            for value in values:
+                write('<param>\n')
+                self.dump(value, write)
+                write('</param>\n')
+            write('</params>\n')
+        return ''.join(out)
+
+    def dump_value(self, value):
+        '''
+        Returns the ``<value>`` element for a single value
+        '''
+        out = []
+        self.dump(value, out.append)
+        return ''.join(out)
+
+    def dump_rows(self, rows):
+        '''
+        Returns the ``<value>`` elements of the rows of a table where each
+        row is a tuple or list of values which is marshaled as an array
+        '''
+        out = []
+        write = out.append
+        for row in rows:
+            # rows are flat so they are not checked for recursion
+            write('<value><array><data>\n')
+            self.dump_items(row, write)
+            write('</data></array></value>\n')
+        return ''.join(out)
+
+    def dump(self, value, write):
+        handler = self.dispatch.get(type(value), None)
+        if handler is None:
+            handler = self.resolve(value)
+        handler(self, value, write)
+
+    def resolve(self, value):
+        '''
+        Returns the handler for a value whose type is not in ``dispatch``
+
+        The result is remembered for the type so each type is only
+        resolved once.
+        '''
+        value_type = type(value)
+        handler = self._resolved.get(value_type, None)
+        if handler is not None:
+            return handler
+
+        if value_type in Marshaller.dispatch:
+            # registered on the standard library's marshaller
+            handler = XMLRPCMarshaller.dump_stdlib
+        elif not hasattr(value, '__dict__') or \
+                any(base in self.dispatch for base in value_type.__mro__):
+            # like the standard library, subclasses of the basic
+            # types cannot be marshalled
+            handler = XMLRPCMarshaller.dump_unsupported
+        else:
+            handler = XMLRPCMarshaller.dump_instance
+
+        with self._lock:
+            self._resolved[value_type] = handler
+        return handler
+
+    def dump_unsupported(self, value, write):
+        raise TypeError('cannot marshal %s objects' % type(value))
+
+    def dump_stdlib(self, value, write):
+        if self._stdlib_marshaller is None:
+            self._stdlib_marshaller = Marshaller(self.encoding, self.allow_none)
+        Marshaller.dispatch[type(value)](self._stdlib_marshaller, value, write)
+
+    def dump_nil(self, value, write):
+        if not self.allow_none:
+            raise TypeError('cannot marshal None unless allow_none is enabled')
+        write('<value><nil/></value>')
+    dispatch[type(None)] = dump_nil
+
+    def dump_bool(self, value, write):
+        write('<value><boolean>1</boolean></value>\n' if value else
+              '<value><boolean>0</boolean></value>\n')
+    dispatch[bool] = dump_bool
+
+    def dump_int(self, value, write):
+        if value > MAXINT or value < MININT:
+            raise OverflowError('int exceeds XML-RPC limits')
+        write('<value><int>%d</int></value>\n' % value)
+    for integer_type in integer_types:
+        dispatch[integer_type] = dump_int
+
+    def dump_double(self, value, write):
+        write('<value><double>%r</double></value>\n' % (value,))
+    dispatch[float] = dump_double
+
+    def dump_unicode(self, value, write):
+        if PY2:
+            value = value.encode(self.encoding)
+        write('<value><string>%s</string></value>\n' % escape(value))
+    dispatch[text_type] = dump_unicode
+
+    if PY2:
+        def dump_string(self, value, write):
+            write('<value><string>%s</string></value>\n' % escape(value))
+        dispatch[str] = dump_string
+    else:
+        def dump_bytes(self, value, write):
+            write('<value><base64>\n%s</base64></value>\n' %
+                  base64.encodebytes(value).decode('ascii'))
+        dispatch[bytes] = dump_bytes
+        dispatch[bytearray] = dump_bytes
+
+    # Strings, ints, floats and Decimals (the most common values inside
+    # arrays and structs) are written without going through dispatch. The
+    # other values are passed to their handlers.
+
+    def dump_array(self, value, write):
+        i = id(value)
+        if i in self.memo:
+            raise TypeError('cannot marshal recursive sequences')
+        self.memo.add(i)
+        write('<value><array><data>\n')
+        if not self.dump_numbers(value, write):
+            self.dump_items(value, write)
+        write('</data></array></value>\n')
+        self.memo.discard(i)
+    dispatch[tuple] = dump_array
+    dispatch[list] = dump_array
+
+    def dump_numbers(self, value, write):
+        '''
+        Writes an array whose items are all Decimals, floats or ints
+        (of the same type) in one go and returns ``True`` or returns
+        ``False`` for any other array
+        '''
+        if len(value) < 2:
+            return False
+        value_types = set(map(type, value))
+        if len(value_types) != 1:
+            return False
+
+        value_type = value_types.pop()
+        if value_type is Decimal:
+            tag, to_text = 'bigdecimal', str
+        elif value_type is float:
+            tag, to_text = 'double', repr
+        elif value_type is int and MININT <= min(value) and max(value) <= MAXINT:
+            tag, to_text = 'int', str
+        else:
+            return False
+
+        start = '<value><%s>' % tag
+        end = '</%s></value>\n' % tag
+        write(start + (end + start).join(map(to_text, value)) + end)
+        return True
+
+    def dump_items(self, value, write):
+        dispatch = self.dispatch
+        for item in value:
+            item_type = type(item)
+            if item_type is str:
+                if '&' in item or '<' in item or '>' in item:
+                    item = escape(item)
+                write('<value><string>%s</string></value>\n' % item)
+            elif item_type is int and MININT <= item <= MAXINT:
+                write('<value><int>%d</int></value>\n' % item)
+            elif item_type is float:
+                write('<value><double>%r</double></value>\n' % (item,))
+            elif item_type is Decimal:
+                write('<value><bigdecimal>%s</bigdecimal></value>\n' % item)
+            else:
+                (dispatch.get(item_type, None) or self.resolve(item))(self, item, write)
+
+    def dump_struct(self, value, write):
+        i = id(value)
+        if i in self.memo:
+            raise TypeError('cannot marshal recursive dictionaries')
+        self.memo.add(i)
+        dispatch = self.dispatch
+        write('<value><struct>\n')
+        for key, item in value.items():
+            if type(key) is not str:
+                if PY2 and isinstance(key, text_type):
+                    key = key.encode(self.encoding)
+                elif not isinstance(key, str):
+                    raise TypeError('dictionary key must be string')
+            if '&' in key or '<' in key or '>' in key:
+                key = escape(key)
+
+            item_type = type(item)
+            if item_type is str:
+                if '&' in item or '<' in item or '>' in item:
+                    item = escape(item)
+                write('<member>\n<name>%s</name>\n<value><string>%s</string></value>\n'
+                      '</member>\n' % (key, item))
+            elif item_type is int and MININT <= item <= MAXINT:
+                write('<member>\n<name>%s</name>\n<value><int>%d</int></value>\n'
+                      '</member>\n' % (key, item))
+            elif item_type is float:
+                write('<member>\n<name>%s</name>\n<value><double>%r</double></value>\n'
+                      '</member>\n' % (key, item))
+            elif item_type is Decimal:
+                write('<member>\n<name>%s</name>\n<value><bigdecimal>%s</bigdecimal></value>\n'
+                      '</member>\n' % (key, item))
+            else:
+                write('<member>\n<name>%s</name>\n' % key)
+                (dispatch.get(item_type, None) or self.resolve(item))(self, item, write)
+                write('</member>\n')
+        write('</struct></value>\n')
+        self.memo.discard(i)
+    dispatch[dict] = dump_struct
+    dispatch[OrderedDict] = dump_struct
+
+    def dump_datetime(self, value, write):
+        write('<value><dateTime.iso8601>%s</dateTime.iso8601></value>\n' %
+              format_datetime(value))
+    dispatch[datetime.datetime] = dump_datetime
+
+    def dump_date(self, value, write):
+        # transparently support datetime.date as datetime.datetime
+        self.dump_datetime(datetime.datetime.combine(value, datetime.time.min), write)
+    dispatch[datetime.date] = dump_date
+
+    def dump_decimal(self, value, write):
+        # str() is exact and can be parsed back into the same Decimal
+        write('<value><bigdecimal>%s</bigdecimal></value>\n' % value)
+    dispatch[Decimal] = dump_decimal
+
+    def dump_wrapper(self, value, write):
+        # DateTime and Binary write themselves
+        self.write = write
+        value.encode(self)
+        del self.write
+    dispatch[DateTime] = dump_wrapper
+    dispatch[Binary] = dump_wrapper
+
+    def dump_instance(self, value, write):
+        # store instance attributes as a struct
+        self.dump_struct(value.__dict__, write)
+
+    del integer_type
+
+
+try:
+    # django 1.11 compat
+    from django.utils.deprecation import CallableBool
+    XMLRPCMarshaller.dispatch[CallableBool] = XMLRPCMarshaller.dump_bool
+except ImportError:
+    # django 2.*
+    pass
+
+
+def dumps(params, methodname=None, methodresponse=None, encoding=None,
+          allow_none=False):
+    '''
+    Marshals a tuple of params or a Fault into an XMLRPC request or
+    response with :class:`XMLRPCMarshaller` and returns the same string
+    as ``xmlrpc.client.dumps``
+    '''
+
+    if isinstance(params, Fault):
+        methodresponse = 1
+
+    if not encoding:
+        encoding = 'utf-8'
+
+    data = XMLRPCMarshaller(encoding, allow_none).dumps(params)
+
+    if encoding != 'utf-8':
+        xmlheader = "<?xml version='1.0' encoding='%s'?>\n" % str(encoding)
+    else:
+        xmlheader = "<?xml version='1.0'?>\n"
+
+    if methodname:
+        return ''.join((xmlheader, '<methodCall>\n<methodName>', methodname,
+                        '</methodName>\n', data, '</methodCall>\n'))
+    if methodresponse:
+        return ''.join((xmlheader, '<methodResponse>\n', data, '</methodResponse>\n'))
+    return data
@@ -0,0 +1,202 @@
+'''
+This module contains the incremental parser for XMLRPC requests. The
+request is fed to expat in chunks and the parameters are built as each
+chunk is parsed rather than after the whole body has been decoded.
+
+One array parameter of a method can also be streamed: instead of a list,
+the method is passed a generator of the items of the array and the rest
+of the request is only parsed as the method consumes the generator, so
+the whole array never has to be in memory at once.
+
+The parser uses defusedxml's expat parser directly so DTD entities and
+external references are forbidden whether or not the stdlib parser has
+been patched.
+
+``bigdecimal`` values, which :mod:`rpc4django.xmlrpcmarshaller` writes for
+``Decimal``, are parsed into exact ``Decimal`` values.
+
+The nesting depth of the parameters and the size of their strings can be
+limited (see :mod:`rpc4django.limits`). They are checked as each array,
+struct and string is parsed.
+'''
+
+import sys
+from collections import deque
+from decimal import Decimal
+
+from defusedxml.xmlrpc import DefusedExpatParser
+
+from .limits import RequestTooLarge
+
+if sys.version_info.major == 2:
+    # Python2
+    from xmlrpclib import Unmarshaller
+else:
+    # Python3
+    from xmlrpc.client import Unmarshaller
+
+# the number of bytes (or characters) fed to the parser at a time
+CHUNK_SIZE = 64 * 1024
+
+
+def iter_chunks(data, chunk_size=None):
+    '''
+    Yields the chunks of a request body which can be a string, bytes
+    or a file-like object with a ``read`` method
+    '''
+
+    if chunk_size is None:
+        chunk_size = CHUNK_SIZE
+
+    if hasattr(data, 'read'):
+        while True:
+            chunk = data.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    if isinstance(data, bytes) and sys.version_info.major > 2:
+        # slices of a memoryview do not copy the data
+        data = memoryview(data)
+
+    for start in range(0, len(data), chunk_size):
+        yield data[start:start + chunk_size]
+
+
+class StreamingUnmarshaller(Unmarshaller):
+    '''
+    An Unmarshaller which passes the items of one array parameter to
+    ``items`` as they are parsed instead of building the array
+
+    **Attributes**
+
+    ``get_stream_index``
+      A callable which is passed the method name and returns the index of
+      the parameter to stream or ``None``
+    ``stream_index``
+      The index of the parameter being streamed or ``None``
+    ``stream_mark``
+      The position on the stack of the streamed array once it has started
+      or ``None``
+    ``stream_open``
+      The streamed array has started but not ended
+    ``items``
+      The parsed items of the streamed array which have not been consumed
+    ``max_depth``
+      The number of levels of arrays and structs a parameter can have
+      or ``None``
+    ``max_string_size``
+      The maximum length of a string or ``None``
+
+    '''
+
+    def __init__(self, use_datetime=False, use_builtin_types=False,
+                 get_stream_index=None, max_depth=None, max_string_size=None):
+        if sys.version_info.major == 2:
+            Unmarshaller.__init__(self, use_datetime)
+        else:
+            Unmarshaller.__init__(self, use_datetime, use_builtin_types)
+        self.get_stream_index = get_stream_index
+        self.stream_index = None
+        self.stream_mark = None
+        self.stream_open = False
+        self.items = deque()
+        self.max_depth = max_depth
+        self.max_string_size = max_string_size
+
+    dispatch = dict(Unmarshaller.dispatch)
+
+    def end_bigdecimal(self, data):
+        # not parsed by the Python2 Unmarshaller at all
+        self.append(Decimal(data))
+        self._value = 0
+    dispatch['bigdecimal'] = end_bigdecimal
+
+    def start(self, tag, attrs):
+        if (tag == 'array' or tag == 'struct') and self.max_depth is not None and \
+                len(self._marks) >= self.max_depth:
+            raise RequestTooLarge('A parameter is nested more than %s levels deep' %
+                                  self.max_depth)
+
+        if tag == 'array' and not self._marks and self.stream_mark is None and \
+                self.stream_index is not None and len(self._stack) == self.stream_index:
+            self.stream_mark = len(self._stack)
+            self.stream_open = True
+        return Unmarshaller.start(self, tag, attrs)
+
+    def end(self, tag):
+        if self.max_string_size is not None and \
+                (tag == 'string' or tag == 'name' or (tag == 'value' and self._value)) and \
+                sum(len(data) for data in self._data) > self.max_string_size:
+            # a value without a type is a string
+            raise RequestTooLarge('A string is longer than %s characters' %
+                                  self.max_string_size)
+
+        result = Unmarshaller.end(self, tag)
+
+        if tag == 'methodName' and self.get_stream_index is not None:
+            self.stream_index = self.get_stream_index(self._methodname)
+        elif self.stream_open:
+            if not self._marks:
+                # the end of the streamed array
+                self.stream_open = False
+            elif len(self._marks) == 1:
+                # only the streamed array is open so any value
+                # on the stack after it is a complete item
+                while len(self._stack) > self.stream_mark:
+                    self.items.append(self._stack.pop(self.stream_mark))
+
+        return result
+
+
+def parse(data, use_datetime=False, use_builtin_types=False, get_stream_index=None,
+          max_depth=None, max_string_size=None):
+    '''
+    Parses an XMLRPC request from ``data`` (see :func:`iter_chunks`)
+    and returns a tuple of the parameters and the method name
+
+    Raises :class:`RequestTooLarge <rpc4django.limits.RequestTooLarge>`
+    as soon as a parameter is nested more than ``max_depth`` levels deep
+    or a string is longer than ``max_string_size``.
+
+    If ``get_stream_index`` returns the index of a parameter for the
+    method being called, that parameter is a generator of the items of
+    the array. Parsing stops when the array starts and continues as the
+    generator is consumed. Errors in the rest of the request are raised
+    by the generator.
+    '''
+
+    chunks = iter_chunks(data)
+    unmarshaller = StreamingUnmarshaller(use_datetime, use_builtin_types, get_stream_index,
+                                         max_depth, max_string_size)
+    parser = DefusedExpatParser(unmarshaller)
+
+    for chunk in chunks:
+        parser.feed(chunk)
+        if unmarshaller.stream_mark is not None:
+            params = tuple(unmarshaller._stack[:unmarshaller.stream_mark])
+            return (params + (stream_items(parser, unmarshaller, chunks),),
+                    unmarshaller.getmethodname())
+
+    parser.close()
+    return unmarshaller.close(), unmarshaller.getmethodname()
+
+
+def stream_items(parser, unmarshaller, chunks):
+    '''
+    Yields the items of the streamed array, parsing the remaining
+    ``chunks`` as they are needed
+    '''
+
+    items = unmarshaller.items
+    for chunk in chunks:
+        while items:
+            yield items.popleft()
+        parser.feed(chunk)
+
+    parser.close()
+    while items:
+        yield items.popleft()
+
+    if len(unmarshaller.close()) != unmarshaller.stream_mark + 1:
+        raise ValueError('The streamed array must be the last parameter')
@@ -65,6 +65,7 @@ setup(
     install_requires=['Django>=1.9', 'defusedxml'],
     extras_require={
         "reST": ['docutils >= 0.4'],
+        "orjson": ['orjson'],
     },
 
     # templates packaged into eggs cannot be loaded unless TEMPLATE_LOADER
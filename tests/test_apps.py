@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+
+'''
+App Config Tests
+----------------
+
+'''
+
+import unittest
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    from rpc4django import apps
+except ImproperlyConfigured:
+    # Configure Django if not already configured
+    from django.conf import settings
+    settings.configure(DEBUG=True)
+    from rpc4django import apps
+
+import rpc4django
+from django.test.utils import override_settings
+
+
+class TestRPC4DjangoConfig(unittest.TestCase):
+
+    def setUp(self):
+        self.discovered = []
+        autodiscover_modules = apps.autodiscover_modules
+        apps.autodiscover_modules = self.discovered.append
+        self.addCleanup(setattr, apps, 'autodiscover_modules', autodiscover_modules)
+        self.config = apps.RPC4DjangoConfig('rpc4django', rpc4django)
+
+    def test_ready(self):
+        self.config.ready()
+        self.assertEqual(self.discovered, ['rpc'])
+
+    def test_rpc_modules(self):
+        with override_settings(RPC4DJANGO_RPC_MODULES=('rpc', 'rpcmethods')):
+            self.config.ready()
+        self.assertEqual(self.discovered, ['rpc', 'rpcmethods'])
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+'''
+Async Views Tests
+-----------------
+
+'''
+
+import asyncio
+import json
+import unittest
+import warnings
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    from rpc4django import asyncviews
+except ImproperlyConfigured:
+    # Configure Django if not already configured
+    from django.conf import settings
+    settings.configure(DEBUG=True)
+    from rpc4django import asyncviews
+
+from asgiref.sync import async_to_sync
+from django.test import RequestFactory
+
+try:
+    from xmlrpclib import loads, dumps
+except ImportError:
+    from xmlrpc.client import loads, dumps
+
+
+async def async_add(a, b):
+    await asyncio.sleep(0)
+    return a + b
+
+
+async def async_request(request):
+    return request.path
+
+
+async def async_fail():
+    raise ValueError('failed')
+
+
+def failing_rows():
+    raise ValueError('failed')
+    yield 1
+
+
+async def async_rows():
+    return failing_rows()
+
+
+produced = []
+
+
+def counted_rows(count):
+    for i in range(count):
+        produced.append(i)
+        yield i
+
+
+cached_calls = []
+
+
+async def async_cached(value):
+    cached_calls.append(value)
+    return (value * 2 for i in range(3))
+async_cached.cache = True
+
+
+class TestServeRPCRequestAsync(unittest.TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        dispatcher = asyncviews.dispatcher
+        dispatcher.register_method(async_add, 'async.add')
+        dispatcher.register_method(async_request, 'async.request')
+        dispatcher.register_method(async_fail, 'async.fail')
+        dispatcher.register_method(async_rows, 'async.rows')
+        dispatcher.register_method(async_cached, 'async.cached')
+        dispatcher.register_method(counted_rows, 'async.counted')
+
+    def call_json(self, method, params):
+        body = json.dumps({'method': method, 'params': params, 'id': 1})
+        request = self.factory.post('/RPC2', body, content_type='application/json')
+        response = async_to_sync(asyncviews.serve_rpc_request_async)(request)
+        return json.loads(response.content.decode('utf-8'))
+
+    def test_coroutine_method(self):
+        self.assertEqual(self.call_json('async.add', [1, 2])['result'], 3)
+        self.assertEqual(self.call_json('async.request', [])['result'], '/RPC2')
+        self.assertTrue('failed' in self.call_json('async.fail', [])['error']['message'])
+        # a streamed result which fails before its first item
+        self.assertTrue('failed' in self.call_json('async.rows', [])['error']['message'])
+
+    def test_cached_coroutine_method(self):
+        del cached_calls[:]
+        asyncviews.dispatcher.invalidate_cached_results('async.cached')
+        self.assertEqual(self.call_json('async.cached', [2])['result'], [4, 4, 4])
+        self.assertEqual(self.call_json('async.cached', [2])['result'], [4, 4, 4])
+        self.assertEqual(cached_calls, [2])
+
+        self.assertEqual(self.call_json('async.cached', [3])['result'], [6, 6, 6])
+        self.assertEqual(cached_calls, [2, 3])
+
+    def test_sync_method(self):
+        self.assertTrue('async.add' in self.call_json('system.listMethods', [])['result'])
+        self.assertEqual(self.call_json('unknown', [])['error']['code'], 105)
+
+    def test_xml(self):
+        request = self.factory.post('/RPC2', dumps((1, 2), 'async.add'), content_type='text/xml')
+        response = async_to_sync(asyncviews.serve_rpc_request_async)(request)
+        out, name = loads(response.content)
+        self.assertEqual(out[0], 3)
+
+    def test_streamed(self):
+        del produced[:]
+
+        body = json.dumps({'method': 'async.counted', 'params': [100000], 'id': 1})
+        request = self.factory.post('/RPC2', body, content_type='application/json')
+        response = async_to_sync(asyncviews.serve_rpc_request_async)(request)
+        if not hasattr(response, 'is_async'):
+            self.skipTest('Django < 4.2 reads streamed responses synchronously')
+        self.assertTrue(response.is_async)
+
+        async def read():
+            chunks = []
+            async for chunk in response:
+                if not chunks:
+                    # the rest of the result has not been read yet
+                    self.assertTrue(len(produced) < 100000)
+                chunks.append(chunk)
+            return b''.join(chunks)
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            content = async_to_sync(read)()
+        self.assertEqual(json.loads(content.decode('utf-8'))['result'], list(range(100000)))
+
+    def test_coroutine_in_sync_dispatch(self):
+        # batches and the synchronous view run coroutine methods to completion
+        body = json.dumps([{'method': 'async.add', 'params': [1, 2], 'id': 1}])
+        resp = asyncviews.dispatcher.jsondispatch(body.encode('utf-8'))
+        self.assertEqual(json.loads(resp)[0]['result'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
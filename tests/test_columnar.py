@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+'''
+Columnar Result Tests
+---------------------
+
+'''
+
+import json
+import unittest
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    from rpc4django.rpcdispatcher import RPCDispatcher, rpcmethod
+except ImproperlyConfigured:
+    # Configure Django if not already configured
+    from django.conf import settings
+    settings.configure(DEBUG=True)
+    from rpc4django.rpcdispatcher import RPCDispatcher, rpcmethod
+
+from django.test import RequestFactory
+from rpc4django import streaming
+from rpc4django.columnar import format_result
+from rpc4django.streaming import ColumnarResult, materialize
+
+try:
+    from xmlrpclib import Fault, dumps, loads
+except ImportError:
+    from xmlrpc.client import Fault, dumps, loads
+
+
+ROWS = [{'id': 1, 'name': u'a', 'price': 1.5},
+        {'id': 2, 'name': u'b', 'price': 2.5},
+        {'id': 3, 'name': u'c', 'price': 3.5}]
+
+
+class TestFormatResult(unittest.TestCase):
+
+    def test_columnar(self):
+        result = format_result(ROWS, 'columnar')
+        self.assertEqual(result.columns, ['id', 'name', 'price'])
+        self.assertEqual(result.rows, [(1, u'a', 1.5), (2, u'b', 2.5), (3, u'c', 3.5)])
+        self.assertEqual(materialize(format_result([], 'columnar')), {'columns': [], 'rows': []})
+        self.assertEqual(format_result([{'id': 1}], 'columnar').rows, [(1,)])
+        self.assertTrue(format_result(ROWS, None) is ROWS)
+
+    def test_column_major(self):
+        result = format_result(ROWS, 'column_major')
+        self.assertEqual(list(result.keys()), ['id', 'name', 'price'])
+        self.assertEqual(result['id'], [1, 2, 3])
+        self.assertEqual(result['name'], [u'a', u'b', u'c'])
+        self.assertEqual(format_result([], 'column_major'), {})
+
+    def test_iterator(self):
+        result = format_result(iter(ROWS), 'columnar')
+        self.assertTrue(isinstance(result, ColumnarResult))
+        self.assertEqual(result.columns, ['id', 'name', 'price'])
+        self.assertEqual(materialize(result), materialize(format_result(ROWS, 'columnar')))
+
+    def test_not_rows(self):
+        self.assertRaises(TypeError, format_result, [1, 2], 'columnar')
+        self.assertRaises(TypeError, format_result, ROWS + [(4, u'd', 4.5)], 'columnar')
+
+    def test_mismatched_rows(self):
+        extra = ROWS + [{'id': 4, 'name': u'd', 'price': 4.5, 'stock': 1}]
+        missing = ROWS + [{'id': 4, 'name': u'd'}]
+        other = ROWS + [{'id': 4, 'name': u'd', 'stock': 1}]
+        for rows in (extra, missing, other):
+            for result_format in ('columnar', 'column_major'):
+                self.assertRaises(TypeError, format_result, rows, result_format)
+
+        # the rows of a stream are checked as it is consumed
+        result = format_result(iter(other), 'columnar')
+        with self.assertRaises(TypeError) as context:
+            materialize(result)
+        self.assertTrue("['id', 'name', 'stock']" in str(context.exception))
+
+
+class TestColumnarMethods(unittest.TestCase):
+
+    def setUp(self):
+        self.dispatcher = RPCDispatcher()
+        self.addCleanup(setattr, streaming, 'ROW_BATCH_SIZE', streaming.ROW_BATCH_SIZE)
+        streaming.ROW_BATCH_SIZE = 2
+
+        @rpcmethod(name='test.table', result_format='columnar', dispatcher=self.dispatcher)
+        def table():
+            return ROWS
+
+        @rpcmethod(name='test.stream', result_format='columnar', dispatcher=self.dispatcher)
+        def stream():
+            return (row for row in ROWS)
+
+        @rpcmethod(name='test.columns', result_format='column_major',
+                   dispatcher=self.dispatcher)
+        def columns():
+            return ROWS
+
+    def jsondispatch(self, method, params=()):
+        response = self.dispatcher.jsondispatch(json.dumps(
+            {'method': method, 'params': list(params), 'id': 1}).encode('utf-8'))
+        if not isinstance(response, str):
+            response = ''.join(response)
+        return json.loads(response)['result']
+
+    def xmldispatch(self, method, params=()):
+        response = self.dispatcher.xmldispatch(dumps(tuple(params), method).encode('utf-8'))
+        if not isinstance(response, str):
+            response = ''.join(response)
+        return loads(response)[0][0]
+
+    def test_json(self):
+        expected = {'columns': ['id', 'name', 'price'],
+                    'rows': [[1, u'a', 1.5], [2, u'b', 2.5], [3, u'c', 3.5]]}
+        self.assertEqual(self.jsondispatch('test.table'), expected)
+        self.assertEqual(self.jsondispatch('test.stream'), expected)
+        self.assertEqual(self.jsondispatch('test.columns'),
+                         {'id': [1, 2, 3], 'name': [u'a', u'b', u'c'], 'price': [1.5, 2.5, 3.5]})
+
+    def test_xml(self):
+        expected = {'columns': ['id', 'name', 'price'],
+                    'rows': [[1, u'a', 1.5], [2, u'b', 2.5], [3, u'c', 3.5]]}
+        self.assertEqual(self.xmldispatch('test.table'), expected)
+        self.assertEqual(self.xmldispatch('test.stream'), expected)
+        self.assertEqual(self.xmldispatch('test.columns'),
+                         {'id': [1, 2, 3], 'name': [u'a', u'b', u'c'], 'price': [1.5, 2.5, 3.5]})
+
+    def test_encoding_error(self):
+        @rpcmethod(name='test.bad', result_format='columnar', dispatcher=self.dispatcher)
+        def bad():
+            return [{'value': object()}]
+
+        self.assertRaises(Fault, self.xmldispatch, 'test.bad')
+        response = json.loads(self.dispatcher.jsondispatch(
+            b'{"method": "test.bad", "params": [], "id": 1}'))
+        self.assertTrue('failed to encode' in response['error']['message'])
+
+    def test_multicall(self):
+        calls = [{'methodName': 'test.stream', 'params': []}]
+        request = RequestFactory().post('/RPC2', content_type='text/xml')
+        response = self.dispatcher.xmldispatch(dumps((calls,), 'system.multicall').encode('utf-8'),
+                                               request=request)
+        result = loads(response)[0][0][0][0]
+        self.assertEqual(result['columns'], ['id', 'name', 'price'])
+        self.assertEqual(len(result['rows']), 3)
+
+    def test_introspection(self):
+        request = RequestFactory().get('/RPC2')
+        methods = dict((method['name'], method)
+                       for method in self.dispatcher.system_describe(request=request)['methods'])
+        self.assertEqual(methods['test.table']['resultFormat'], 'columnar')
+        self.assertEqual(methods['test.columns']['resultFormat'], 'column_major')
+        self.assertFalse('resultFormat' in methods['system.listMethods'])
+
+    def test_unknown_format(self):
+        def table():
+            return ROWS
+
+        self.assertRaises(ValueError, rpcmethod(result_format='rows', dispatcher=self.dispatcher),
+                          table)
+
+
+if __name__ == '__main__':
+    unittest.main()
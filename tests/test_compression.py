@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+
+'''
+Compression Tests
+-----------------
+
+'''
+
+import json
+import os
+import unittest
+import zlib
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    from rpc4django import compression
+except ImproperlyConfigured:
+    # Configure Django if not already configured
+    from django.conf import settings
+    settings.configure(DEBUG=True)
+    from rpc4django import compression
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory
+from rpc4django import limits, views
+from rpc4django.compression import (ContentEncodingError, UnsupportedContentEncoding,
+                                    choose_encoding, compress_response, iter_decompressed)
+from rpc4django.limits import RequestTooLarge, read_request_body
+from rpc4django.rpcdispatcher import RPCDispatcher, rpcmethod
+
+try:
+    from xmlrpclib import dumps, gzip_encode, loads
+except ImportError:
+    from xmlrpc.client import dumps, gzip_encode, loads
+
+
+def gunzip(data):
+    return zlib.decompress(data, 16 + zlib.MAX_WBITS)
+
+
+class TestChooseEncoding(unittest.TestCase):
+
+    def test_preference(self):
+        self.assertEqual(choose_encoding('gzip, deflate', ('gzip', 'deflate')), 'gzip')
+        self.assertEqual(choose_encoding('deflate, gzip', ('gzip', 'deflate')), 'gzip')
+        self.assertEqual(choose_encoding('deflate', ('gzip', 'deflate')), 'deflate')
+        self.assertEqual(choose_encoding('br, gzip', ('br', 'gzip')), 'br')
+
+    def test_quality(self):
+        self.assertEqual(choose_encoding('gzip;q=0.5, deflate', ('gzip', 'deflate')), 'deflate')
+        self.assertEqual(choose_encoding('gzip;q=0, deflate;q=0', ('gzip', 'deflate')), None)
+        self.assertEqual(choose_encoding('GZIP ; Q=1.0', ('gzip', 'deflate')), 'gzip')
+
+    def test_wildcard(self):
+        self.assertEqual(choose_encoding('*', ('gzip', 'deflate')), 'gzip')
+        self.assertEqual(choose_encoding('gzip;q=0, *', ('gzip', 'deflate')), 'deflate')
+        self.assertEqual(choose_encoding('identity', ('gzip', 'deflate')), None)
+        self.assertEqual(choose_encoding('', ('gzip', 'deflate')), None)
+
+
+class TestDecompression(unittest.TestCase):
+
+    def test_gzip(self):
+        data = b'x' * 100000
+        chunks = list(iter_decompressed(gzip_encode(data), 'gzip', 1000))
+        self.assertEqual(b''.join(chunks), data)
+        self.assertEqual(max(len(chunk) for chunk in chunks), 1000)
+
+    def test_deflate(self):
+        data = b'<methodCall/>' * 1000
+        self.assertEqual(b''.join(iter_decompressed(zlib.compress(data), 'deflate')), data)
+        self.assertEqual(b''.join(iter_decompressed(data, 'identity')), data)
+
+    def test_errors(self):
+        self.assertRaises(UnsupportedContentEncoding, list, iter_decompressed(b'x', 'br'))
+        self.assertRaises(ContentEncodingError, list, iter_decompressed(b'not gzip', 'gzip'))
+        # a truncated body
+        self.assertRaises(ContentEncodingError, list,
+                          iter_decompressed(gzip_encode(b'x' * 1000)[:-10], 'gzip'))
+
+    def test_limit(self):
+        # a small body which decompresses to 10MB
+        body = gzip_encode(b'\0' * (10 * 1024 * 1024))
+        request = RequestFactory().post('/RPC2', body, content_type='text/xml',
+                                        HTTP_CONTENT_ENCODING='gzip')
+        self.assertRaises(RequestTooLarge, read_request_body, request, 1024 * 1024)
+
+        request = RequestFactory().post('/RPC2', body, content_type='text/xml',
+                                        HTTP_CONTENT_ENCODING='gzip')
+        self.assertEqual(len(read_request_body(request, 10 * 1024 * 1024)), 10 * 1024 * 1024)
+        # the raw body is still available
+        self.assertEqual(request.body, body)
+
+
+class TestCompressResponse(unittest.TestCase):
+
+    def setUp(self):
+        self.request = RequestFactory().post('/RPC2', HTTP_ACCEPT_ENCODING='gzip, deflate')
+
+    def test_compress(self):
+        content = b'<value><int>1</int></value>' * 100
+        response = compress_response(self.request, HttpResponse(content, 'text/xml'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertEqual(gunzip(response.content), content)
+
+        request = RequestFactory().post('/RPC2', HTTP_ACCEPT_ENCODING='deflate')
+        response = compress_response(request, HttpResponse(content, 'text/xml'))
+        self.assertEqual(response['Content-Encoding'], 'deflate')
+        self.assertEqual(zlib.decompress(response.content), content)
+
+    def test_not_compressed(self):
+        # too small
+        response = compress_response(self.request, HttpResponse(b'x' * 100), min_size=101)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+        # not accepted
+        request = RequestFactory().post('/RPC2')
+        response = compress_response(request, HttpResponse(b'x' * 2000), min_size=0)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+        # not smaller
+        content = os.urandom(2000)
+        response = compress_response(self.request, HttpResponse(content), min_size=0)
+        self.assertEqual(response.content, content)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+        response = HttpResponse(b'x' * 2000, status=500)
+        self.assertFalse(compress_response(self.request, response).has_header('Content-Encoding'))
+
+    def test_stream(self):
+        chunks = [b'<value><int>%d</int></value>' % i for i in range(1000)]
+        response = compress_response(self.request, StreamingHttpResponse(iter(chunks)))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+
+        compressed = list(response.streaming_content)
+        # every chunk is flushed as it is compressed
+        self.assertTrue(len(compressed) > 1)
+        self.assertEqual(gunzip(b''.join(compressed)), b''.join(chunks))
+
+    def test_etag(self):
+        response = HttpResponse(b'x' * 2000)
+        response['ETag'] = '"abc"'
+        response = compress_response(self.request, response)
+        self.assertEqual(response['ETag'], 'W/"abc"')
+
+    @unittest.skipIf(compression.brotli is None, 'brotli is not installed')
+    def test_brotli(self):
+        request = RequestFactory().post('/RPC2', HTTP_ACCEPT_ENCODING='gzip, br')
+        content = b'<value><int>1</int></value>' * 100
+        response = compress_response(request, HttpResponse(content))
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(compression.brotli.decompress(response.content), content)
+
+
+class TestServeRPCRequest(unittest.TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.dispatcher = RPCDispatcher()
+        self.addCleanup(setattr, compression, 'COMPRESS_RESPONSES',
+                        compression.COMPRESS_RESPONSES)
+        self.addCleanup(setattr, limits, 'MAX_REQUEST_SIZE', limits.MAX_REQUEST_SIZE)
+        self.addCleanup(setattr, limits, 'MAX_DECOMPRESSED_SIZE', limits.MAX_DECOMPRESSED_SIZE)
+        compression.COMPRESS_RESPONSES = True
+
+        @rpcmethod(name='test.echo', dispatcher=self.dispatcher)
+        def echo(value):
+            return value
+
+        @rpcmethod(name='test.range', dispatcher=self.dispatcher)
+        def numbers(count):
+            return (i for i in range(count))
+
+    def post(self, body, content_type='text/xml', **extra):
+        request = self.factory.post('/RPC2', body, content_type=content_type, **extra)
+        return views.serve_rpc_request(request, self.dispatcher)
+
+    def test_compressed_request(self):
+        value = u'compressed ' * 1000
+        # as sent by xmlrpc.client.Transport above its encode_threshold
+        body = gzip_encode(dumps((value,), 'test.echo').encode('utf-8'))
+        response = self.post(body, HTTP_CONTENT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(loads(response.content)[0][0], value)
+
+        body = zlib.compress(json.dumps({'method': 'test.echo', 'params': [1], 'id': 1})
+                             .encode('utf-8'))
+        response = self.post(body, 'application/json', HTTP_CONTENT_ENCODING='deflate')
+        self.assertEqual(json.loads(response.content)['result'], 1)
+
+    def test_bad_request(self):
+        body = dumps((1,), 'test.echo').encode('utf-8')
+        self.assertEqual(self.post(body, HTTP_CONTENT_ENCODING='br').status_code, 415)
+        self.assertEqual(self.post(body, HTTP_CONTENT_ENCODING='gzip').status_code, 400)
+
+        limits.MAX_REQUEST_SIZE = 10000
+        body = gzip_encode(dumps((u'x' * 10000,), 'test.echo').encode('utf-8'))
+        self.assertEqual(self.post(body, HTTP_CONTENT_ENCODING='gzip').status_code, 413)
+
+    def test_decompression_bomb(self):
+        # about 220KB which decompresses to 50MB
+        body = gzip_encode(b'\0' * (50 * 1024 * 1024))
+        self.assertTrue(len(body) < 256 * 1024)
+        # the default settings
+        self.assertEqual(limits.MAX_REQUEST_SIZE, None)
+        self.assertEqual(self.post(body, HTTP_CONTENT_ENCODING='gzip').status_code, 413)
+
+        limits.MAX_DECOMPRESSED_SIZE = 1000
+        body = gzip_encode(dumps((u'x' * 1000,), 'test.echo').encode('utf-8'))
+        self.assertEqual(self.post(body, HTTP_CONTENT_ENCODING='gzip').status_code, 413)
+
+        limits.MAX_DECOMPRESSED_SIZE = None
+        self.assertEqual(self.post(body, HTTP_CONTENT_ENCODING='gzip').status_code, 200)
+
+    def test_compressed_response(self):
+        body = dumps((u'x' * 10000,), 'test.echo').encode('utf-8')
+        response = self.post(body, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(loads(gunzip(response.content))[0][0], u'x' * 10000)
+
+        # below the threshold
+        response = self.post(dumps((1,), 'test.echo').encode('utf-8'),
+                             HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(loads(response.content)[0][0], 1)
+
+    def test_streamed_response(self):
+        response = self.post(dumps((10000,), 'test.range').encode('utf-8'),
+                             HTTP_ACCEPT_ENCODING='gzip')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        content = gunzip(b''.join(response.streaming_content))
+        self.assertEqual(loads(content)[0][0], list(range(10000)))
+
+    def test_disabled(self):
+        compression.COMPRESS_RESPONSES = False
+        body = dumps((u'x' * 10000,), 'test.echo').encode('utf-8')
+        response = self.post(body, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,6 +9,7 @@ JSON RPC Dispatcher Tests
 import json
 import unittest
 from datetime import datetime
+from decimal import Decimal
 from django.core.exceptions import ImproperlyConfigured
 
 
@@ -20,6 +21,8 @@ except ImproperlyConfigured:
     settings.configure(DEBUG=True)
     from rpc4django.jsonrpcdispatcher import JSONRPCDispatcher
 
+from rpc4django.jsonserializers import get_serializer
+
 try:
     # Python2
     basestring
@@ -83,6 +86,41 @@ class TestJSONRPCDispatcher(unittest.TestCase):
         self.assertTrue(isinstance(jsondict['result'], basestring))
         self.assertEqual(type(datetime.strptime(jsondict['result'], "%Y-%m-%d %H:%M:%S")), datetime)
 
+    def test_compact(self):
+        jsontxt = json.dumps({"method": "add", "id": 1, "params": [1, 2]})
+        resp = self.dispatcher.dispatch(jsontxt)
+        self.assertTrue('\n' in resp)
+
+        dispatcher = JSONRPCDispatcher(compact=True)
+        dispatcher.register_function(lambda a, b: [a, b], 'add')
+        resp = dispatcher.dispatch(jsontxt)
+        self.assertFalse(' ' in resp or '\n' in resp)
+        self.assertEqual(json.loads(resp)['result'], [1, 2])
+
+    def test_serializers(self):
+        from django.core.serializers.json import DjangoJSONEncoder
+        value = {'date': datetime(2020, 2, 20, 12, 30, 15, 123456),
+                 'decimal': Decimal('1.10'), 1: [u'はじめまして', None, 1.5]}
+        jsontxt = json.dumps({"method": "value", "id": 1, "params": []})
+        expected = None
+        for serializer in ('json', 'auto', 'orjson'):
+            dispatcher = JSONRPCDispatcher(DjangoJSONEncoder, compact=True,
+                                           serializer=serializer)
+            dispatcher.register_function(lambda: value, 'value')
+            jsondict = json.loads(dispatcher.dispatch(jsontxt))
+            self.assertTrue('error' not in jsondict)
+            if expected is None:
+                expected = jsondict['result']
+            self.assertEqual(jsondict['result'], expected)
+        self.assertEqual(expected['date'], '2020-02-20T12:30:15.123')
+        self.assertEqual(expected['decimal'], '1.10')
+
+    def test_unknown_serializer(self):
+        for serializer in ('ujson', 'myproject.missing.Serializer'):
+            with self.assertRaises(ImproperlyConfigured) as context:
+                get_serializer(serializer)
+            self.assertTrue('RPC4DJANGO_JSON_SERIALIZER' in str(context.exception))
+
     def test_jsonrpc_member(self):
         # Demonstrate that the jsondict contains "jsonrpc"
         d = dict()
@@ -163,6 +201,27 @@ class TestJSONRPCDispatcher(unittest.TestCase):
         jsondict = json.loads(resp)
         self.assertTrue('result' not in jsondict)
         self.assertTrue(jsondict['error'] is not None)
+        self.assertEqual(jsondict['error']['code'], -32602)
+
+    def test_typeerror_runs_once(self):
+        calls = []
+
+        def failing(a):
+            calls.append(a)
+            raise TypeError('raised by the method')
+        self.dispatcher.register_function(failing, 'failing')
+
+        jsontxt = '{"params":[1],"method":"failing","id":1}'
+        jsondict = json.loads(self.dispatcher.dispatch(jsontxt, request='fakerequest'))
+        self.assertEqual(calls, [1])
+        self.assertTrue('TypeError' in jsondict['error']['message'])
+        self.assertNotEqual(jsondict['error']['code'], -32602)
+
+        # bad calls never run the method
+        jsontxt = '{"params":[1,2],"method":"failing","id":1}'
+        jsondict = json.loads(self.dispatcher.dispatch(jsontxt))
+        self.assertEqual(calls, [1])
+        self.assertEqual(jsondict['error']['code'], -32602)
 
     def test_dispatch_nomethod(self):
         jsontxt = '{"params":[],"method":"add123","id":123}'
@@ -184,7 +243,7 @@ class TestJSONRPCDispatcher(unittest.TestCase):
         self.assertEqual(jsondict['error']['code'], 101)
         self.assertEqual(jsondict['error']['message'], 'JSON decoding error')
 
-        jsontxt = '["should", "be", "a", "Object"]'
+        jsontxt = '"should be an Object"'
         resp = self.dispatcher.dispatch(jsontxt)
         jsondict = json.loads(resp)
         self.assertTrue('result' not in jsondict)
@@ -211,5 +270,76 @@ class TestJSONRPCDispatcher(unittest.TestCase):
         self.assertEqual(jsondict['error']['code'], 102)
         self.assertEqual(jsondict['error']['message'], 'method must be a javascript String')
 
+    def test_stream(self):
+        def rows(count):
+            for i in range(count):
+                yield {'id': i, 'name': u'row %s' % i}
+        self.dispatcher.register_function(rows, 'rows')
+
+        jsontxt = json.dumps({'params': [5000], 'method': 'rows', 'id': 'x'})
+        resp = self.dispatcher.dispatch(jsontxt)
+        self.assertFalse(isinstance(resp, basestring))
+        chunks = list(resp)
+        self.assertTrue(len(chunks) > 1)
+        jsondict = json.loads(''.join(chunks))
+        self.assertEqual(jsondict['id'], 'x')
+        self.assertEqual(jsondict['jsonrpc'], '2.0')
+        self.assertEqual(len(jsondict['result']), 5000)
+        self.assertEqual(jsondict['result'][4999], {'id': 4999, 'name': 'row 4999'})
+
+        # streams inside a batch are joined
+        batch = json.dumps([{'params': [3], 'method': 'rows', 'id': 1}])
+        responses = json.loads(self.dispatcher.dispatch(batch))
+        self.assertEqual(len(responses[0]['result']), 3)
+
+    def test_stream_error(self):
+        def failing(fail_at):
+            for i in range(fail_at):
+                yield i
+            raise ValueError('failed')
+        self.dispatcher.register_function(failing, 'failing')
+
+        # before the first item, the call fails normally
+        resp = self.dispatcher.dispatch('{"params": [0], "method": "failing", "id": 1}')
+        self.assertTrue(isinstance(resp, basestring))
+        self.assertTrue('failed' in json.loads(resp)['error']['message'])
+
+        # after the response has started, it is truncated
+        resp = ''.join(self.dispatcher.dispatch('{"params": [2], "method": "failing", "id": 1}'))
+        self.assertTrue(resp.endswith('1'))
+        self.assertRaises(ValueError, json.loads, resp)
+
+    def test_batch(self):
+        batch = [
+            {'jsonrpc': '2.0', 'method': 'add', 'params': [1, 2], 'id': 1},
+            {'jsonrpc': '2.0', 'method': 'add', 'params': [3, 4]},
+            {'jsonrpc': '2.0', 'method': 'add123', 'params': [], 'id': 2},
+            'should be an Object',
+            {'jsonrpc': '2.0', 'method': 'fact', 'params': [5], 'id': 3},
+        ]
+        resp = self.dispatcher.dispatch(json.dumps(batch))
+        responses = json.loads(resp)
+        self.assertEqual(len(responses), 4)
+        self.assertEqual(responses[0]['id'], 1)
+        self.assertEqual(responses[0]['result'], 3)
+        self.assertEqual(responses[1]['id'], 2)
+        self.assertEqual(responses[1]['error']['code'], 105)
+        self.assertEqual(responses[2]['error']['code'], 102)
+        self.assertEqual(responses[3]['id'], 3)
+        self.assertEqual(responses[3]['result'], 120)
+
+        self.dispatcher.concurrent_batches = True
+        self.assertEqual(json.loads(self.dispatcher.dispatch(json.dumps(batch))), responses)
+
+    def test_batch_errors(self):
+        resp = self.dispatcher.dispatch('[]')
+        jsondict = json.loads(resp)
+        self.assertEqual(jsondict['error']['code'], 102)
+
+        # only notifications get no response at all
+        batch = [{'jsonrpc': '2.0', 'method': 'add', 'params': [1, 2]}]
+        self.assertEqual(self.dispatcher.dispatch(json.dumps(batch)), '')
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+
+'''
+Request Limits Tests
+--------------------
+
+'''
+
+import json
+import unittest
+from io import BytesIO
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    from rpc4django import limits
+except ImproperlyConfigured:
+    # Configure Django if not already configured
+    from django.conf import settings
+    settings.configure(DEBUG=True)
+    from rpc4django import limits
+
+from django.test import RequestFactory
+from rpc4django import views
+from rpc4django.rpcdispatcher import dispatcher
+from rpc4django.limits import RequestTooLarge, check_json_limits, check_request_limits, \
+    read_request_body
+
+try:
+    from xmlrpclib import dumps
+except ImportError:
+    from xmlrpc.client import dumps
+
+
+class ChunkedRequest(object):
+    '''
+    A request without a Content-Length like a chunked request
+    '''
+
+    def __init__(self, body):
+        self.META = {}
+        self.stream = BytesIO(body)
+
+    def read(self, size):
+        return self.stream.read(size)
+
+    @property
+    def body(self):
+        # like HttpRequest.body once the stream is read
+        return self._body
+
+
+class TestReadRequestBody(unittest.TestCase):
+
+    def test_limit(self):
+        request = ChunkedRequest(b'x' * 100)
+        self.assertEqual(read_request_body(request, 100), b'x' * 100)
+        self.assertEqual(request.body, b'x' * 100)
+        self.assertEqual(read_request_body(request, 100), b'x' * 100)
+
+    def test_stops_reading(self):
+        request = ChunkedRequest(b'x' * (limits.READ_CHUNK_SIZE * 4))
+        self.assertRaises(RequestTooLarge, read_request_body, request, 1000)
+        # only one byte past the limit was read
+        self.assertEqual(request.stream.tell(), 1001)
+
+    def test_content_length(self):
+        request = RequestFactory().post('/RPC2', b'x' * 1000, content_type='text/plain')
+        self.assertRaises(RequestTooLarge, read_request_body, request, 999)
+        # the body was never read
+        self.assertEqual(request.body, b'x' * 1000)
+
+
+class TestCheckRequestLimits(unittest.TestCase):
+
+    def parse(self, method, params):
+        return dispatcher.parse_request(json.dumps({'method': method, 'params': params}), 'json')
+
+    def test_calls(self):
+        calls = [{'methodName': 'system.listMethods', 'params': []}] * 3
+        rpc_request = self.parse('system.multicall', [calls])
+        check_request_limits(rpc_request, max_calls=3)
+        self.assertRaises(RequestTooLarge, check_request_limits, rpc_request, max_calls=2)
+
+        batch = [{'method': 'system.listMethods', 'params': [], 'id': i} for i in range(3)]
+        rpc_request = dispatcher.parse_request(json.dumps(batch), 'json')
+        check_request_limits(rpc_request, max_calls=3)
+        self.assertRaises(RequestTooLarge, check_request_limits, rpc_request, max_calls=2)
+
+    def test_depth(self):
+        rpc_request = self.parse('echo', [1, [2, {'a': [3]}]])
+        check_request_limits(rpc_request, max_depth=3)
+        self.assertRaises(RequestTooLarge, check_request_limits, rpc_request, max_depth=2)
+
+        # deeper than the recursion limit
+        deep = []
+        for i in range(10000):
+            deep = [deep]
+        rpc_request.params = [deep]
+        self.assertRaises(RequestTooLarge, check_request_limits, rpc_request, max_depth=100)
+
+    def test_streamed_array(self):
+        rpc_request = self.parse('echo', [])
+        rpc_request.params = (iter([[1], [[2]]]),)
+        check_request_limits(rpc_request, max_depth=2)
+        self.assertRaises(RequestTooLarge, list, rpc_request.params[0])
+
+        rpc_request.params = (iter(['x' * 10]),)
+        check_request_limits(rpc_request, max_string_size=9)
+        self.assertRaises(RequestTooLarge, list, rpc_request.params[0])
+
+    def test_string_size(self):
+        rpc_request = self.parse('echo', [{'key': 'x' * 10}])
+        check_request_limits(rpc_request, max_string_size=10)
+        self.assertRaises(RequestTooLarge, check_request_limits, rpc_request,
+                          max_string_size=9)
+
+        rpc_request = self.parse('echo', [{'x' * 10: 1}])
+        self.assertRaises(RequestTooLarge, check_request_limits, rpc_request,
+                          max_string_size=9)
+
+
+class TestParseLimits(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(setattr, limits, 'MAX_DEPTH', limits.MAX_DEPTH)
+        self.addCleanup(setattr, limits, 'MAX_STRING_SIZE', limits.MAX_STRING_SIZE)
+
+    def test_json(self):
+        body = json.dumps({'method': 'echo', 'params': [[1, {'a': [2]}]], 'id': 1})
+        check_json_limits(body, max_depth=3)
+        self.assertRaises(RequestTooLarge, check_json_limits, body, max_depth=2)
+
+        # brackets in strings are not counted
+        body = json.dumps({'method': 'echo', 'params': ['[[[[', '{{{{'], 'id': 1})
+        check_json_limits(body, max_depth=0)
+
+        body = json.dumps({'method': 'echo', 'params': ['x' * 10, {'y' * 10: 1}], 'id': 1})
+        check_json_limits(body, max_string_size=10)
+        self.assertRaises(RequestTooLarge, check_json_limits, body, max_string_size=9)
+
+        # escaped strings are measured once decoded
+        body = json.dumps({'method': 'echo', 'params': [u'\u00e9' * 10], 'id': 1})
+        check_json_limits(body, max_string_size=10)
+        self.assertRaises(RequestTooLarge, check_json_limits, body, max_string_size=9)
+
+    def test_json_recursion(self):
+        # deeper than the recursion limit of the decoder
+        rpc_request = dispatcher.parse_request(b'[' * 100000, 'json')
+        self.assertNotEqual(rpc_request.error, None)
+
+        limits.MAX_DEPTH = 10
+        self.assertRaises(RequestTooLarge, dispatcher.parse_request, b'[' * 100000, 'json')
+
+    def test_xml(self):
+        limits.MAX_DEPTH = 2
+        xml = dumps(([1, {'a': 2}],), 'echo')
+        self.assertEqual(dispatcher.parse_request(xml, 'xml').params, ([1, {'a': 2}],))
+        xml = dumps(([1, {'a': [2]}],), 'echo')
+        self.assertRaises(RequestTooLarge, dispatcher.parse_request, xml, 'xml')
+
+        limits.MAX_DEPTH = None
+        limits.MAX_STRING_SIZE = 10
+        self.assertEqual(dispatcher.parse_request(dumps(('x' * 10,), 'echo'), 'xml').params,
+                         ('x' * 10,))
+        for params in (('x' * 11,), ({'x' * 11: 1},)):
+            self.assertRaises(RequestTooLarge, dispatcher.parse_request,
+                              dumps(params, 'echo'), 'xml')
+        xml = '<methodCall><methodName>echo</methodName><params><param>' \
+            '<value>%s</value></param></params></methodCall>' % ('x' * 11)
+        self.assertRaises(RequestTooLarge, dispatcher.parse_request, xml, 'xml')
+
+
+class TestServeRPCRequest(unittest.TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.addCleanup(setattr, limits, 'MAX_REQUEST_SIZE', limits.MAX_REQUEST_SIZE)
+        self.addCleanup(setattr, limits, 'MAX_STRING_SIZE', limits.MAX_STRING_SIZE)
+        self.addCleanup(setattr, limits, 'MAX_DEPTH', limits.MAX_DEPTH)
+
+    def test_too_large(self):
+        body = dumps(('x' * 1000,), 'system.methodHelp')
+        limits.MAX_REQUEST_SIZE = len(body) - 1
+        request = self.factory.post('/RPC2', body, content_type='text/xml')
+        response = views.serve_rpc_request(request)
+        self.assertEqual(response.status_code, 413)
+
+        limits.MAX_REQUEST_SIZE = len(body)
+        request = self.factory.post('/RPC2', body, content_type='text/xml')
+        response = views.serve_rpc_request(request)
+        self.assertEqual(response.status_code, 200)
+
+    def test_deeply_nested(self):
+        for content_type in ('text/plain', 'application/json'):
+            request = self.factory.post('/RPC2', '[' * 100000, content_type=content_type)
+            response = views.serve_rpc_request(request)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(json.loads(response.content)['error']['code'], 101)
+
+        limits.MAX_DEPTH = 100
+        request = self.factory.post('/RPC2', '[' * 100000, content_type='application/json')
+        self.assertEqual(views.serve_rpc_request(request).status_code, 413)
+
+        xml = '<methodCall><methodName>echo</methodName><params><param>' + \
+            '<value><array><data>' * 1000
+        request = self.factory.post('/RPC2', xml, content_type='text/xml')
+        self.assertEqual(views.serve_rpc_request(request).status_code, 413)
+
+    def test_string_too_large(self):
+        limits.MAX_STRING_SIZE = 100
+        body = json.dumps({'method': 'system.methodHelp', 'params': ['x' * 101], 'id': 1})
+        request = self.factory.post('/RPC2', body, content_type='text/plain')
+        response = views.serve_rpc_request(request)
+        self.assertEqual(response.status_code, 413)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+'''
+Metrics Tests
+-------------
+
+'''
+
+import json
+import unittest
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    from rpc4django import views
+except ImproperlyConfigured:
+    # Configure Django if not already configured
+    from django.conf import settings
+    settings.configure(DEBUG=True)
+    from rpc4django import views
+
+from django.http import Http404
+from django.test import RequestFactory
+from rpc4django import metrics
+from rpc4django.rpcdispatcher import RPCDispatcher
+
+try:
+    from xmlrpclib import loads, dumps
+except ImportError:
+    from xmlrpc.client import loads, dumps
+
+
+class TestMetricsRegistry(unittest.TestCase):
+
+    def test_histograms(self):
+        registry = metrics.MetricsRegistry(latency_buckets=(0.1, 1.0))
+        registry.observe('execute', 'add', 'json', 0.05)
+        registry.observe('execute', 'add', 'json', 0.5)
+        registry.observe('execute', 'add', 'json', 5)
+        registry.observe('response_bytes', 'add', 'json', 50)
+        registry.increment('errors', 'add', 'json')
+        registry.increment('errors', 'add', 'json')
+
+        self.assertEqual(registry.histograms[('execute', 'add', 'json')], [1, 1, 3, 5.55])
+        self.assertEqual(registry.histograms[('response_bytes', 'add', 'json')][0], 1)
+        self.assertEqual(registry.counters[('errors', 'add', 'json')], 2)
+
+        text = registry.render_prometheus()
+        self.assertTrue('# TYPE rpc4django_errors_total counter\n' in text)
+        self.assertTrue('rpc4django_errors_total{method="add",protocol="json"} 2\n' in text)
+        self.assertTrue('# TYPE rpc4django_execute_seconds histogram\n' in text)
+        self.assertTrue('rpc4django_execute_seconds_bucket{method="add",protocol="json",le="1.0"} 2\n' in text)
+        self.assertTrue('rpc4django_execute_seconds_bucket{method="add",protocol="json",le="+Inf"} 3\n' in text)
+        self.assertTrue('rpc4django_execute_seconds_count{method="add",protocol="json"} 3\n' in text)
+        self.assertTrue('rpc4django_response_bytes_bucket{method="add",protocol="json",le="100"} 1\n' in text)
+
+        registry.reset()
+        self.assertEqual(registry.render_prometheus(), '\n')
+
+    def test_statsd(self):
+        sent = []
+        sink = metrics.StatsdSink(lambda *args: sent.append(args))
+        sink.increment('errors', 'myns.add', 'xml')
+        sink.observe('execute', 'myns.add', 'xml', 0.25)
+        sink.observe('request_bytes', 'myns.add', 'xml', 300)
+        self.assertEqual(sent, [
+            ('rpc4django.xml.myns_add.errors', 1, 'c'),
+            ('rpc4django.xml.myns_add.execute', 250.0, 'ms'),
+            ('rpc4django.xml.myns_add.request_bytes', 300, 'h'),
+        ])
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = metrics.MetricsRegistry()
+        metrics.add_sink(self.registry)
+        self.addCleanup(metrics.remove_sink, self.registry)
+
+        self.d = RPCDispatcher()
+
+        def add(a, b):
+            return a + b
+        self.d.register_method(add)
+
+        class Request:
+            content_type = 'text/xml'
+        self.request = Request
+
+    def test_no_sinks(self):
+        metrics.remove_sink(self.registry)
+        self.d.xmldispatch(dumps((1, 2), 'add').encode('utf-8'))
+        self.assertEqual(self.registry.histograms, {})
+
+    def test_calls(self):
+        self.d.jsondispatch(b'{"method": "add", "params": [1, 2], "id": 1}')
+        self.d.jsondispatch(b'{"method": "add", "params": [1, "a"], "id": 1}')
+        self.d.jsondispatch(b'{"method": "nosuchmethod", "params": [], "id": 1}')
+
+        self.assertEqual(self.registry.histograms[('execute', 'add', 'json')][-2], 2)
+        self.assertEqual(self.registry.histograms[('encode', 'add', 'json')][-2], 1)
+        self.assertEqual(self.registry.counters[('errors', 'add', 'json')], 1)
+        self.assertFalse(('execute', 'nosuchmethod', 'json') in self.registry.histograms)
+
+    def test_multicall(self):
+        calls = [{'methodName': 'add', 'params': (1, 2)}] * 3
+        xml = dumps((calls,), 'system.multicall')
+        out, name = loads(self.d.xmldispatch(xml.encode('utf-8'), request=self.request))
+        self.assertEqual(out[0], [[3], [3], [3]])
+
+        self.assertEqual(self.registry.histograms[('execute', 'add', 'xml')][-2], 3)
+        self.assertEqual(self.registry.histograms[('execute', 'system.multicall', 'xml')][-2], 1)
+
+
+class TestServeMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.registry = metrics.registry
+        metrics.add_sink(self.registry)
+        self.addCleanup(metrics.remove_sink, self.registry)
+        self.addCleanup(self.registry.reset)
+
+    def test_phases(self):
+        body = json.dumps({'method': 'system.methodHelp',
+                           'params': ['system.listMethods'], 'id': 1})
+        request = self.factory.post('/RPC2', body, content_type='application/json')
+        response = views.serve_rpc_request(request)
+        self.assertEqual(response.status_code, 200)
+
+        for name in ('parse', 'permission', 'execute', 'encode', 'request_bytes', 'response_bytes'):
+            self.assertEqual(self.registry.histograms[(name, 'system.methodHelp', 'json')][-2], 1)
+        self.assertEqual(self.registry.histograms[('request_bytes', 'system.methodHelp', 'json')][-1],
+                         len(body))
+
+        body = json.dumps({'method': 'made.up', 'params': [], 'id': 1})
+        request = self.factory.post('/RPC2', body, content_type='application/json')
+        views.serve_rpc_request(request)
+        self.assertTrue(('parse', '<unknown>', 'json') in self.registry.histograms)
+
+        response = views.serve_metrics(self.factory.get('/metrics'))
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        self.assertTrue(b'rpc4django_parse_seconds_count{method="system.methodHelp",protocol="json"} 1\n'
+                        in response.content)
+
+    def test_disabled(self):
+        metrics.remove_sink(self.registry)
+        self.assertRaises(Http404, views.serve_metrics, self.factory.get('/metrics'))
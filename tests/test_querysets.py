@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+'''
+QuerySet Result Tests
+---------------------
+
+'''
+
+import json
+import unittest
+from decimal import Decimal
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    from rpc4django.rpcdispatcher import RPCDispatcher, rpcmethod
+except ImproperlyConfigured:
+    # Configure Django if not already configured
+    from django.conf import settings
+    settings.configure(
+        DEBUG=True,
+        DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+    )
+    from rpc4django.rpcdispatcher import RPCDispatcher, rpcmethod
+
+import django
+from asgiref.sync import async_to_sync
+from django.db import connection, models
+from django.test import RequestFactory
+from django.db.models import F
+from rpc4django import streaming
+from rpc4django.asyncviews import serve_rpc_request_async
+from rpc4django.columnar import format_result
+from rpc4django.streaming import ColumnarResult, is_stream
+
+try:
+    from xmlrpclib import dumps, loads
+except ImportError:
+    from xmlrpc.client import dumps, loads
+
+django.setup()
+
+
+class Item(models.Model):
+    name = models.CharField(max_length=20)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        app_label = 'rpc4django_tests'
+
+
+ITEMS = [{'id': i, 'name': u'item %s' % i, 'price': Decimal('%s.50' % i)}
+         for i in range(1, 26)]
+
+
+def setUpModule():
+    if connection.vendor != 'sqlite':
+        raise unittest.SkipTest('the tests need an SQLite database')
+
+    with connection.schema_editor() as editor:
+        editor.create_model(Item)
+    Item.objects.bulk_create([Item(**item) for item in ITEMS])
+
+
+def tearDownModule():
+    with connection.schema_editor() as editor:
+        editor.delete_model(Item)
+
+
+class TestFormatQuerySet(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(setattr, streaming, 'QUERYSET_CHUNK_SIZE', streaming.QUERYSET_CHUNK_SIZE)
+        streaming.QUERYSET_CHUNK_SIZE = 10
+
+    def test_instances(self):
+        queryset = Item.objects.order_by('id')
+        result = format_result(queryset, None)
+        self.assertTrue(is_stream(result))
+        self.assertEqual(list(result), ITEMS)
+        # the rows were not cached on the queryset
+        self.assertEqual(queryset._result_cache, None)
+
+    def test_values(self):
+        result = format_result(Item.objects.order_by('id').values('name'), None)
+        self.assertEqual(list(result)[0], {'name': u'item 1'})
+
+        result = format_result(Item.objects.order_by('id').values_list('id', flat=True), None)
+        self.assertEqual(list(result), list(range(1, 26)))
+
+    def test_columnar(self):
+        queryset = Item.objects.order_by('id').annotate(double=F('id') * 2)
+        result = format_result(queryset, 'columnar')
+        self.assertTrue(isinstance(result, ColumnarResult))
+        self.assertEqual(result.columns, ['id', 'name', 'price', 'double'])
+        self.assertEqual(next(result.rows), (1, u'item 1', Decimal('1.50'), 2))
+
+        result = format_result(Item.objects.order_by('id').values('price', 'name'), 'columnar')
+        self.assertEqual(result.columns, ['price', 'name'])
+
+        result = format_result(Item.objects.filter(id__lte=2).order_by('id').values('name'),
+                               'column_major')
+        self.assertEqual(result, {'name': [u'item 1', u'item 2']})
+
+
+class TestQuerySetMethods(unittest.TestCase):
+
+    def setUp(self):
+        self.dispatcher = RPCDispatcher(
+            json_encoder='django.core.serializers.json.DjangoJSONEncoder')
+
+        @rpcmethod(name='test.items', dispatcher=self.dispatcher)
+        def items():
+            return Item.objects.order_by('id')
+
+        @rpcmethod(name='test.names', dispatcher=self.dispatcher)
+        def names():
+            return Item.objects.order_by('id').values_list('name', flat=True)
+
+        @rpcmethod(name='test.table', result_format='columnar', dispatcher=self.dispatcher)
+        def table():
+            return Item.objects.order_by('id').values('id', 'name')
+
+    def test_json(self):
+        response = self.dispatcher.jsondispatch(b'{"method": "test.items", "params": [], "id": 1}')
+        self.assertTrue(is_stream(response))
+        result = json.loads(''.join(response))['result']
+        self.assertEqual(result[0], {'id': 1, 'name': u'item 1', 'price': '1.50'})
+        self.assertEqual(len(result), 25)
+
+        response = self.dispatcher.jsondispatch(b'{"method": "test.table", "params": [], "id": 1}')
+        result = json.loads(''.join(response))['result']
+        self.assertEqual(result['columns'], ['id', 'name'])
+        self.assertEqual(result['rows'][-1], [25, u'item 25'])
+
+    def test_xml(self):
+        response = self.dispatcher.xmldispatch(dumps((), 'test.items').encode('utf-8'))
+        self.assertTrue(is_stream(response))
+        result = loads(''.join(response))[0][0]
+        self.assertEqual(result[0]['name'], u'item 1')
+        self.assertEqual(len(result), 25)
+
+        response = self.dispatcher.xmldispatch(dumps((), 'test.names').encode('utf-8'))
+        self.assertEqual(loads(''.join(response))[0][0][:2], [u'item 1', u'item 2'])
+
+
+
+class TestAsyncQuerySetMethods(unittest.TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.dispatcher = RPCDispatcher()
+
+        @rpcmethod(name='test.columns', result_format='column_major',
+                   dispatcher=self.dispatcher)
+        async def columns():
+            return Item.objects.filter(id__lte=2).order_by('id').values('id', 'name')
+
+        @rpcmethod(name='test.table', result_format='columnar', dispatcher=self.dispatcher)
+        async def table():
+            return Item.objects.order_by('id').values('id', 'name')
+
+    def call_json(self, method):
+        body = json.dumps({'method': method, 'params': [], 'id': 1})
+        request = self.factory.post('/RPC2', body, content_type='application/json')
+        response = async_to_sync(serve_rpc_request_async)(request, self.dispatcher)
+        if not response.streaming:
+            return json.loads(response.content)
+
+        async def read():
+            # the rows are read in the thread sensitive executor
+            return b''.join([chunk async for chunk in response])
+        return json.loads(async_to_sync(read)())
+
+    def test_column_major(self):
+        # the QuerySet is evaluated outside of the event loop
+        self.assertEqual(self.call_json('test.columns')['result'],
+                         {'id': [1, 2], 'name': [u'item 1', u'item 2']})
+
+    def test_columnar(self):
+        result = self.call_json('test.table')['result']
+        self.assertEqual(result['columns'], ['id', 'name'])
+        self.assertEqual(len(result['rows']), 25)
+
+
+if __name__ == '__main__':
+    unittest.main()
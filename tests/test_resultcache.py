@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+
+'''
+Result Cache Tests
+------------------
+
+'''
+
+import datetime
+import json
+import time
+import unittest
+from decimal import Decimal
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    from rpc4django.rpcdispatcher import rpcmethod, RPCDispatcher
+except ImproperlyConfigured:
+    # Configure Django if not already configured
+    from django.conf import settings
+    settings.configure(DEBUG=True)
+    from rpc4django.rpcdispatcher import rpcmethod, RPCDispatcher
+
+from rpc4django.resultcache import LocalResultCache, DjangoResultCache, \
+    get_cache_timeout, make_result_key
+
+try:
+    from xmlrpclib import Binary, loads, dumps
+except ImportError:
+    from xmlrpc.client import Binary, loads, dumps
+
+
+class TestResultCaches(unittest.TestCase):
+
+    def test_cache_timeout(self):
+        self.assertEqual(get_cache_timeout(True), 300)
+        self.assertEqual(get_cache_timeout(60), 60)
+        self.assertEqual(get_cache_timeout(False), None)
+        self.assertEqual(get_cache_timeout(None), None)
+
+    def test_result_key(self):
+        self.assertEqual(make_result_key('json', ({'a': 1, 'b': 2},)),
+                         make_result_key('json', ({'b': 2, 'a': 1},)))
+        self.assertNotEqual(make_result_key('json', (1,)),
+                            make_result_key('xml', (1,)))
+        self.assertNotEqual(make_result_key('json', (1,), 1),
+                            make_result_key('json', (1,), 2))
+
+        # values of other types do not share the key of their text
+        date = datetime.datetime(2020, 2, 20, 12, 30)
+        self.assertNotEqual(make_result_key('xml', (date,)),
+                            make_result_key('xml', (str(date),)))
+        self.assertEqual(make_result_key('xml', (date,)),
+                         make_result_key('xml', (datetime.datetime(2020, 2, 20, 12, 30),)))
+        self.assertNotEqual(make_result_key('xml', (Binary(b'abc'),)),
+                            make_result_key('xml', (u'abc',)))
+        self.assertNotEqual(make_result_key('xml', ([Decimal('1.5')],)),
+                            make_result_key('xml', ([u'1.5'],)))
+
+    def check_cache(self, cache):
+        cache.set('a', 'k1', 'value1', None)
+        cache.set('a', 'k2', 'value2', None)
+        cache.set('b', 'k1', 'value3', None)
+        self.assertEqual(cache.get('a', 'k1'), 'value1')
+        self.assertEqual(cache.get('b', 'k1'), 'value3')
+
+        cache.invalidate('a')
+        self.assertEqual(cache.get('a', 'k1'), None)
+        self.assertEqual(cache.get('a', 'k2'), None)
+        self.assertEqual(cache.get('b', 'k1'), 'value3')
+
+        cache.set('a', 'k1', 'value1', None)
+        cache.invalidate()
+        self.assertEqual(cache.get('a', 'k1'), None)
+        self.assertEqual(cache.get('b', 'k1'), None)
+
+    def test_local(self):
+        self.check_cache(LocalResultCache())
+
+    def test_local_lru(self):
+        cache = LocalResultCache(max_size=2)
+        cache.set('a', 'k1', 'value1', None)
+        cache.set('a', 'k2', 'value2', None)
+        cache.get('a', 'k1')
+        cache.set('a', 'k3', 'value3', None)
+        self.assertEqual(cache.get('a', 'k1'), 'value1')
+        self.assertEqual(cache.get('a', 'k2'), None)
+        self.assertEqual(cache.get('a', 'k3'), 'value3')
+
+        cache.set('a', 'k4', 'value4', 0.01)
+        time.sleep(0.02)
+        self.assertEqual(cache.get('a', 'k4'), None)
+
+    def test_django(self):
+        self.check_cache(DjangoResultCache())
+
+
+class TestCachedMethods(unittest.TestCase):
+
+    def setUp(self):
+        self.d = RPCDispatcher(result_cache=LocalResultCache())
+        self.calls = []
+
+        def lookup(code):
+            self.calls.append(code)
+            if code == 'bad':
+                raise Exception('unknown code')
+            return {'code': code, 'calls': len(self.calls)}
+        lookup.cache = 60
+        self.d.register_method(lookup)
+
+    def call_json(self, params, rpcid=1, **kwargs):
+        call = {'method': 'lookup', 'params': params, 'id': rpcid}
+        rpc_request = self.d.parse_request(json.dumps(call).encode('utf-8'), 'json')
+        return json.loads(self.d.dispatch_request(rpc_request, **kwargs))
+
+    def test_cached(self):
+        self.assertEqual(self.call_json(['a'])['result'], {'code': 'a', 'calls': 1})
+        resp = self.call_json(['a'], 'other id')
+        self.assertEqual(resp['id'], 'other id')
+        self.assertEqual(resp['result'], {'code': 'a', 'calls': 1})
+        self.assertEqual(self.call_json(['b'])['result'], {'code': 'b', 'calls': 2})
+
+        # each protocol has its own encoded results
+        xml = dumps(('a',), 'lookup')
+        out, name = loads(self.d.dispatch_request(self.d.parse_request(xml.encode('utf-8'))))
+        self.assertEqual(out[0], {'code': 'a', 'calls': 3})
+        out, name = loads(self.d.dispatch_request(self.d.parse_request(xml.encode('utf-8'))))
+        self.assertEqual(out[0], {'code': 'a', 'calls': 3})
+
+        self.d.invalidate_cached_results('lookup')
+        self.assertEqual(self.call_json(['a'])['result'], {'code': 'a', 'calls': 4})
+
+    def test_shared_cache(self):
+        other = RPCDispatcher(result_cache=self.d.result_cache)
+        self.assertNotEqual(other.name, self.d.name)
+
+        def lookup(code):
+            return 'other'
+        lookup.cache = 60
+        other.register_method(lookup)
+
+        self.assertEqual(self.call_json(['a'])['result'], {'code': 'a', 'calls': 1})
+        # the dispatchers do not read each other's results
+        call = json.dumps({'method': 'lookup', 'params': ['a'], 'id': 1}).encode('utf-8')
+        self.assertEqual(json.loads(other.jsondispatch(call))['result'], 'other')
+        self.assertEqual(self.call_json(['a'])['result'], {'code': 'a', 'calls': 1})
+
+        other.invalidate_cached_results('lookup')
+        self.assertEqual(self.call_json(['a'])['result'], {'code': 'a', 'calls': 1})
+
+    def test_typed_params(self):
+        def call_xml(code):
+            xml = dumps((code,), 'lookup').encode('utf-8')
+            out, name = loads(self.d.dispatch_request(self.d.parse_request(xml)))
+            return out[0]['calls']
+
+        # a base64 param does not get the result cached for the same text
+        self.assertEqual(call_xml(u'abc'), 1)
+        self.assertEqual(call_xml(Binary(b'abc')), 2)
+        self.assertEqual(call_xml(Binary(b'abc')), 2)
+        self.assertEqual(call_xml(u'abc'), 1)
+
+    def test_errors_not_cached(self):
+        self.assertTrue('error' in self.call_json(['bad']))
+        self.assertTrue('error' in self.call_json(['bad']))
+        self.assertEqual(self.calls, ['bad', 'bad'])
+
+    def test_per_user(self):
+        self.d.rpcmethods['lookup'].cache_per_user = True
+
+        class User:
+            def __init__(self, pk):
+                self.pk = pk
+
+        class Request:
+            def __init__(self, user):
+                self.user = user
+
+        resp = self.call_json(['a'], request=Request(User(1)))
+        self.assertEqual(resp['result']['calls'], 1)
+        resp = self.call_json(['a'], request=Request(User(2)))
+        self.assertEqual(resp['result']['calls'], 2)
+        resp = self.call_json(['a'], request=Request(User(1)))
+        self.assertEqual(resp['result']['calls'], 1)
+
+    def test_decorator(self):
+        @rpcmethod(name='test.cachedmethod', cache=True, cache_per_user=True)
+        def cachedmethod():
+            return 1
+
+        self.assertEqual(cachedmethod.cache, True)
+        self.assertEqual(cachedmethod.cache_per_user, True)
+        self.d.register_method(cachedmethod)
+        self.assertEqual(self.d.rpcmethods['test.cachedmethod'].cache, 300)
+        self.assertEqual(self.d.rpcmethods['test.cachedmethod'].cache_per_user, True)
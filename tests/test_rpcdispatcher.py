@@ -13,12 +13,16 @@ from xml.dom.minidom import parseString
 from django.core.exceptions import ImproperlyConfigured
 
 try:
-    from rpc4django.rpcdispatcher import rpcmethod, RPCMethod, RPCDispatcher
+    from rpc4django.rpcdispatcher import rpcmethod, RPCMethod, RPCDispatcher, \
+        sniff_request_format
 except ImproperlyConfigured:
     # Configure Django if not already configured
     from django.conf import settings
     settings.configure(DEBUG=True)
-    from rpc4django.rpcdispatcher import rpcmethod, RPCMethod, RPCDispatcher
+    from rpc4django.rpcdispatcher import rpcmethod, RPCMethod, RPCDispatcher, \
+        sniff_request_format
+from rpc4django import rpcdispatcher
+from rpc4django.callplan import InvalidParamsError
 
 try:
     from xmlrpclib import Fault, Binary, loads, dumps
@@ -64,6 +68,83 @@ class TestRPCMethod(unittest.TestCase):
         self.assertEqual(self.test1.get_returnvalue(), 'object')
         self.assertEqual(self.test2.get_returnvalue(), 'object')
 
+    def test_call_plan(self):
+        def withrequest(request, a, b=2, **kwargs):
+            return a + b
+        plan = RPCMethod(withrequest).call_plan
+        self.assertTrue(plan.takes_request)
+        self.assertTrue(plan.accepts_kwargs)
+        self.assertFalse(plan.accepts_varargs)
+        self.assertEqual(plan.args, ('a', 'b'))
+        self.assertEqual(plan.defaults, (2,))
+        self.assertEqual((plan.min_args, plan.max_args), (1, 2))
+
+        kwargs = {'request': 'req', 'c': 3}
+        params, newkwargs = plan.bind((1,), kwargs)
+        self.assertEqual(params, ('req', 1))
+        self.assertEqual(newkwargs, {'c': 3})
+        self.assertEqual(kwargs, {'request': 'req', 'c': 3})
+
+        plan = self.add.call_plan
+        self.assertFalse(plan.takes_request)
+        self.assertFalse(plan.accepts_kwargs)
+        self.assertEqual(plan.args, ('a', 'b'))
+
+    def test_builtin(self):
+        d = RPCDispatcher()
+        d.register_method(len, 'len')
+        # max cannot be inspected
+        d.register_method(max, 'max')
+        for method, params, result in (('len', [[1, 2, 3]], 3), ('max', [1, 5, 2], 5)):
+            call = json.dumps({'method': method, 'params': params, 'id': 1})
+            resp = json.loads(d.jsondispatch(call.encode('utf-8'), request='req'))
+            self.assertEqual(resp['result'], result)
+
+    def test_bind(self):
+        def withrequest(request, a, b=2, **kwargs):
+            return a + b
+        plan = RPCMethod(withrequest).call_plan
+        self.assertEqual(plan.bind((1,), {'request': 'req', 'c': 3}),
+                         (('req', 1), {'c': 3}))
+        self.assertRaises(InvalidParamsError, plan.bind, (), {'request': 'req'})
+        self.assertRaises(InvalidParamsError, plan.bind, (1, 2, 3), {'request': 'req'})
+
+        # keyword arguments the method does not take are dropped
+        plan = self.add.call_plan
+        self.assertEqual(plan.bind((1, 2), {'request': 'req'}), ((1, 2), {}))
+        self.assertEqual(plan.bind((1,), {'b': 2}), ((1,), {'b': 2}))
+        self.assertRaises(InvalidParamsError, plan.bind, (1,), {})
+        self.assertRaises(InvalidParamsError, plan.bind, (1, 2, 3), {})
+        try:
+            plan.bind((1,), {})
+        except InvalidParamsError as e:
+            self.assertEqual(e.code, -32602)
+
+    def test_lazy_inspection(self):
+        inspected = []
+
+        class CountingRPCMethod(RPCMethod):
+            def inspect(self):
+                inspected.append(self.name)
+                RPCMethod.inspect(self)
+
+        def lazy(a, b):
+            '''Lazily inspected'''
+            return a + b
+        lazy.permission = 'auth.add_group'
+
+        meth = CountingRPCMethod(lazy)
+        self.assertEqual(meth.name, 'lazy')
+        self.assertEqual(meth.permission, 'auth.add_group')
+        self.assertTrue(meth.login_required)
+        self.assertEqual(inspected, [])
+
+        self.assertEqual(meth.help, 'Lazily inspected')
+        self.assertEqual(meth.args, ['a', 'b'])
+        self.assertEqual(meth.call_plan.args, ('a', 'b'))
+        self.assertEqual(inspected, ['lazy'])
+        self.assertRaises(AttributeError, getattr, meth, 'nosuchattribute')
+
     def test_get_params(self):
         self.assertEqual(self.add.get_params(), [{'name': 'a', 'rpctype': 'int'}, {'name': 'b', 'rpctype': 'int'}])
         self.assertEqual(self.test1.get_params(), [{'name': 'arg1', 'rpctype': 'object'}])
@@ -155,6 +236,120 @@ class TestRPCDispatcher(unittest.TestCase):
         self.assertEqual(jsondict['id'], 1)
         self.assertTrue(isinstance(jsondict['result'], list))
 
+    def test_parse_request(self):
+        jsontxt = '{"params":[1,2],"method":"add","id":7}'
+        rpc_request = self.d.parse_request(jsontxt.encode('utf-8'))
+        self.assertEqual(rpc_request.request_format, 'json')
+        self.assertEqual(rpc_request.method, 'add')
+        self.assertEqual(rpc_request.params, (1, 2))
+        self.assertEqual(rpc_request.id, 7)
+
+        xml = dumps((1, 2), 'add')
+        rpc_request = self.d.parse_request(xml.encode('utf-8'))
+        self.assertEqual(rpc_request.request_format, 'xml')
+        self.assertEqual(rpc_request.method, 'add')
+        self.assertEqual(rpc_request.params, (1, 2))
+        self.assertEqual(self.d.get_method_name(xml.encode('utf-8')), 'add')
+
+        self.d.register_method(self.add)
+        out, name = loads(self.d.dispatch_request(rpc_request))
+        self.assertEqual(out[0], 3)
+
+    def test_cached_introspection(self):
+        calls = []
+        original = self.d.system_listmethods
+
+        def counting_listmethods():
+            calls.append(1)
+            return original()
+        self.d.rpcmethods['system.listMethods'].method = counting_listmethods
+        self.d.jsonrpcdispatcher.funcs['system.listMethods'] = counting_listmethods
+        # only the dispatcher's own methods are cached
+        resp = self.d.jsondispatch(b'{"params":[],"method":"system.listMethods","id":1}')
+        self.assertEqual(len(calls), 1)
+        self.d.jsondispatch(b'{"params":[],"method":"system.listMethods","id":1}')
+        self.assertEqual(len(calls), 2)
+
+        jsontxt = '{"params":[],"method":"system.methodSignature","id":%s}'
+        rpc_request = self.d.parse_request((jsontxt % 1).encode('utf-8'))
+        resp = json.loads(self.d.dispatch_request(rpc_request))
+        self.assertEqual(resp['id'], 1)
+        self.assertTrue('error' in resp)
+        self.assertEqual(rpc_request.etag, None)
+
+        jsontxt = '{"params":["system.listMethods"],"method":"system.methodSignature","id":%s}'
+        rpc_request = self.d.parse_request((jsontxt % 1).encode('utf-8'))
+        resp = json.loads(self.d.dispatch_request(rpc_request))
+        self.assertEqual(resp, {'jsonrpc': '2.0', 'id': 1, 'result': ['array']})
+        etag = rpc_request.etag
+        self.assertTrue(etag)
+
+        # the encoded result is reused with the new id
+        rpc_request = self.d.parse_request((jsontxt % '"abc"').encode('utf-8'))
+        resp = json.loads(self.d.dispatch_request(rpc_request))
+        self.assertEqual(resp['id'], 'abc')
+        self.assertEqual(resp['result'], ['array'])
+        # the ETag is of the response which contains the id
+        self.assertNotEqual(rpc_request.etag, etag)
+
+        xml = dumps(('system.listMethods',), 'system.methodSignature')
+        rpc_request = self.d.parse_request(xml.encode('utf-8'))
+        out, name = loads(self.d.dispatch_request(rpc_request))
+        self.assertEqual(out[0], ['array'])
+        self.assertTrue(rpc_request.etag)
+
+        # registering a method clears the cache
+        class Request:
+            path = '/RPC2'
+        describe = self.d.parse_request(dumps((), 'system.describe').encode('utf-8'))
+        out, name = loads(self.d.dispatch_request(describe, request=Request()))
+        self.assertEqual(len(out[0]['methods']), 5)
+        etag = describe.etag
+        self.d.register_method(self.add)
+        describe = self.d.parse_request(dumps((), 'system.describe').encode('utf-8'))
+        out, name = loads(self.d.dispatch_request(describe, request=Request()))
+        self.assertEqual(len(out[0]['methods']), 6)
+        self.assertNotEqual(describe.etag, etag)
+
+    def test_sniff_request_format(self):
+        self.assertEqual(sniff_request_format(b'<?xml version="1.0"?>'), 'xml')
+        self.assertEqual(sniff_request_format(b'\xef\xbb\xbf \r\n\t<methodCall>'), 'xml')
+        self.assertEqual(sniff_request_format(b'{"method": "add"}'), 'json')
+        self.assertEqual(sniff_request_format(b'\n [{"method": "add"}]'), 'json')
+        self.assertEqual(sniff_request_format(u'  {"method": "は"}'), 'json')
+        self.assertEqual(sniff_request_format(b'method=add'), None)
+        self.assertEqual(sniff_request_format(b'  '), None)
+
+    def test_register_method_lazily(self):
+        self.d.register_method(self.add)
+        meth = self.d.rpcmethods['add']
+        self.assertFalse('help' in meth.__dict__)
+        self.assertFalse('call_plan' in meth.__dict__)
+
+        resp = json.loads(self.d.jsondispatch(b'{"params":[1,2],"method":"add","id":1}'))
+        self.assertEqual(resp['result'], 3)
+        # both protocols use the call plan of the RPCMethod
+        self.assertTrue('call_plan' in meth.__dict__)
+        self.assertTrue(self.d.jsonrpcdispatcher.get_call_plan('add') is meth.call_plan)
+        self.assertTrue(self.d.xmlrpcdispatcher.get_call_plan('add') is meth.call_plan)
+
+    def test_inspect_sets_attributes_together(self):
+        self.d.register_method(self.add)
+        meth = self.d.rpcmethods['add']
+        set_during_inspection = []
+        original_build_call_plan = rpcdispatcher.build_call_plan
+
+        def build_call_plan(*args):
+            # another thread reading the method now must not see a partial result
+            set_during_inspection.extend(attr for attr in ('help', 'args', 'signature')
+                                         if attr in meth.__dict__)
+            return original_build_call_plan(*args)
+
+        rpcdispatcher.build_call_plan = build_call_plan
+        self.addCleanup(setattr, rpcdispatcher, 'build_call_plan', original_build_call_plan)
+        self.assertEqual(meth.signature, ['object', 'object', 'object'])
+        self.assertEqual(set_during_inspection, [])
+
     def test_register_method(self):
         self.d.register_method(self.add)
 
@@ -201,7 +396,91 @@ class TestRPCDispatcher(unittest.TestCase):
         jsondict = json.loads(resp)
         self.assertEqual(jsondict['result'][0], 3)
         self.assertEqual(jsondict['result'][1], 5)
-        
-        
+
+
+    def test_concurrent_multicall(self):
+        import time
+
+        def slow(seconds):
+            time.sleep(seconds)
+            return seconds
+        slow.concurrent = True
+        self.d.register_method(slow)
+        self.d.register_method(self.add)
+
+        class Request:
+            content_type = 'text/xml'
+
+        calls = [
+            {'methodName': 'slow', 'params': [0.2]},
+            {'methodName': 'add', 'params': [1, 2]},
+            {'methodName': 'slow', 'params': [0.01]},
+            {'methodName': 'add', 'params': [1]},
+        ]
+        result = self.d.system_multicall(calls, request=Request)
+        self.assertEqual(result[:3], [(0.2,), (3,), (0.01,)])
+        self.assertEqual(len(result[3]), 1)
+
+        self.d.multicall_timeout = 0.05
+        result = self.d.system_multicall(calls, request=Request)
+        self.assertEqual(result[0], ('method "slow" timed out',))
+        self.assertEqual(result[1:3], [(3,), (0.01,)])
+
+        self.d.concurrent_multicall = True
+        self.d.multicall_timeout = None
+        result = self.d.system_multicall(calls, request=Request)
+        self.assertEqual(result[:3], [(0.2,), (3,), (0.01,)])
+
+    def test_multicall_timeout_frees_pool(self):
+        import threading
+
+        d = RPCDispatcher(concurrent_multicall=True, multicall_timeout=0.05, max_workers=2)
+        released = threading.Event()
+        self.addCleanup(released.set)
+
+        def block():
+            released.wait(5)
+        d.register_method(block)
+        d.register_method(self.add)
+
+        class Request:
+            content_type = 'text/xml'
+
+        calls = [{'methodName': 'block', 'params': []}] * 2
+        result = d.system_multicall(calls, request=Request)
+        self.assertEqual(result, [('method "block" timed out',)] * 2)
+        self.assertEqual(d.worker_pool.free_workers, 0)
+
+        # the blocked workers do not hold up the next multicall
+        calls = [{'methodName': 'add', 'params': [1, 2]}] * 2
+        self.assertEqual(d.system_multicall(calls, request=Request), [(3,), (3,)])
+
+        released.set()
+        for future in list(d.worker_pool._abandoned):
+            future.result()
+        self.assertEqual(d.worker_pool.free_workers, 2)
+
+    def test_multicall_timeout_per_call(self):
+        import time
+
+        d = RPCDispatcher(concurrent_multicall=True, multicall_timeout=0.1, max_workers=2)
+
+        def slow(seconds):
+            time.sleep(seconds)
+            return seconds
+        d.register_method(slow)
+        d.register_method(self.add)
+
+        class Request:
+            content_type = 'text/xml'
+
+        # the short calls are queued behind the slow calls but their
+        # timeout only starts when they are run
+        calls = [{'methodName': 'slow', 'params': [0.3]}] * 2 + \
+            [{'methodName': 'slow', 'params': [0.01]}] * 2
+        result = d.system_multicall(calls, request=Request)
+        self.assertEqual(result, [('method "slow" timed out',)] * 2 + [(0.01,)] * 2)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,454 @@
+# -*- coding: utf-8 -*-
+
+'''
+Views Tests
+-----------
+
+'''
+
+import json
+import unittest
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    from rpc4django import views
+except ImproperlyConfigured:
+    # Configure Django if not already configured
+    from django.conf import settings
+    settings.configure(DEBUG=True)
+    from rpc4django import views
+
+from django.http import Http404
+from django.test import RequestFactory
+from rpc4django import limits, xmlrpcparser
+from rpc4django.rpcdispatcher import RPCDispatcher, rpcmethod
+
+try:
+    from xmlrpclib import loads, dumps
+except ImportError:
+    from xmlrpc.client import loads, dumps
+
+
+class TestServeRPCRequest(unittest.TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.parses = []
+
+        dispatcher = views.dispatcher
+        original_parse = dispatcher.parse_request
+
+        def counting_parse(raw_post_data, request_format=None):
+            self.parses.append(request_format)
+            return original_parse(raw_post_data, request_format)
+
+        dispatcher.parse_request = counting_parse
+        self.addCleanup(delattr, dispatcher, 'parse_request')
+
+    def test_json_parsed_once(self):
+        body = json.dumps({'method': 'system.listMethods', 'params': [], 'id': 1})
+        request = self.factory.post('/RPC2', body, content_type='text/plain')
+        response = views.serve_rpc_request(request)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        jsondict = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(jsondict['id'], 1)
+        self.assertTrue('system.multicall' in jsondict['result'])
+        self.assertEqual(len(self.parses), 1)
+
+    def test_xml_parsed_once(self):
+        body = dumps((), 'system.listMethods')
+        request = self.factory.post('/RPC2', body, content_type='text/xml')
+        response = views.serve_rpc_request(request)
+        self.assertEqual(response['Content-Type'], 'text/xml')
+        out, name = loads(response.content)
+        self.assertTrue('system.multicall' in out[0])
+        self.assertEqual(len(self.parses), 1)
+
+    def test_streaming_response(self):
+        def streamrows(count):
+            return iter(range(count))
+        views.dispatcher.register_method(streamrows, 'test.streamrows')
+
+        body = json.dumps({'method': 'test.streamrows', 'params': [100], 'id': 1})
+        request = self.factory.post('/RPC2', body, content_type='application/json')
+        response = views.serve_rpc_request(request)
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertEqual(json.loads(content)['result'], list(range(100)))
+
+    def test_sniffed_json(self):
+        body = json.dumps({'method': 'system.listMethods', 'params': [], 'id': 1})
+        request = self.factory.post('/RPC2', body, content_type='text/plain')
+        self.assertFalse(views.is_xmlrpc_request(request))
+        self.assertFalse(views.is_xmlrpc_request(request))
+        self.assertEqual(len(self.parses), 0)
+
+        # unrecognizable data is answered as JSONRPC
+        request = self.factory.post('/RPC2', 'garbage', content_type='text/plain')
+        self.assertFalse(views.is_xmlrpc_request(request))
+        response = views.serve_rpc_request(request)
+        jsondict = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(jsondict['error']['message'], 'JSON decoding error')
+
+    def test_introspection_etag(self):
+        body = dumps((), 'system.listMethods')
+        request = self.factory.post('/RPC2', body, content_type='text/xml')
+        response = views.serve_rpc_request(request)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        # a POST is always answered in full
+        request = self.factory.post('/RPC2', body, content_type='text/xml',
+                                    HTTP_IF_NONE_MATCH=etag)
+        response = views.serve_rpc_request(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], etag)
+        out, name = loads(response.content)
+        self.assertTrue('system.listMethods' in out[0])
+
+        def call_json(rpcid):
+            body = json.dumps({'method': 'system.listMethods', 'params': [], 'id': rpcid})
+            request = self.factory.post('/RPC2', body, content_type='application/json',
+                                        HTTP_IF_NONE_MATCH=etag)
+            response = views.serve_rpc_request(request)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(json.loads(response.content)['id'], rpcid)
+            return response['ETag']
+
+        # the ETag is of the response sent which contains the id
+        self.assertNotEqual(call_json(1), etag)
+        self.assertEqual(call_json(1), call_json(1))
+        self.assertNotEqual(call_json(1), call_json(2))
+
+    def test_sniffed_xml(self):
+        body = dumps((), 'system.listMethods')
+        request = self.factory.post('/RPC2', body, content_type='text/plain')
+        self.assertTrue(views.is_xmlrpc_request(request))
+        # the format was detected without parsing the body
+        self.assertEqual(len(self.parses), 0)
+        self.assertEqual(request._rpc4django_format, ('text/plain', 'xml'))
+        response = views.serve_rpc_request(request)
+        out, name = loads(response.content)
+        self.assertTrue('system.multicall' in out[0])
+        self.assertEqual(len(self.parses), 1)
+
+
+class TestMethodSummary(unittest.TestCase):
+
+    def setUp(self):
+        import os
+        import django
+        from django.test.utils import override_settings
+
+        django.setup()
+        template_dir = os.path.join(os.path.dirname(views.__file__), 'templates')
+        settings_override = override_settings(TEMPLATES=[{
+            'BACKEND': 'django.template.backends.django.DjangoTemplates',
+            'DIRS': [template_dir],
+            'OPTIONS': {'libraries': {'rpctags': 'rpc4django.templatetags.rpctags'}},
+        }])
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.factory = RequestFactory()
+
+    def test_cached_page(self):
+        rendered = []
+        render_method_summary = views.render_method_summary
+
+        def counting_render(request, rpc_dispatcher=None):
+            rendered.append(request)
+            return render_method_summary(request, rpc_dispatcher)
+        views.render_method_summary = counting_render
+        self.addCleanup(setattr, views, 'render_method_summary', render_method_summary)
+
+        response = views.serve_rpc_request(self.factory.get('/RPC2'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b'system.listMethods' in response.content)
+        etag = response['ETag']
+        last_modified = response['Last-Modified']
+
+        response = views.serve_rpc_request(self.factory.get('/RPC2'))
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(len(rendered), 1)
+
+        response = views.serve_rpc_request(self.factory.get('/RPC2', HTTP_IF_NONE_MATCH=etag))
+        self.assertEqual(response.status_code, 304)
+        response = views.serve_rpc_request(self.factory.get('/RPC2', HTTP_IF_MODIFIED_SINCE=last_modified))
+        self.assertEqual(response.status_code, 304)
+        response = views.serve_rpc_request(self.factory.get('/RPC2', HTTP_IF_NONE_MATCH='"other"'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(rendered), 1)
+
+        # registering a method changes the page
+        def summarytest():
+            '''**reST** docstring'''
+        views.dispatcher.register_method(summarytest, 'test.summarytest')
+        response = views.serve_rpc_request(self.factory.get('/RPC2', HTTP_IF_NONE_MATCH=etag))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertTrue(b'<strong>reST</strong>' in response.content)
+        self.assertEqual(len(rendered), 2)
+
+    def test_rest_cache_cleared(self):
+        from rpc4django.templatetags import rpctags
+
+        class ClearedCache(dict):
+            # as if another thread cleared the cache straight after each store
+            def __setitem__(self, key, value):
+                pass
+
+        self.addCleanup(setattr, rpctags, '_rest_cache', rpctags._rest_cache)
+        rpctags._rest_cache = ClearedCache()
+        self.assertTrue('<strong>reST</strong>' in rpctags.resttext('**reST** text'))
+
+
+class TestLogging(unittest.TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        for name in ('LOG_MAX_SIZE', 'LOG_SAMPLE_RATE', 'LOG_INCLUDE_METHODS', 'LOG_EXCLUDE_METHODS'):
+            self.addCleanup(setattr, views, name, getattr(views, name))
+
+    def call(self, method='system.listMethods'):
+        body = json.dumps({'method': method, 'params': [], 'id': 1})
+        request = self.factory.post('/RPC2', body, content_type='application/json')
+        views.serve_rpc_request(request)
+
+    def logged_calls(self, count=1, method='system.listMethods'):
+        import logging
+        with self.assertLogs('rpc4django', logging.DEBUG) as logs:
+            logging.getLogger('rpc4django').debug('marker')
+            for i in range(count):
+                self.call(method)
+        return len([line for line in logs.output if 'Incoming request' in line])
+
+    def test_log_text(self):
+        views.LOG_MAX_SIZE = 5
+        self.assertEqual(str(views.LogText(b'abcdefgh')), 'abcde... (3 more)')
+        self.assertEqual(str(views.LogText(u'はじめまして'.encode('utf-8'))), u'は... (13 more)')
+        self.assertEqual(str(views.LogText(b'\xff')), '<could not decode request body with utf-8>')
+        views.LOG_MAX_SIZE = None
+        self.assertEqual(str(views.LogText('abcdefgh')), 'abcdefgh')
+
+    def test_lazy(self):
+        formatted = []
+
+        class Spy(views.LogText):
+            def __str__(self):
+                formatted.append(self.value)
+                return ''
+
+        import logging
+        rpclogger = logging.getLogger('rpc4django')
+        self.addCleanup(rpclogger.setLevel, rpclogger.level)
+        self.addCleanup(setattr, views, 'LogText', views.LogText)
+        views.LogText = Spy
+        rpclogger.setLevel(logging.INFO)
+        self.call()
+        self.assertEqual(formatted, [])
+
+    def test_filters(self):
+        self.assertEqual(self.logged_calls(), 1)
+
+        views.LOG_SAMPLE_RATE = 3
+        self.assertEqual(self.logged_calls(9), 3)
+        views.LOG_SAMPLE_RATE = 1
+
+        views.LOG_INCLUDE_METHODS = ['system.methodHelp']
+        self.assertEqual(self.logged_calls(), 0)
+        self.assertEqual(self.logged_calls(method='system.methodHelp'), 1)
+        views.LOG_INCLUDE_METHODS = None
+
+        views.LOG_EXCLUDE_METHODS = ['system.listMethods']
+        self.assertEqual(self.logged_calls(), 0)
+        self.assertEqual(self.logged_calls(method='system.methodHelp'), 1)
+
+
+class FakeUser(object):
+    pk = 1
+    is_anonymous = False
+
+    def __init__(self, perms):
+        self.perms = perms
+        self.checks = []
+
+    def has_perm(self, perm):
+        self.checks.append(perm)
+        return perm in self.perms
+
+
+class TestCheckRequestPermission(unittest.TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+        def protected():
+            return True
+        protected.permission = 'auth.add_group'
+        views.dispatcher.register_method(protected, 'test.protected')
+
+        def loggedin():
+            return True
+        loggedin.login_required = True
+        views.dispatcher.register_method(loggedin, 'test.loggedin')
+
+    def make_request(self, method, user):
+        body = json.dumps({'method': method, 'params': [], 'id': 1})
+        request = self.factory.post('/RPC2', body, content_type='application/json')
+        request.user = user
+        return request
+
+    def test_permission(self):
+        user = FakeUser(['auth.add_group'])
+        self.assertTrue(views.check_request_permission(self.make_request('test.protected', user), 'json'))
+        self.assertFalse(views.check_request_permission(self.make_request('test.protected', FakeUser([])), 'json'))
+        self.assertFalse(views.check_request_permission(self.make_request('test.protected', None), 'json'))
+
+        # unknown and unprotected methods are allowed
+        self.assertTrue(views.check_request_permission(self.make_request('test.unknown', None), 'json'))
+        self.assertTrue(views.check_request_permission(self.make_request(['not', 'hashable'], None), 'json'))
+        self.assertTrue(views.check_request_permission(self.make_request('system.listMethods', None), 'json'))
+
+    def test_batch_permission(self):
+        body = json.dumps([
+            {'method': 'system.listMethods', 'params': [], 'id': 1},
+            {'method': 'test.protected', 'params': [], 'id': 2},
+        ])
+        request = self.factory.post('/RPC2', body, content_type='application/json')
+        request.user = FakeUser([])
+        self.assertFalse(views.check_request_permission(request, 'json'))
+        self.assertEqual(views.serve_rpc_request(request).status_code, 403)
+
+        request = self.factory.post('/RPC2', body, content_type='application/json')
+        request.user = FakeUser(['auth.add_group'])
+        response = views.serve_rpc_request(request)
+        self.assertEqual(len(json.loads(response.content.decode('utf-8'))), 2)
+
+    def test_login_required(self):
+        user = FakeUser([])
+        self.assertTrue(views.check_request_permission(self.make_request('test.loggedin', user), 'json'))
+        user.is_anonymous = True
+        self.assertFalse(views.check_request_permission(self.make_request('test.loggedin', user), 'json'))
+
+    def test_permission_cache(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.addCleanup(setattr, views, 'PERMISSION_CACHE_TIMEOUT', views.PERMISSION_CACHE_TIMEOUT)
+        views.PERMISSION_CACHE_TIMEOUT = 60
+
+        user = FakeUser(['auth.add_group'])
+        for i in range(3):
+            self.assertTrue(views.check_request_permission(self.make_request('test.protected', user), 'json'))
+        self.assertEqual(user.checks, ['auth.add_group'])
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+class TestMultipleDispatchers(unittest.TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.admin = RPCDispatcher(restrict_introspection=True,
+                                   restrict_xmlrpc=True,
+                                   restrict_method_summary=True,
+                                   json_compact=True,
+                                   max_workers=2)
+
+        @rpcmethod(name='admin.purge', permission='auth.delete_group',
+                   dispatcher=self.admin)
+        def purge():
+            return 'purged'
+
+    def post(self, body, content_type, rpc_dispatcher=None, user=None):
+        request = self.factory.post('/admin/RPC2', body, content_type=content_type)
+        if user is not None:
+            request.user = user
+        return views.serve_rpc_request(request, rpc_dispatcher)
+
+    def test_separate_methods(self):
+        self.assertTrue('admin.purge' in self.admin.rpcmethods)
+        self.assertFalse('admin.purge' in views.dispatcher.rpcmethods)
+        self.assertFalse('system.listMethods' in self.admin.rpcmethods)
+        self.assertNotEqual(self.admin.worker_pool, None)
+        self.assertEqual(self.admin.jsonrpcdispatcher.worker_pool, self.admin.worker_pool)
+
+        body = json.dumps({'method': 'admin.purge', 'params': [], 'id': 1})
+        response = self.post(body, 'application/json', self.admin,
+                             FakeUser(['auth.delete_group']))
+        self.assertEqual(response.content, b'{"jsonrpc":"2.0","id":1,"result":"purged"}')
+
+        response = self.post(body, 'application/json', self.admin, FakeUser([]))
+        self.assertEqual(response.status_code, 403)
+
+        # the default dispatcher does not have the method
+        response = self.post(body, 'application/json')
+        jsondict = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(jsondict['error']['message'], 'method "admin.purge" is not supported')
+
+    def test_restrictions(self):
+        self.assertRaises(Http404, self.post, dumps((), 'admin.purge'), 'text/xml', self.admin)
+        self.assertRaises(Http404, views.serve_rpc_request,
+                          self.factory.get('/admin/RPC2'), self.admin)
+
+
+class TestStreamRequest(unittest.TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.dispatcher = RPCDispatcher()
+        self.read = []
+        self.unread = []
+
+        @rpcmethod(name='test.import', stream_array='rows', dispatcher=self.dispatcher)
+        def import_rows(request, rows):
+            total = 0
+            for row in rows:
+                if not self.unread:
+                    self.unread.append(len(request.body_sent) - sum(self.read))
+                total += row
+            return total
+
+        @rpcmethod(name='test.size', dispatcher=self.dispatcher)
+        def size(request, rows):
+            return len(request.body)
+
+        self.addCleanup(setattr, xmlrpcparser, 'CHUNK_SIZE', xmlrpcparser.CHUNK_SIZE)
+        xmlrpcparser.CHUNK_SIZE = 1024
+
+    def post(self, body):
+        request = self.factory.post('/RPC2', body, content_type='text/xml')
+        request.body_sent = body
+        read = request.read
+
+        def counting_read(*args):
+            chunk = read(*args)
+            self.read.append(len(chunk))
+            return chunk
+
+        request.read = counting_read
+        return request, views.serve_rpc_request(request, self.dispatcher)
+
+    def test_streamed(self):
+        body = dumps((list(range(10000)),), 'test.import').encode('utf-8')
+        request, response = self.post(body)
+        self.assertEqual(loads(response.content)[0][0], sum(range(10000)))
+        # the method started before most of the body was read
+        self.assertTrue(self.unread[0] > len(body) // 2)
+        self.assertEqual(sum(self.read), len(body))
+        self.assertFalse(hasattr(request, '_body'))
+
+    def test_not_streamed(self):
+        body = dumps(([1, 2, 3],), 'test.size').encode('utf-8')
+        request, response = self.post(body)
+        self.assertEqual(loads(response.content)[0][0], len(body))
+        self.assertEqual(request.body, body)
+
+    def test_limit(self):
+        self.addCleanup(setattr, limits, 'MAX_REQUEST_SIZE', limits.MAX_REQUEST_SIZE)
+        limits.MAX_REQUEST_SIZE = 100
+        body = dumps((list(range(100)),), 'test.import').encode('utf-8')
+        request, response = self.post(body)
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(self.read, [])
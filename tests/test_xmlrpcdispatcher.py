@@ -17,6 +17,8 @@ except ImproperlyConfigured:
     settings.configure(DEBUG=True)
     from rpc4django.xmlrpcdispatcher import XMLRPCDispatcher
 
+from rpc4django import xmlrpcmarshaller
+
 try:
     from xmlrpclib import loads, dumps, Fault
 except ImportError:
@@ -94,14 +96,73 @@ class TestXMLRPCDispatcher(unittest.TestCase):
         ret = self.dispatcher.dispatch(payload)
         self.assertRaises(Fault, loads, ret)
 
+    def test_paramserror(self):
+        calls = []
+
+        def failing(a):
+            calls.append(a)
+            raise TypeError('raised by the method')
+        self.dispatcher.register_function(failing, 'failing')
+
+        ret = self.dispatcher.dispatch(dumps((1,), 'failing'), request='fakerequest')
+        self.assertRaises(Fault, loads, ret)
+        self.assertEqual(calls, [1])
+
+        ret = self.dispatcher.dispatch(dumps((1, 2), 'failing'))
+        try:
+            loads(ret)
+            self.fail('a fault was expected')
+        except Fault as fault:
+            self.assertEqual(fault.faultCode, -32602)
+        self.assertEqual(calls, [1])
+
     def test_decimal(self):
         d = Decimal('1.23456')
-        xml = dumps((d,), 'echotest')
+        # the standard library cannot marshal Decimal
+        xml = xmlrpcmarshaller.dumps((d,), 'echotest')
         ret = self.dispatcher.dispatch(xml)
         out, name = loads(ret)
         self.assertEqual(d, out[0])
         self.assertTrue(isinstance(out[0], Decimal))
-    
-                                        
+
+    def test_stream(self):
+        def rows(count):
+            for i in range(count):
+                yield {'id': i, 'name': u'row %s' % i, 'value': Decimal('1.5')}
+        self.dispatcher.register_function(rows, 'rows')
+        self.dispatcher.register_function(lambda count: list(rows(count)), 'rowlist')
+
+        ret = self.dispatcher.dispatch(dumps((5000,), 'rows'))
+        self.assertFalse(isinstance(ret, str))
+        ret = ''.join(ret)
+        self.assertEqual(ret, self.dispatcher.dispatch(dumps((5000,), 'rowlist')))
+        out, name = loads(ret)
+        self.assertEqual(len(out[0]), 5000)
+        self.assertEqual(out[0][4999]['name'], 'row 4999')
+
+    def test_stream_error(self):
+        def failing():
+            yield 1
+            raise ValueError('failed')
+        self.dispatcher.register_function(failing, 'failing')
+        ret = ''.join(self.dispatcher.dispatch(dumps((), 'failing')))
+        # the response is truncated so clients cannot mistake it for a result
+        self.assertRaises(Exception, loads, ret)
+
+    def test_stream_early_error(self):
+        def failing():
+            raise ValueError('failed')
+            yield 1
+        self.dispatcher.register_function(failing, 'failing')
+        self.dispatcher.register_function(lambda: iter(()), 'empty')
+
+        # the first item is read before the response starts
+        ret = self.dispatcher.dispatch(dumps((), 'failing'))
+        self.assertRaises(Fault, loads, ret)
+
+        out, name = loads(''.join(self.dispatcher.dispatch(dumps((), 'empty'))))
+        self.assertEqual(out[0], [])
+
+
 if __name__ == '__main__':
     unittest.main()
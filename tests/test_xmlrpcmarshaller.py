@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+'''
+XMLRPC Marshaller Tests
+-----------------------
+
+'''
+
+import datetime
+import unittest
+from collections import OrderedDict
+from decimal import Decimal
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    from rpc4django import xmlrpcmarshaller
+except ImproperlyConfigured:
+    # Configure Django if not already configured
+    from django.conf import settings
+    settings.configure(DEBUG=True)
+    from rpc4django import xmlrpcmarshaller
+
+from rpc4django.xmlrpcmarshaller import XMLRPCMarshaller
+
+try:
+    from xmlrpclib import Binary, DateTime, Fault, Marshaller, dumps, loads
+except ImportError:
+    from xmlrpc.client import Binary, DateTime, Fault, Marshaller, dumps, loads
+
+
+class Point(object):
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+class TestXMLRPCMarshaller(unittest.TestCase):
+
+    def test_same_as_stdlib(self):
+        values = [
+            1, -5, True, False, None, 1.5, 1e100, u'', u'はじめまして',
+            u'a < b && c > d', b'\x00\x01binary', [1, [2, [3]]], (1, 2),
+            {'a': 1, 'b&': {'c': [u'd']}}, {}, [],
+            datetime.datetime(2020, 2, 20, 12, 30, 15),
+            datetime.datetime(5, 1, 1), DateTime(0), Binary(b'data'), Point(1, 2),
+        ]
+        for value in values:
+            for encoding in (None, 'iso-8859-1'):
+                self.assertEqual(
+                    xmlrpcmarshaller.dumps((value,), methodresponse=1, allow_none=True,
+                                           encoding=encoding),
+                    dumps((value,), methodresponse=1, allow_none=True, encoding=encoding))
+
+        self.assertEqual(xmlrpcmarshaller.dumps(tuple(values), 'test.method', allow_none=True),
+                         dumps(tuple(values), 'test.method', allow_none=True))
+        self.assertEqual(xmlrpcmarshaller.dumps(Fault(1, 'failed')), dumps(Fault(1, 'failed')))
+
+    def test_extension_types(self):
+        value = OrderedDict([('b', 1), ('a', datetime.date(2020, 2, 20)),
+                             ('c', Decimal('1.5'))])
+        out = loads(xmlrpcmarshaller.dumps((value,), methodresponse=1))[0][0]
+        self.assertEqual(list(out.keys()), ['b', 'a', 'c'])
+        self.assertEqual(out['a'].value, '20200220T00:00:00')
+        self.assertEqual(out['c'], Decimal('1.5'))
+
+    def test_decimal(self):
+        values = [Decimal('12345678901234567890.123456789'), Decimal('1.50'),
+                  Decimal('-1E-30'), Decimal('NaN')]
+        out = xmlrpcmarshaller.dumps((values, {'a': values[0]}, values[1]), methodresponse=1)
+        self.assertTrue('<bigdecimal>12345678901234567890.123456789</bigdecimal>' in out)
+        self.assertTrue('<bigdecimal>1.50</bigdecimal>' in out)
+        self.assertTrue('<bigdecimal>-1E-30</bigdecimal>' in out)
+
+    def test_numeric_arrays(self):
+        # arrays of a single numeric type are written in bulk
+        for value in ([1, 2, 3], [0.1, 1e100, -5.5], (1, 2), [1, True], [1, 1.5],
+                      [u'a', u'b'], [1]):
+            self.assertEqual(xmlrpcmarshaller.dumps((value,)), dumps((value,)))
+        self.assertRaises(OverflowError, xmlrpcmarshaller.dumps, ([1, 2 ** 40],))
+        self.assertRaises(OverflowError, xmlrpcmarshaller.dumps, ([-2 ** 40, 1],))
+
+    def test_errors(self):
+        marshal = XMLRPCMarshaller().dump_value
+        self.assertRaises(TypeError, marshal, None)
+        self.assertRaises(OverflowError, marshal, 2 ** 31)
+        self.assertRaises(TypeError, marshal, {1: 2})
+        self.assertRaises(TypeError, marshal, object())
+
+        recursive = []
+        recursive.append(recursive)
+        self.assertRaises(TypeError, marshal, recursive)
+
+        # subclasses of the basic types cannot be marshalled
+        class MyString(str):
+            pass
+        self.assertRaises(TypeError, marshal, MyString('a'))
+        self.assertRaises(TypeError, marshal, MyString('a'))
+
+    def test_no_global_state(self):
+        self.assertFalse(Decimal in Marshaller.dispatch)
+        self.assertFalse(OrderedDict in Marshaller.dispatch)
+        self.assertRaises(TypeError, dumps, (Decimal('1.5'),))
+
+    def test_register(self):
+        class Money(object):
+            def __init__(self, cents):
+                self.cents = cents
+
+        marshaller = XMLRPCMarshaller()
+        self.assertEqual(loads(xmlrpcmarshaller.dumps((Money(5),)))[0][0], {'cents': 5})
+
+        def dump_money(marshaller, value, write):
+            marshaller.dump(u'%.2f' % (value.cents / 100.0), write)
+        XMLRPCMarshaller.register(Money, dump_money)
+        self.addCleanup(XMLRPCMarshaller.dispatch.pop, Money)
+        self.assertEqual(marshaller.dump_value(Money(5)),
+                         '<value><string>0.05</string></value>\n')
+
+    def test_stdlib_handlers(self):
+        class Color(object):
+            pass
+
+        def dump_color(marshaller, value, write):
+            write('<value><string>red</string></value>\n')
+        Marshaller.dispatch[Color] = dump_color
+        self.addCleanup(Marshaller.dispatch.pop, Color)
+        self.assertEqual(XMLRPCMarshaller().dump_value([Color()]),
+                         '<value><array><data>\n<value><string>red</string></value>\n'
+                         '</data></array></value>\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+'''
+XMLRPC Parser Tests
+-------------------
+
+'''
+
+import datetime
+import unittest
+from decimal import Decimal
+from io import BytesIO
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    from rpc4django.rpcdispatcher import RPCDispatcher, rpcmethod
+except ImproperlyConfigured:
+    # Configure Django if not already configured
+    from django.conf import settings
+    settings.configure(DEBUG=True)
+    from rpc4django.rpcdispatcher import RPCDispatcher, rpcmethod
+
+from defusedxml import EntitiesForbidden
+from defusedxml.xmlrpc import DefusedExpatParser
+from rpc4django import xmlrpcmarshaller, xmlrpcparser
+from rpc4django.xmlrpcparser import parse
+
+try:
+    import xmlrpclib as xmlrpc_client
+    from xmlrpclib import Fault, loads, dumps
+except ImportError:
+    import xmlrpc.client as xmlrpc_client
+    from xmlrpc.client import Fault, loads, dumps
+
+
+class TestParse(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(setattr, xmlrpcparser, 'CHUNK_SIZE', xmlrpcparser.CHUNK_SIZE)
+
+    def test_same_as_loads(self):
+        params = (1, u'はじめまして', [1.5, True, None], {'a': {'b': [u'c']}},
+                  datetime.datetime(2020, 2, 20, 12, 30))
+        xml = dumps(params, 'test.method', allow_none=True)
+        expected = loads(xml, use_datetime=True)
+
+        self.assertEqual(parse(xml, use_datetime=True), expected)
+        self.assertEqual(parse(xml.encode('utf-8'), use_datetime=True), expected)
+        self.assertEqual(parse(BytesIO(xml.encode('utf-8')), use_datetime=True), expected)
+
+        # chunk boundaries inside tags and multibyte characters
+        xmlrpcparser.CHUNK_SIZE = 3
+        self.assertEqual(parse(xml.encode('utf-8'), use_datetime=True), expected)
+
+    def test_decimal(self):
+        values = [Decimal('12345678901234567890.123456789'), Decimal('1.50'),
+                  Decimal('-1E-30'), Decimal('0')]
+        xml = xmlrpcmarshaller.dumps((values, {'a': values[0]}), 'test.method')
+        params, method = parse(xml)
+        self.assertEqual(params, (values, {'a': values[0]}))
+        self.assertEqual([str(value) for value in params[0]], [str(value) for value in values])
+
+    def test_entities_forbidden(self):
+        xml = """<?xml version="1.0"?>
+<!DOCTYPE methodCall [<!ENTITY lol "lol">]>
+<methodCall><methodName>&lol;</methodName><params></params></methodCall>"""
+        self.assertRaises(EntitiesForbidden, parse, xml)
+        # without patching the standard library
+        self.assertFalse(xmlrpc_client.FastParser is DefusedExpatParser)
+
+    def test_stream(self):
+        xmlrpcparser.CHUNK_SIZE = 64
+        rows = [{'id': i, 'name': 'row %s' % i} for i in range(100)]
+        xml = dumps((u'table', rows), 'test.import').encode('utf-8')
+
+        params, method = parse(xml, get_stream_index=lambda method: 1)
+        self.assertEqual(method, 'test.import')
+        self.assertEqual(params[0], u'table')
+
+        items = params[1]
+        self.assertEqual(next(items), rows[0])
+        self.assertEqual(list(items), rows[1:])
+
+        # the stream can be the only parameter and arrays can be nested
+        xml = dumps(([[1, 2], [3]],), 'test.import')
+        params, method = parse(xml, get_stream_index=lambda method: 0)
+        self.assertEqual(list(params[0]), [[1, 2], [3]])
+
+        # other methods are parsed as usual
+        params, method = parse(xml, get_stream_index=lambda method: None)
+        self.assertEqual(params, ([[1, 2], [3]],))
+
+    def test_stream_errors(self):
+        xml = dumps(([1, 2], 3), 'test.import')
+        params, method = parse(xml, get_stream_index=lambda method: 0)
+        self.assertRaises(ValueError, list, params[0])
+
+        xml = dumps(([1, 2],), 'test.import').encode('utf-8')
+        params, method = parse(xml[:-20], get_stream_index=lambda method: 0)
+        self.assertRaises(Exception, list, params[0])
+
+
+class TestStreamArray(unittest.TestCase):
+
+    def setUp(self):
+        self.dispatcher = RPCDispatcher()
+        self.received = []
+
+        @rpcmethod(name='test.import', stream_array='rows', dispatcher=self.dispatcher,
+                   cache=True)
+        def import_rows(table, rows):
+            self.received.append(rows)
+            return sum(row['value'] for row in rows)
+
+    def test_xml(self):
+        rows = [{'value': i} for i in range(1000)]
+        response = self.dispatcher.xmldispatch(dumps(('table', rows), 'test.import').encode('utf-8'))
+        self.assertEqual(loads(response)[0][0], sum(range(1000)))
+        self.assertFalse(isinstance(self.received[0], list))
+        self.assertEqual(self.dispatcher.get_method('test.import').cache, None)
+
+    def test_json(self):
+        response = self.dispatcher.jsondispatch(
+            b'{"method": "test.import", "params": ["table", [{"value": 1}]], "id": 1}')
+        self.assertTrue('"result": 1' in response)
+        self.assertEqual(self.received, [[{'value': 1}]])
+
+    def test_not_last_argument(self):
+        @rpcmethod(name='test.bad', stream_array='rows', dispatcher=self.dispatcher)
+        def bad(rows, table):
+            return table
+
+        response = self.dispatcher.xmldispatch(dumps(([1], 'table'), 'test.bad').encode('utf-8'))
+        self.assertRaises(Fault, loads, response)
+
+
+if __name__ == '__main__':
+    unittest.main()